@@ -0,0 +1,346 @@
+"""
+microbenchmarks for the per-call overhead of every instrumentation hot path, compared against a baseline
+
+usage:
+    python benchmarks/run_benchmarks.py                       # both exporters, json to stdout
+    python benchmarks/run_benchmarks.py --exporter memory     # just one exporter
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --allocations        # also measure memory allocated per call
+
+each exporter runs in its own subprocess, since the global tracer provider can only be set once per process
+the tracer provider is set up before `opentelemetry_wrapper` is imported, so the console exporter is never attached
+spans are exported synchronously (via `SimpleSpanProcessor`), so the cost of ending a span is included in the timing
+
+by default this benchmarks the code in this repo; to benchmark a release instead, pip install it and add `--installed`
+to compare releases, run this against each version and diff the `overhead_ns` of each benchmark
+"""
+import argparse
+import base64
+import datetime
+import gc
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+EXPORTERS = ('noop', 'memory')
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _setup_tracer_provider(exporter: str):
+    """
+    must be called before importing `opentelemetry_wrapper`
+    """
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export import SpanExporter
+    from opentelemetry.sdk.trace.export import SpanExportResult
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    class NoOpSpanExporter(SpanExporter):
+        def export(self, spans):
+            return SpanExportResult.SUCCESS
+
+    if exporter == 'noop':
+        span_exporter = NoOpSpanExporter()
+    elif exporter == 'memory':
+        span_exporter = InMemorySpanExporter()
+    else:
+        raise ValueError(exporter)
+
+    tp = TracerProvider()
+    tp.add_span_processor(SimpleSpanProcessor(span_exporter))
+    trace.set_tracer_provider(tp)
+    return span_exporter
+
+
+def _drive(coro):
+    """
+    run a coroutine that never actually suspends, without the overhead of an event loop
+    """
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('coroutine suspended')
+
+
+def _time_ns(func: Callable[[], Any], number: int, repeat: int) -> Dict[str, float]:
+    timings = [t / number * 1e9 for t in timeit.repeat(func, number=number, repeat=repeat)]
+    return {'min': min(timings), 'median': statistics.median(timings)}
+
+
+def _allocations(func: Callable[[], Any], number: int) -> Dict[str, float]:
+    """
+    memory allocated per call, as measured by tracemalloc (which slows everything down, so this is measured separately)
+    * peak_bytes: median of the peak memory allocated during each call, including anything freed before it returned
+    * retained_blocks: memory blocks still allocated after all the calls (and a gc), divided by the number of calls
+    """
+    func()  # warm up any caches
+    gc.collect()
+    tracemalloc.start()
+    try:
+        blocks_before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+        peaks = []
+        for _ in range(number):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        gc.collect()
+        blocks_after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    return {'peak_bytes': statistics.median(peaks), 'retained_blocks': (blocks_after - blocks_before) / number}
+
+
+def _build_benchmarks() -> Dict[str, Dict[str, Callable[[], Any]]]:
+    """
+    :return: benchmark name -> {'baseline': callable, 'instrumented': callable}
+    """
+    from opentelemetry import trace
+
+    from opentelemetry_wrapper import instrument_decorate
+    from opentelemetry_wrapper.v0.dependencies.fastapi.starlette_request_hook import request_hook
+    from opentelemetry_wrapper.v0.utils.extract_json_header import extract_json_header
+    from opentelemetry_wrapper.v0.utils.json_encoder import jsonable_encoder
+    from opentelemetry_wrapper.v0.utils.logging_json_formatter import JsonFormatter
+    from opentelemetry_wrapper.v0.utils.type_checking import typecheck
+
+    benchmarks: Dict[str, Dict[str, Callable[[], Any]]] = dict()
+
+    # sync functions
+    def add(x, y):
+        return x + y
+
+    instrumented_add = instrument_decorate(add, func_name='add')
+    benchmarks['instrument_decorate.sync'] = {
+        'baseline': lambda: add(1, 2),
+        'instrumented': lambda: instrumented_add(1, 2),
+    }
+
+    # async functions
+    async def async_add(x, y):
+        return x + y
+
+    instrumented_async_add = instrument_decorate(async_add, func_name='async_add')
+    benchmarks['instrument_decorate.async'] = {
+        'baseline': lambda: _drive(async_add(1, 2)),
+        'instrumented': lambda: _drive(instrumented_async_add(1, 2)),
+    }
+
+    # classes
+    def make_class():
+        class Thing:
+            def __init__(self):
+                self.x = 1
+
+            def method(self, y):
+                return self.x + y
+
+            @property
+            def prop(self):
+                return self.x
+
+        return Thing
+
+    plain_cls = make_class()
+    instrumented_cls = instrument_decorate(make_class(), func_name='Thing')
+    plain_obj = plain_cls()
+    instrumented_obj = instrumented_cls()
+    benchmarks['instrument_decorate.class.init'] = {
+        'baseline':     plain_cls,
+        'instrumented': instrumented_cls,
+    }
+    benchmarks['instrument_decorate.class.method'] = {
+        'baseline': lambda: plain_obj.method(1),
+        'instrumented': lambda: instrumented_obj.method(1),
+    }
+
+    # `wrapped_getattribute` was replaced by per-property descriptors, so this measures a property read instead
+    benchmarks['instrument_decorate.class.property'] = {
+        'baseline': lambda: plain_obj.prop,
+        'instrumented': lambda: instrumented_obj.prop,
+    }
+    benchmarks['instrument_decorate.class.plain_attribute'] = {
+        'baseline': lambda: plain_obj.x,
+        'instrumented': lambda: instrumented_obj.x,
+    }
+
+    # logging
+    record = logging.LogRecord(name='benchmark', level=logging.INFO, pathname=__file__, lineno=1,
+                               msg='hello %s', args=('world',), exc_info=None)
+    plain_formatter = logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    json_formatter = JsonFormatter()
+    benchmarks['JsonFormatter.format'] = {
+        'baseline': lambda: plain_formatter.format(record),
+        'instrumented': lambda: json_formatter.format(record),
+    }
+
+    # json encoding
+    payload = {'id': 123,
+               'name': 'benchmark',
+               'tags': ['a', 'b', 'c'],
+               'created': datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+               'nested': {'ratio': 0.5, 'ok': True, 'missing': None}}
+    benchmarks['jsonable_encoder'] = {
+        'baseline': lambda: json.dumps(payload, default=str),
+        'instrumented': lambda: jsonable_encoder(payload),
+    }
+
+    # request headers
+    userinfo = {'sub': '1234', 'name': 'benchmark user', 'email': 'user@example.com', 'groups': ['a', 'b']}
+    header_value = base64.b64encode(json.dumps(userinfo).encode('utf8')).decode('ascii')
+    benchmarks['extract_json_header'] = {
+        'baseline': lambda: json.loads(base64.b64decode(header_value)),
+        'instrumented': lambda: extract_json_header(header_value),
+    }
+
+    scope = {'type':    'http',
+             'headers': [(b'host', b'localhost'),
+                         (b'user-agent', b'benchmark'),
+                         (b'x-userinfo', header_value.encode('ascii'))]}
+    span = trace.get_tracer(__name__).start_span('request')  # never ended, so it's never exported
+    benchmarks['request_hook'] = {
+        'baseline': lambda: span.set_attribute('http.request.header.x-userinfo', header_value),
+        'instrumented': lambda: request_hook(span, scope),
+    }
+
+    # type checking
+    def typed_add(x: int, y: int) -> int:
+        return x + y
+
+    typechecked_add = typecheck(typed_add)
+    benchmarks['typecheck'] = {
+        'baseline': lambda: typed_add(1, 2),
+        'instrumented': lambda: typechecked_add(1, 2),
+    }
+
+    return benchmarks
+
+
+def run(exporter: str,
+        number: int,
+        repeat: int,
+        only: Optional[Sequence[str]] = None,
+        allocations: bool = False,
+        ) -> Dict[str, Any]:
+    """
+    run all benchmarks with the given exporter, in the current process
+
+    :param exporter: 'noop' or 'memory'
+    :param number: calls per timing
+    :param repeat: number of timings
+    :param only: if set, only run benchmarks whose names start with one of these prefixes
+    :param allocations: also measure memory allocated per call
+    :return:
+    """
+    span_exporter = _setup_tracer_provider(exporter)
+
+    import opentelemetry.sdk.version
+    import opentelemetry_wrapper
+
+    results: List[Dict[str, Any]] = []
+    for name, funcs in _build_benchmarks().items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        baseline = _time_ns(funcs['baseline'], number, repeat)
+        instrumented = _time_ns(funcs['instrumented'], number, repeat)
+        if hasattr(span_exporter, 'clear'):
+            span_exporter.clear()  # don't let memory usage build up across benchmarks
+        results.append({
+            'name':            name,
+            'baseline_ns':     round(baseline['min'], 1),
+            'instrumented_ns': round(instrumented['min'], 1),
+            'overhead_ns':     round(instrumented['min'] - baseline['min'], 1),
+            'ratio':           round(instrumented['min'] / baseline['min'], 2) if baseline['min'] else None,
+            'median_baseline_ns':     round(baseline['median'], 1),
+            'median_instrumented_ns': round(instrumented['median'], 1),
+        })
+
+        if allocations:
+            baseline_allocations = _allocations(funcs['baseline'], min(number, 1000))
+            instrumented_allocations = _allocations(funcs['instrumented'], min(number, 1000))
+            if hasattr(span_exporter, 'clear'):
+                span_exporter.clear()
+            results[-1].update({
+                'baseline_peak_bytes':          baseline_allocations['peak_bytes'],
+                'instrumented_peak_bytes':      instrumented_allocations['peak_bytes'],
+                'baseline_retained_blocks':     round(baseline_allocations['retained_blocks'], 2),
+                'instrumented_retained_blocks': round(instrumented_allocations['retained_blocks'], 2),
+            })
+
+    return {
+        'exporter': exporter,
+        'number':   number,
+        'repeat':   repeat,
+        'versions': {
+            'opentelemetry_wrapper': opentelemetry_wrapper.__version__,
+            'opentelemetry_sdk':     opentelemetry.sdk.version.__version__,
+            'python':                platform.python_version(),
+        },
+        'results':  results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--exporter', choices=(*EXPORTERS, 'all'), default='all')
+    parser.add_argument('--number', type=int, default=10000, help='calls per timing')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timings (the fastest is reported)')
+    parser.add_argument('--only', nargs='*', help='only run benchmarks whose names start with these prefixes')
+    parser.add_argument('--output', type=Path, help='write json here instead of stdout')
+    parser.add_argument('--allocations', action='store_true', help='also measure memory allocated per call')
+    parser.add_argument('--installed', action='store_true', help='benchmark the installed version, not this repo')
+    args = parser.parse_args()
+
+    if not args.installed:
+        sys.path.insert(0, str(REPO_ROOT))
+
+    if args.exporter == 'all':
+        # the global tracer provider can only be set once, so run each exporter in a fresh process
+        # output goes via a temp file, in case anything else gets printed to stdout
+        runs = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for exporter in EXPORTERS:
+                temp_path = Path(temp_dir) / f'{exporter}.json'
+                cmd = [sys.executable, __file__, '--exporter', exporter, '--output', str(temp_path),
+                       '--number', str(args.number), '--repeat', str(args.repeat)]
+                if args.only:
+                    cmd += ['--only', *args.only]
+                if args.installed:
+                    cmd += ['--installed']
+                if args.allocations:
+                    cmd += ['--allocations']
+                subprocess.run(cmd, check=True)
+                runs.extend(json.loads(temp_path.read_text(encoding='utf8'))['runs'])
+    else:
+        runs = [run(args.exporter, args.number, args.repeat, args.only, args.allocations)]
+
+    output = json.dumps({
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'platform':  platform.platform(),
+        'runs':      runs,
+    }, indent=2)
+
+    if args.output:
+        args.output.write_text(output + '\n', encoding='utf8')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
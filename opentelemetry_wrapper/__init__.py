@@ -8,24 +8,56 @@ import logging as builtins_logging
 from multiprocessing import current_process
 from threading import current_thread
 
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_COMPRESSION
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_ENDPOINT
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_HEADER
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_INSECURE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_PROTOCOL
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_PROMETHEUS_ENDPOINT
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_PROMETHEUS_PORT
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_HEADER_ATTRIBUTES
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_LOG_LEVEL
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_SERVICE_NAME
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_SERVICE_NAMESPACE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_BLRP_OTLP
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_BSP_CONSOLE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_BSP_OTLP
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_CONSOLE_SPANS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_SPOOL_DIR
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_SPOOL_MAX_BYTES
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_SPOOL_REPLAY_RATE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_RATIO
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_asyncio import instrument_event_loop
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_asyncio_tasks import instrument_asyncio_tasks
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_context_manager import otel
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_dataclasses import instrument_dataclasses
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import clear_instrumentation_cache
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrument_decorate
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrumentation_cache_info
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_fastapi import instrument_fastapi_app
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_logging import instrument_logging
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_requests import instrument_requests
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_runtime_metrics import instrument_runtime_metrics
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_sqlalchemy import instrument_sqlalchemy
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_sqlalchemy import instrument_sqlalchemy_engine
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_system_metrics import instrument_system_metrics
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.kill_switch import disable_instrumentation
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.kill_switch import enable_instrumentation
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.kill_switch import install_kill_switch_signal
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.kill_switch import is_instrumentation_enabled
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.kill_switch import set_instrumentation_enabled
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_profiler import get_folded_stacks
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_profiler import start_profiler
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_profiler import stop_profiler
 
 # from opentelemetry_wrapper.v0.utils.type_checking import typecheck
 
@@ -38,6 +70,8 @@ def instrument_all(dataclasses: bool = True,
                    requests: bool = True,
                    sqlalchemy: bool = False,  # too noisy for a default
                    system_metrics: bool = True,
+                   runtime_metrics: bool = False,
+                   event_loop: bool = False,
                    log_json: bool = True,
                    clobber_other_log_handlers: bool = False,
                    ):
@@ -55,6 +89,10 @@ def instrument_all(dataclasses: bool = True,
         instrument_sqlalchemy()
     if system_metrics:
         instrument_system_metrics()
+    if runtime_metrics:
+        instrument_runtime_metrics()
+    if event_loop:
+        instrument_event_loop()
 
     # log current config
     global _CONFIG_HAS_BEEN_LOGGED
@@ -70,22 +108,66 @@ def instrument_all(dataclasses: bool = True,
                 'OTEL_EXPORTER_OTLP_ENDPOINT':       OTEL_EXPORTER_OTLP_ENDPOINT,
                 'OTEL_EXPORTER_OTLP_HEADER':         OTEL_EXPORTER_OTLP_HEADER,
                 'OTEL_EXPORTER_OTLP_INSECURE':       OTEL_EXPORTER_OTLP_INSECURE,
+                'OTEL_EXPORTER_OTLP_PROTOCOL':       OTEL_EXPORTER_OTLP_PROTOCOL,
+                'OTEL_EXPORTER_OTLP_COMPRESSION':    OTEL_EXPORTER_OTLP_COMPRESSION,
                 'OTEL_LOG_LEVEL':                    OTEL_LOG_LEVEL,
                 'OTEL_HEADER_ATTRIBUTES':            OTEL_HEADER_ATTRIBUTES,
                 'OTEL_EXPORTER_PROMETHEUS_PORT':     OTEL_EXPORTER_PROMETHEUS_PORT,
                 'OTEL_EXPORTER_PROMETHEUS_ENDPOINT': OTEL_EXPORTER_PROMETHEUS_ENDPOINT,
+                **({
+                    'OTEL_WRAPPER_BSP_OTLP':  OTEL_WRAPPER_BSP_OTLP._asdict(),
+                    'OTEL_WRAPPER_BLRP_OTLP': OTEL_WRAPPER_BLRP_OTLP._asdict(),
+                    'OTEL_WRAPPER_SPOOL_DIR': OTEL_WRAPPER_SPOOL_DIR,
+                } if OTEL_EXPORTER_OTLP_ENDPOINT else {}),
+                **({
+                    'OTEL_WRAPPER_SPOOL_MAX_BYTES':   OTEL_WRAPPER_SPOOL_MAX_BYTES,
+                    'OTEL_WRAPPER_SPOOL_REPLAY_RATE': OTEL_WRAPPER_SPOOL_REPLAY_RATE,
+                } if OTEL_EXPORTER_OTLP_ENDPOINT and OTEL_WRAPPER_SPOOL_DIR else {}),
+                'OTEL_WRAPPER_CONSOLE_SPANS':        OTEL_WRAPPER_CONSOLE_SPANS,
+                **({
+                    'OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES': OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES,
+                    'OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY':  OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY,
+                    'OTEL_WRAPPER_BSP_CONSOLE':                OTEL_WRAPPER_BSP_CONSOLE._asdict(),
+                } if OTEL_WRAPPER_CONSOLE_SPANS else {}),
+                **({
+                    'OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S': OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S,
+                } if runtime_metrics else {}),
+                **({
+                    'OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS': OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS,
+                } if event_loop else {}),
+                'OTEL_WRAPPER_TAIL_SAMPLING':        OTEL_WRAPPER_TAIL_SAMPLING,
+                **({
+                    'OTEL_WRAPPER_TAIL_SAMPLING_RATIO':      OTEL_WRAPPER_TAIL_SAMPLING_RATIO,
+                    'OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS': OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS,
+                    'OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS':  OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS,
+                    'OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S':  OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S,
+                } if OTEL_WRAPPER_TAIL_SAMPLING else {}),
             })
 
 
 __all__ = (
     '__version__',
+    'clear_instrumentation_cache',
+    'disable_instrumentation',
+    'enable_instrumentation',
+    'get_folded_stacks',
+    'install_kill_switch_signal',
     'instrument_all',
+    'instrument_asyncio_tasks',
     'instrument_dataclasses',
     'instrument_decorate',
+    'instrument_event_loop',
     'instrument_fastapi_app',
     'instrument_logging',
     'instrument_requests',
+    'instrument_runtime_metrics',
     'instrument_sqlalchemy',
     'instrument_sqlalchemy_engine',
+    'instrumentation_cache_info',
+    'is_instrumentation_enabled',
+    'otel',
+    'set_instrumentation_enabled',
+    'start_profiler',
+    'stop_profiler',
     # 'typecheck',
 )
@@ -137,3 +137,68 @@ def getenv_otel_exporter_otlp_insecure() -> Optional[bool]:
     else:
         warnings.warn(f'unexpected value for `OTEL_EXPORTER_OTLP_INSECURE`: {out}')
         return False  # fail secure - random input returns False
+
+
+def getenv_otel_exporter_otlp_protocol() -> str:
+    """
+    which transport to export traces, metrics, and logs with
+    python has no OTLP/JSON exporter, so `http/json` falls back to `http/protobuf` (which is also smaller)
+
+    >>> getenv_otel_exporter_otlp_protocol()
+    'grpc'
+    >>> os.environ['OTEL_EXPORTER_OTLP_PROTOCOL'] = 'HTTP/Protobuf'
+    >>> getenv_otel_exporter_otlp_protocol()
+    'http/protobuf'
+    >>> os.environ['OTEL_EXPORTER_OTLP_PROTOCOL'] = 'http/json'  # prints a warning
+    >>> getenv_otel_exporter_otlp_protocol()
+    'http/protobuf'
+    >>> os.environ['OTEL_EXPORTER_OTLP_PROTOCOL'] = 'invalid'  # prints a warning
+    >>> getenv_otel_exporter_otlp_protocol()
+    'grpc'
+    >>> del os.environ['OTEL_EXPORTER_OTLP_PROTOCOL']
+
+    :return: `grpc` or `http/protobuf`
+    """
+    out = os.getenv('OTEL_EXPORTER_OTLP_PROTOCOL', '').strip().casefold()
+    if not out:
+        return 'grpc'  # not the spec default (`http/protobuf`), but it's what we've always used
+    elif out in ('grpc', 'http/protobuf'):
+        return out
+    elif out == 'http/json':
+        warnings.warn('`OTEL_EXPORTER_OTLP_PROTOCOL=http/json` is not supported, using `http/protobuf` instead')
+        return 'http/protobuf'
+    else:
+        warnings.warn(f'unexpected value for `OTEL_EXPORTER_OTLP_PROTOCOL`: {out}')
+        return 'grpc'
+
+
+def getenv_otel_exporter_otlp_compression() -> str:
+    """
+    >>> getenv_otel_exporter_otlp_compression()
+    'none'
+    >>> os.environ['OTEL_EXPORTER_OTLP_PROTOCOL'] = 'http/protobuf'
+    >>> getenv_otel_exporter_otlp_compression()
+    'gzip'
+    >>> os.environ['OTEL_EXPORTER_OTLP_COMPRESSION'] = 'NONE'
+    >>> getenv_otel_exporter_otlp_compression()
+    'none'
+    >>> os.environ['OTEL_EXPORTER_OTLP_COMPRESSION'] = 'zstd'  # prints a warning
+    >>> getenv_otel_exporter_otlp_compression()
+    'gzip'
+    >>> del os.environ['OTEL_EXPORTER_OTLP_COMPRESSION']
+    >>> del os.environ['OTEL_EXPORTER_OTLP_PROTOCOL']
+
+    :return: `gzip` or `none`
+    """
+    # the spec default is `none`, which is what the grpc exporters have always used
+    # but gzip is the default for the (new) http exporter, since telemetry compresses very well
+    default = 'gzip' if getenv_otel_exporter_otlp_protocol() == 'http/protobuf' else 'none'
+
+    out = os.getenv('OTEL_EXPORTER_OTLP_COMPRESSION', '').strip().casefold()
+    if not out:
+        return default
+    elif out in ('gzip', 'none'):
+        return out
+    else:
+        warnings.warn(f'unexpected value for `OTEL_EXPORTER_OTLP_COMPRESSION`: {out}')
+        return default
@@ -6,17 +6,34 @@ from typing import List
 from typing import Optional
 from typing import Tuple
 
+from opentelemetry_wrapper.v0.config.otel_exporter_otlp import getenv_otel_exporter_otlp_compression
 from opentelemetry_wrapper.v0.config.otel_exporter_otlp import getenv_otel_exporter_otlp_endpoint
 from opentelemetry_wrapper.v0.config.otel_exporter_otlp import getenv_otel_exporter_otlp_header
 from opentelemetry_wrapper.v0.config.otel_exporter_otlp import getenv_otel_exporter_otlp_insecure
+from opentelemetry_wrapper.v0.config.otel_exporter_otlp import getenv_otel_exporter_otlp_protocol
 from opentelemetry_wrapper.v0.config.otel_header_attributes import get_header_attributes
 from opentelemetry_wrapper.v0.config.otel_log_level import get_log_level
 from opentelemetry_wrapper.v0.config.otel_service_name import get_default_service_name
 from opentelemetry_wrapper.v0.config.otel_service_name import get_k8s_namespace
 from opentelemetry_wrapper.v0.config.otel_service_name import getenv_otel_service_name
 from opentelemetry_wrapper.v0.config.otel_service_name import getenv_otel_service_namespace
+from opentelemetry_wrapper.v0.config.otel_wrapper_asyncio import getenv_asyncio_slow_callback_ms
+from opentelemetry_wrapper.v0.config.otel_wrapper_batch_processors import BatchProcessorConfig
+from opentelemetry_wrapper.v0.config.otel_wrapper_batch_processors import getenv_batch_processor_config
+from opentelemetry_wrapper.v0.config.otel_wrapper_console_spans import getenv_console_spans_buffer_bytes
+from opentelemetry_wrapper.v0.config.otel_wrapper_console_spans import getenv_console_spans_drop_policy
+from opentelemetry_wrapper.v0.config.otel_wrapper_console_spans import getenv_console_spans_enabled
 from opentelemetry_wrapper.v0.config.otel_wrapper_prometheus_exporter import get_prometheus_endpoint
 from opentelemetry_wrapper.v0.config.otel_wrapper_prometheus_exporter import get_prometheus_port
+from opentelemetry_wrapper.v0.config.otel_wrapper_runtime_metrics import getenv_runtime_metrics_interval
+from opentelemetry_wrapper.v0.config.otel_wrapper_spool import getenv_spool_dir
+from opentelemetry_wrapper.v0.config.otel_wrapper_spool import getenv_spool_max_bytes
+from opentelemetry_wrapper.v0.config.otel_wrapper_spool import getenv_spool_replay_rate
+from opentelemetry_wrapper.v0.config.otel_wrapper_tail_sampling import getenv_tail_sampling_enabled
+from opentelemetry_wrapper.v0.config.otel_wrapper_tail_sampling import getenv_tail_sampling_latency_ms
+from opentelemetry_wrapper.v0.config.otel_wrapper_tail_sampling import getenv_tail_sampling_max_spans
+from opentelemetry_wrapper.v0.config.otel_wrapper_tail_sampling import getenv_tail_sampling_ratio
+from opentelemetry_wrapper.v0.config.otel_wrapper_tail_sampling import getenv_tail_sampling_timeout_s
 
 # global flag to override opentelemetry and not do anything
 # because opentelemetry is too verbose in tests
@@ -37,6 +54,8 @@ OTEL_SERVICE_NAMESPACE: Optional[str] = getenv_otel_service_namespace() or get_k
 OTEL_EXPORTER_OTLP_ENDPOINT: str = getenv_otel_exporter_otlp_endpoint()
 OTEL_EXPORTER_OTLP_HEADER: Tuple[Tuple[str, str], ...] = getenv_otel_exporter_otlp_header()
 OTEL_EXPORTER_OTLP_INSECURE: Optional[bool] = getenv_otel_exporter_otlp_insecure()
+OTEL_EXPORTER_OTLP_PROTOCOL: str = getenv_otel_exporter_otlp_protocol()  # `grpc` or `http/protobuf`
+OTEL_EXPORTER_OTLP_COMPRESSION: str = getenv_otel_exporter_otlp_compression()  # `gzip` or `none`
 
 OTEL_LOG_LEVEL: int = get_log_level()
 
@@ -44,3 +63,35 @@ OTEL_HEADER_ATTRIBUTES: List[str] = get_header_attributes()
 
 OTEL_EXPORTER_PROMETHEUS_PORT: Optional[int] = get_prometheus_port()
 OTEL_EXPORTER_PROMETHEUS_ENDPOINT: Optional[str] = get_prometheus_endpoint()
+
+# queue size, batch size, schedule delay, and export timeout for each batch processor (spans or logs, per exporter)
+# e.g. `OTEL_WRAPPER_BSP_OTLP_MAX_QUEUE_SIZE`, which falls back to `OTEL_BSP_MAX_QUEUE_SIZE`, then to the default
+OTEL_WRAPPER_BSP_CONSOLE: BatchProcessorConfig = getenv_batch_processor_config('BSP', 'CONSOLE')
+OTEL_WRAPPER_BSP_OTLP: BatchProcessorConfig = getenv_batch_processor_config('BSP', 'OTLP')
+OTEL_WRAPPER_BLRP_OTLP: BatchProcessorConfig = getenv_batch_processor_config('BLRP', 'OTLP')
+
+# spool spans and logs to a memory-mapped file while the OTLP endpoint is unreachable, and replay them once it's back
+# disabled unless a directory is set; the size is per file (one each for spans and logs)
+OTEL_WRAPPER_SPOOL_DIR: Optional[str] = getenv_spool_dir()
+OTEL_WRAPPER_SPOOL_MAX_BYTES: int = getenv_spool_max_bytes()
+OTEL_WRAPPER_SPOOL_REPLAY_RATE: float = getenv_spool_replay_rate()
+
+# print spans to stdout as json lines, via a bounded buffer so that a slow log pipe never blocks span export
+# when the buffer is full, spans are dropped (either the incoming ones, or the oldest ones still waiting)
+OTEL_WRAPPER_CONSOLE_SPANS: bool = getenv_console_spans_enabled()
+OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES: int = getenv_console_spans_buffer_bytes()
+OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY: str = getenv_console_spans_drop_policy()
+
+# report asyncio callbacks (or coroutine steps) that block the event loop for at least this many milliseconds
+OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS: float = getenv_asyncio_slow_callback_ms()
+
+# how often to poll the runtime metrics that can't be measured passively (in seconds)
+OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S: float = getenv_runtime_metrics_interval()
+
+# buffer spans per trace and decide which traces to export after they end (instead of exporting every span)
+# traces with errors or slow spans are always kept, and the rest are sampled by trace id
+OTEL_WRAPPER_TAIL_SAMPLING: bool = getenv_tail_sampling_enabled()
+OTEL_WRAPPER_TAIL_SAMPLING_RATIO: float = getenv_tail_sampling_ratio()
+OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS: float = getenv_tail_sampling_latency_ms()
+OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS: int = getenv_tail_sampling_max_spans()
+OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S: float = getenv_tail_sampling_timeout_s()
@@ -0,0 +1,31 @@
+import os
+import warnings
+
+
+def getenv_asyncio_slow_callback_ms() -> float:
+    """
+    >>> os.environ['OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS'] = '250'
+    >>> getenv_asyncio_slow_callback_ms()
+    250.0
+    >>> os.environ['OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS'] = 'slow'  # prints a warning
+    >>> getenv_asyncio_slow_callback_ms()
+    100.0
+    >>> del os.environ['OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS']
+
+    :return: callbacks (or coroutine steps) that block the event loop for at least this long are reported
+    """
+    out = os.getenv('OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS', '').strip()
+    if not out:
+        return 100.0
+
+    try:
+        threshold = float(out)
+    except ValueError:
+        warnings.warn(f'`OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS` is non-numeric, and will be ignored: {out}')
+        return 100.0
+
+    if not threshold > 0:
+        warnings.warn(f'`OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS` must be positive, and will be ignored: {out}')
+        return 100.0
+
+    return threshold
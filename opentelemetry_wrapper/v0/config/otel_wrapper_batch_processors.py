@@ -0,0 +1,78 @@
+import os
+import warnings
+from typing import NamedTuple
+
+# defaults from the spec (the sdk uses the same), used if neither our env var nor the standard one is set
+# https://opentelemetry.io/docs/specs/otel/configuration/sdk-environment-variables/#batch-span-processor
+_DEFAULTS = {
+    'BSP':  {'MAX_QUEUE_SIZE': 2048, 'MAX_EXPORT_BATCH_SIZE': 512, 'SCHEDULE_DELAY': 5000, 'EXPORT_TIMEOUT': 30000},
+    'BLRP': {'MAX_QUEUE_SIZE': 2048, 'MAX_EXPORT_BATCH_SIZE': 512, 'SCHEDULE_DELAY': 1000, 'EXPORT_TIMEOUT': 30000},
+}
+
+
+class BatchProcessorConfig(NamedTuple):
+    max_queue_size: int
+    max_export_batch_size: int
+    schedule_delay_millis: int
+    export_timeout_millis: int
+
+
+def _getenv_positive_int(names: tuple, default: int) -> int:
+    """
+    the first of the env vars that is set and valid, otherwise the default
+    """
+    for name in names:
+        out = os.getenv(name, '').strip()
+        if not out:
+            continue
+
+        try:
+            value = int(out)
+        except ValueError:
+            warnings.warn(f'`{name}` is not an integer, and will be ignored: {out}')
+            continue
+
+        if value < 1:
+            warnings.warn(f'`{name}` must be positive, and will be ignored: {out}')
+            continue
+
+        return value
+
+    return default
+
+
+def getenv_batch_processor_config(processor: str, exporter: str) -> BatchProcessorConfig:
+    """
+    settings for one batch processor, e.g. `OTEL_WRAPPER_BSP_OTLP_MAX_QUEUE_SIZE` for the otlp span exporter
+    each setting falls back to the standard env var (e.g. `OTEL_BSP_MAX_QUEUE_SIZE`), then to the default
+
+    >>> os.environ['OTEL_WRAPPER_BSP_OTLP_MAX_QUEUE_SIZE'] = '8192'
+    >>> os.environ['OTEL_BSP_MAX_EXPORT_BATCH_SIZE'] = '1024'
+    >>> tuple(getenv_batch_processor_config('BSP', 'OTLP'))
+    (8192, 1024, 5000, 30000)
+    >>> os.environ['OTEL_WRAPPER_BSP_OTLP_MAX_EXPORT_BATCH_SIZE'] = '10000'  # prints a warning
+    >>> getenv_batch_processor_config('BSP', 'OTLP').max_export_batch_size
+    8192
+    >>> del os.environ['OTEL_WRAPPER_BSP_OTLP_MAX_QUEUE_SIZE']
+    >>> del os.environ['OTEL_WRAPPER_BSP_OTLP_MAX_EXPORT_BATCH_SIZE']
+    >>> del os.environ['OTEL_BSP_MAX_EXPORT_BATCH_SIZE']
+
+    :param processor: `BSP` for spans, or `BLRP` for logs
+    :param exporter: `CONSOLE` or `OTLP`
+    :return:
+    """
+    settings = {setting: _getenv_positive_int((f'OTEL_WRAPPER_{processor}_{exporter}_{setting}',
+                                               f'OTEL_{processor}_{setting}'),
+                                              default)
+                for setting, default in _DEFAULTS[processor].items()}
+
+    # the sdk raises an error for this
+    if settings['MAX_EXPORT_BATCH_SIZE'] > settings['MAX_QUEUE_SIZE']:
+        warnings.warn(f'the max export batch size for `OTEL_WRAPPER_{processor}_{exporter}` cannot be larger than '
+                      f'the max queue size, and will be reduced to {settings["MAX_QUEUE_SIZE"]}')
+        settings['MAX_EXPORT_BATCH_SIZE'] = settings['MAX_QUEUE_SIZE']
+
+    return BatchProcessorConfig(max_queue_size=settings['MAX_QUEUE_SIZE'],
+                                max_export_batch_size=settings['MAX_EXPORT_BATCH_SIZE'],
+                                schedule_delay_millis=settings['SCHEDULE_DELAY'],
+                                export_timeout_millis=settings['EXPORT_TIMEOUT'])
@@ -0,0 +1,78 @@
+import os
+import warnings
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+
+
+def getenv_console_spans_enabled() -> bool:
+    """
+    >>> os.environ['OTEL_WRAPPER_CONSOLE_SPANS'] = 'FALSE'
+    >>> getenv_console_spans_enabled()
+    False
+    >>> os.environ['OTEL_WRAPPER_CONSOLE_SPANS'] = 'true'
+    >>> getenv_console_spans_enabled()
+    True
+    >>> del os.environ['OTEL_WRAPPER_CONSOLE_SPANS']
+
+    :return: True if spans should be printed to stdout (as json lines)
+    """
+    out = os.getenv('OTEL_WRAPPER_CONSOLE_SPANS', '').strip()
+    if not out or out.casefold() == 'true':
+        return True
+    elif out.casefold() == 'false':
+        return False
+    else:
+        warnings.warn(f'unexpected value for `OTEL_WRAPPER_CONSOLE_SPANS`: {out}')
+        return True  # print everything, same as the default
+
+
+def getenv_console_spans_buffer_bytes() -> int:
+    """
+    >>> os.environ['OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES'] = '1048576'
+    >>> getenv_console_spans_buffer_bytes()
+    1048576
+    >>> os.environ['OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES'] = '1MB'  # prints a warning
+    >>> getenv_console_spans_buffer_bytes()
+    8388608
+    >>> del os.environ['OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES']
+
+    :return: maximum amount of span output waiting to be written to stdout, after which spans are dropped
+    """
+    out = os.getenv('OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES', '').strip()
+    if not out:
+        return 8 * 1024 * 1024
+
+    try:
+        buffer_bytes = int(out)
+    except ValueError:
+        warnings.warn(f'`OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES` is not an integer, and will be ignored: {out}')
+        return 8 * 1024 * 1024
+
+    if buffer_bytes < 1:
+        warnings.warn(f'`OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES` must be positive, and will be ignored: {out}')
+        return 8 * 1024 * 1024
+
+    return buffer_bytes
+
+
+def getenv_console_spans_drop_policy() -> str:
+    """
+    >>> os.environ['OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY'] = 'DROP_OLDEST'
+    >>> getenv_console_spans_drop_policy()
+    'drop_oldest'
+    >>> os.environ['OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY'] = 'block'  # prints a warning
+    >>> getenv_console_spans_drop_policy()
+    'drop_newest'
+    >>> del os.environ['OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY']
+
+    :return: which spans to drop when the buffer is full, either the incoming ones or the oldest ones waiting
+    """
+    out = os.getenv('OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY', '').strip().casefold()
+    if not out:
+        return DROP_NEWEST
+    if out not in (DROP_NEWEST, DROP_OLDEST):
+        warnings.warn(f'`OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY` must be `{DROP_NEWEST}` or `{DROP_OLDEST}`, '
+                      f'and will be ignored: {out}')
+        return DROP_NEWEST
+    return out
@@ -0,0 +1,31 @@
+import os
+import warnings
+
+
+def getenv_runtime_metrics_interval() -> float:
+    """
+    >>> os.environ['OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S'] = '0.5'
+    >>> getenv_runtime_metrics_interval()
+    0.5
+    >>> os.environ['OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S'] = '-1'  # prints a warning
+    >>> getenv_runtime_metrics_interval()
+    1.0
+    >>> del os.environ['OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S']
+
+    :return: seconds between samples of the runtime metrics that need to be polled (e.g. GIL contention)
+    """
+    out = os.getenv('OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S', '').strip()
+    if not out:
+        return 1.0
+
+    try:
+        interval = float(out)
+    except ValueError:
+        warnings.warn(f'`OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S` is non-numeric, and will be ignored: {out}')
+        return 1.0
+
+    if not interval > 0:
+        warnings.warn(f'`OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S` must be positive, and will be ignored: {out}')
+        return 1.0
+
+    return interval
@@ -0,0 +1,83 @@
+import os
+import warnings
+from typing import Optional
+
+
+def getenv_spool_dir() -> Optional[str]:
+    """
+    >>> getenv_spool_dir()  # returns None
+
+    >>> os.environ['OTEL_WRAPPER_SPOOL_DIR'] = '/var/spool/otel'
+    >>> getenv_spool_dir()
+    '/var/spool/otel'
+    >>> del os.environ['OTEL_WRAPPER_SPOOL_DIR']
+
+    :return: directory to spool spans and logs to while the OTLP endpoint is unreachable, or None to not spool
+    """
+    out = os.getenv('OTEL_WRAPPER_SPOOL_DIR', '').strip()
+    if not out:
+        return None
+
+    if os.path.exists(out) and not os.path.isdir(out):
+        warnings.warn(f'`OTEL_WRAPPER_SPOOL_DIR` is not a directory, and will be ignored: {out}')
+        return None
+
+    return out
+
+
+def getenv_spool_max_bytes() -> int:
+    """
+    >>> os.environ['OTEL_WRAPPER_SPOOL_MAX_BYTES'] = '1048576'
+    >>> getenv_spool_max_bytes()
+    1048576
+    >>> os.environ['OTEL_WRAPPER_SPOOL_MAX_BYTES'] = '1000'  # prints a warning
+    >>> getenv_spool_max_bytes()
+    67108864
+    >>> del os.environ['OTEL_WRAPPER_SPOOL_MAX_BYTES']
+
+    :return: size of each spool file (one each for spans and logs), after which the oldest batches are dropped
+    """
+    out = os.getenv('OTEL_WRAPPER_SPOOL_MAX_BYTES', '').strip()
+    if not out:
+        return 64 * 1024 * 1024
+
+    try:
+        max_bytes = int(out)
+    except ValueError:
+        warnings.warn(f'`OTEL_WRAPPER_SPOOL_MAX_BYTES` is not an integer, and will be ignored: {out}')
+        return 64 * 1024 * 1024
+
+    if max_bytes < 64 * 1024:
+        warnings.warn(f'`OTEL_WRAPPER_SPOOL_MAX_BYTES` must be at least 64KiB, and will be ignored: {out}')
+        return 64 * 1024 * 1024
+
+    return max_bytes
+
+
+def getenv_spool_replay_rate() -> float:
+    """
+    >>> os.environ['OTEL_WRAPPER_SPOOL_REPLAY_RATE'] = '2.5'
+    >>> getenv_spool_replay_rate()
+    2.5
+    >>> os.environ['OTEL_WRAPPER_SPOOL_REPLAY_RATE'] = '0'  # prints a warning
+    >>> getenv_spool_replay_rate()
+    10.0
+    >>> del os.environ['OTEL_WRAPPER_SPOOL_REPLAY_RATE']
+
+    :return: maximum number of spooled batches to replay per second, once the OTLP endpoint is reachable again
+    """
+    out = os.getenv('OTEL_WRAPPER_SPOOL_REPLAY_RATE', '').strip()
+    if not out:
+        return 10.0
+
+    try:
+        replay_rate = float(out)
+    except ValueError:
+        warnings.warn(f'`OTEL_WRAPPER_SPOOL_REPLAY_RATE` is non-numeric, and will be ignored: {out}')
+        return 10.0
+
+    if not replay_rate > 0:
+        warnings.warn(f'`OTEL_WRAPPER_SPOOL_REPLAY_RATE` must be positive, and will be ignored: {out}')
+        return 10.0
+
+    return replay_rate
@@ -0,0 +1,94 @@
+import math
+import os
+import warnings
+from typing import Optional
+
+
+def _getenv_float(name: str, default: float, minimum: float, maximum: Optional[float] = None) -> float:
+    out = os.getenv(name, '').strip()
+    if not out:
+        return default
+
+    try:
+        value = float(out)
+    except ValueError:
+        warnings.warn(f'`{name}` is non-numeric, and will be ignored: {out} (defaulting to {default})')
+        return default
+
+    if not math.isfinite(value) or not minimum <= value <= (maximum if maximum is not None else math.inf):
+        warnings.warn(f'`{name}` is out of range, and will be ignored: {out} (defaulting to {default})')
+        return default
+
+    return value
+
+
+def getenv_tail_sampling_enabled() -> bool:
+    """
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING'] = 'TRUE'
+    >>> getenv_tail_sampling_enabled()
+    True
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING'] = 'false'
+    >>> getenv_tail_sampling_enabled()
+    False
+    >>> del os.environ['OTEL_WRAPPER_TAIL_SAMPLING']
+
+    :return: True if spans should be tail sampled before being exported
+    """
+    out = os.getenv('OTEL_WRAPPER_TAIL_SAMPLING', '').strip()
+    if not out or out.casefold() == 'false':
+        return False
+    elif out.casefold() == 'true':
+        return True
+    else:
+        warnings.warn(f'unexpected value for `OTEL_WRAPPER_TAIL_SAMPLING`: {out}')
+        return False  # keep everything, same as the default
+
+
+def getenv_tail_sampling_ratio() -> float:
+    """
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING_RATIO'] = '0.25'
+    >>> getenv_tail_sampling_ratio()
+    0.25
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING_RATIO'] = '2'  # prints a warning
+    >>> getenv_tail_sampling_ratio()
+    0.1
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING_RATIO'] = 'nan'  # prints a warning
+    >>> getenv_tail_sampling_ratio()
+    0.1
+    >>> del os.environ['OTEL_WRAPPER_TAIL_SAMPLING_RATIO']
+
+    :return: fraction of traces without errors or slow spans that are kept
+    """
+    return _getenv_float('OTEL_WRAPPER_TAIL_SAMPLING_RATIO', 0.1, 0.0, 1.0)
+
+
+def getenv_tail_sampling_latency_ms() -> float:
+    """
+    :return: traces containing a span that took at least this long (in milliseconds) are always kept
+    """
+    return _getenv_float('OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS', 1000.0, 0.0)
+
+
+def getenv_tail_sampling_max_spans() -> int:
+    """
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS'] = '5000'
+    >>> getenv_tail_sampling_max_spans()
+    5000
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS'] = 'inf'  # prints a warning
+    >>> getenv_tail_sampling_max_spans()
+    100000
+    >>> os.environ['OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS'] = 'nan'  # prints a warning
+    >>> getenv_tail_sampling_max_spans()
+    100000
+    >>> del os.environ['OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS']
+
+    :return: maximum number of spans buffered in memory, after which the oldest traces are decided early
+    """
+    return int(_getenv_float('OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS', 100000, 1))
+
+
+def getenv_tail_sampling_timeout_s() -> float:
+    """
+    :return: how long to wait (in seconds) for a trace's local root span to end before deciding anyway
+    """
+    return _getenv_float('OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S', 30.0, 0.0)
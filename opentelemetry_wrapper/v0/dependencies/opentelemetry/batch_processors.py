@@ -0,0 +1,218 @@
+"""
+batch span and log processors that report how well their exporter is keeping up
+
+the sdk's batch processors silently drop telemetry when their queue is full (apart from a log message),
+so these count everything that goes in and out, and publish it via the meter provider,
+labelled by `signal` (`traces` or `logs`) and `exporter` (e.g. `console` or `otlp`):
+* `otel_wrapper.batch_processor.queue.size` and `.queue.capacity` (gauges)
+* `otel_wrapper.batch_processor.items.exported` and `.items.dropped` (dropped because the queue was full)
+* `otel_wrapper.batch_processor.batches` and `.batches.failed` (the exporter raised or returned a failure)
+* `otel_wrapper.batch_processor.export.duration.sum` and `.export.duration.bucket`, a histogram of export latency
+
+the queue size is derived from the counts (items in, minus items dropped, minus items handed to the exporter),
+since the sdk doesn't expose it (except via its own opt-in internal metrics, which aren't in every version)
+"""
+import time
+from functools import lru_cache
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Sequence
+
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+# noinspection PyProtectedMember
+from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.config.otel_wrapper_batch_processors import BatchProcessorConfig
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import FunctionMetrics
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+
+
+class BatchProcessorMonitor:
+    """
+    counts for a single batch processor
+    updates are not locked; under the GIL these are effectively atomic, and at worst a count might be lost
+    """
+
+    def __init__(self, signal: str, exporter_name: str, max_queue_size: int) -> None:
+        self.attributes: Dict[str, str] = {'signal': signal, 'exporter': exporter_name}
+        self.max_queue_size = max_queue_size
+        self.received_items = 0
+        self.dropped_items = 0
+        self.exported_items = 0  # handed to the exporter, whether or not the export succeeded
+        self.failed_batches = 0
+        self.export_duration = FunctionMetrics(self.attributes)  # also counts batches
+
+    @property
+    def queue_size(self) -> int:
+        return max(0, self.received_items - self.dropped_items - self.exported_items)
+
+    def receive(self) -> None:
+        # the sdk's queue is a bounded deque, so adding to a full queue drops the oldest item
+        if self.queue_size >= self.max_queue_size:
+            self.dropped_items += 1
+        self.received_items += 1
+
+
+class _MonitoredExporter:
+    """
+    wraps a span or log exporter to time each export
+    """
+
+    def __init__(self, exporter: Any, monitor: BatchProcessorMonitor) -> None:
+        self._exporter = exporter
+        self._monitor = monitor
+
+    def export(self, batch: Sequence[Any]) -> Any:
+        self._monitor.exported_items += len(batch)
+        start = time.perf_counter()
+        try:
+            result = self._exporter.export(batch)
+        except Exception:
+            self._monitor.export_duration.record(time.perf_counter() - start, error=True)
+            self._monitor.failed_batches += 1
+            raise
+        failed = getattr(result, 'name', None) == 'FAILURE'  # `SpanExportResult` or `LogExportResult`
+        self._monitor.export_duration.record(time.perf_counter() - start, error=failed)
+        if failed:
+            self._monitor.failed_batches += 1
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        # forward everything else (e.g. `shutdown` and `force_flush`) to the exporter
+        return getattr(self._exporter, name)
+
+
+class MonitoredBatchSpanProcessor(BatchSpanProcessor):
+    def __init__(self, span_exporter: Any, exporter_name: str, config: BatchProcessorConfig) -> None:
+        """
+        :param span_exporter: where to export spans
+        :param exporter_name: used as the `exporter` metric attribute
+        :param config: queue and batch sizes, schedule delay, and export timeout
+        """
+        self.monitor = BatchProcessorMonitor('traces', exporter_name, config.max_queue_size)
+        super().__init__(_MonitoredExporter(span_exporter, self.monitor),  # type: ignore[arg-type]
+                         max_queue_size=config.max_queue_size,
+                         schedule_delay_millis=config.schedule_delay_millis,
+                         max_export_batch_size=config.max_export_batch_size,
+                         export_timeout_millis=config.export_timeout_millis)
+        register_batch_processor_metrics(self.monitor)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context and span.context.trace_flags.sampled:  # same check as the sdk
+            self.monitor.receive()
+        super().on_end(span)
+
+
+class MonitoredBatchLogRecordProcessor(BatchLogRecordProcessor):
+    def __init__(self, exporter: Any, exporter_name: str, config: BatchProcessorConfig) -> None:
+        """
+        :param exporter: where to export logs
+        :param exporter_name: used as the `exporter` metric attribute
+        :param config: queue and batch sizes, schedule delay, and export timeout
+        """
+        self.monitor = BatchProcessorMonitor('logs', exporter_name, config.max_queue_size)
+        super().__init__(_MonitoredExporter(exporter, self.monitor),  # type: ignore[arg-type]
+                         max_queue_size=config.max_queue_size,
+                         schedule_delay_millis=config.schedule_delay_millis,
+                         max_export_batch_size=config.max_export_batch_size,
+                         export_timeout_millis=config.export_timeout_millis)
+        register_batch_processor_metrics(self.monitor)
+
+    def on_emit(self, log_record: Any) -> None:
+        self.monitor.receive()
+        super().on_emit(log_record)
+
+
+_MONITORS: List[BatchProcessorMonitor] = []
+
+
+def _observe_queue_size(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.queue_size, monitor.attributes)
+
+
+def _observe_queue_capacity(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.max_queue_size, monitor.attributes)
+
+
+def _observe_exported_items(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.exported_items, monitor.attributes)
+
+
+def _observe_dropped_items(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.dropped_items, monitor.attributes)
+
+
+def _observe_batches(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.export_duration.calls, monitor.attributes)
+
+
+def _observe_failed_batches(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.failed_batches, monitor.attributes)
+
+
+def _observe_export_duration_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        yield Observation(monitor.export_duration.duration_sum, monitor.attributes)
+
+
+def _observe_export_duration_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    for monitor in list(_MONITORS):
+        for le, count in monitor.export_duration.cumulative_buckets():
+            yield Observation(count, {**monitor.attributes, 'le': le})
+
+
+@lru_cache  # only run once
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_gauge('otel_wrapper.batch_processor.queue.size',
+                                  callbacks=[_observe_queue_size],
+                                  unit='{item}',
+                                  description='items waiting in the batch processor queue to be exported')
+    meter.create_observable_gauge('otel_wrapper.batch_processor.queue.capacity',
+                                  callbacks=[_observe_queue_capacity],
+                                  unit='{item}',
+                                  description='maximum number of items in the queue, after which items are dropped')
+    meter.create_observable_counter('otel_wrapper.batch_processor.items.exported',
+                                    callbacks=[_observe_exported_items],
+                                    unit='{item}',
+                                    description='items handed to the exporter (including failed exports)')
+    meter.create_observable_counter('otel_wrapper.batch_processor.items.dropped',
+                                    callbacks=[_observe_dropped_items],
+                                    unit='{item}',
+                                    description='items dropped because the queue was full')
+    meter.create_observable_counter('otel_wrapper.batch_processor.batches',
+                                    callbacks=[_observe_batches],
+                                    unit='{batch}',
+                                    description='number of batches exported')
+    meter.create_observable_counter('otel_wrapper.batch_processor.batches.failed',
+                                    callbacks=[_observe_failed_batches],
+                                    unit='{batch}',
+                                    description='number of batches where the export raised or returned a failure')
+    meter.create_observable_counter('otel_wrapper.batch_processor.export.duration.sum',
+                                    callbacks=[_observe_export_duration_sum],
+                                    unit='s',
+                                    description='total time spent exporting batches')
+    meter.create_observable_counter('otel_wrapper.batch_processor.export.duration.bucket',
+                                    callbacks=[_observe_export_duration_buckets],
+                                    unit='{batch}',
+                                    description='cumulative histogram of export latency, with upper bounds in `le`')
+
+
+def register_batch_processor_metrics(monitor: BatchProcessorMonitor) -> None:
+    """
+    publish the processor's queue size, export counts, and export latency via the meter provider
+    """
+    _init_instruments()
+    _MONITORS.append(monitor)
@@ -0,0 +1,213 @@
+"""
+writes to a stream (e.g. stdout) from a dedicated thread, so a slow reader never blocks the caller
+
+when stdout is a pipe to a log shipper that applies backpressure (or just stops reading), writes to it block,
+which would stall whatever thread is exporting spans, and eventually anything waiting for that thread
+instead, `write` only appends to a bounded in-memory buffer and returns immediately,
+and when the buffer is full, either the incoming text or the oldest buffered text is dropped (and counted)
+
+the buffer size is approximate: it counts bytes when encoded as utf-8, and one more batch may be in the middle of
+being written by the writer thread while the buffer fills up again
+"""
+import sys
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Deque
+from typing import IO
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.config.otel_wrapper_console_spans import DROP_NEWEST
+from opentelemetry_wrapper.v0.config.otel_wrapper_console_spans import DROP_OLDEST
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+
+
+class NonBlockingWriter:
+    """
+    a bounded buffer in front of a text stream, drained by a daemon thread
+    """
+
+    def __init__(self,
+                 out: IO[str] = sys.stdout,
+                 *,
+                 max_bytes: int = 8 * 1024 * 1024,
+                 drop_policy: str = DROP_NEWEST,
+                 ) -> None:
+        """
+        :param out: text stream to write to, flushed after every write
+        :param max_bytes: maximum size of the text waiting to be written
+        :param drop_policy: when the buffer is full, `drop_newest` drops the incoming text,
+                            and `drop_oldest` drops the oldest text still waiting to be written
+        """
+        if max_bytes < 1:
+            raise ValueError(f'`max_bytes` must be positive, got {max_bytes!r}')
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f'`drop_policy` must be {DROP_NEWEST!r} or {DROP_OLDEST!r}, got {drop_policy!r}')
+
+        self.out = out
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+
+        self._chunks: Deque[Tuple[str, int, int]] = deque()  # (text, number of items, size in bytes)
+        self._buffered_bytes = 0
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+
+        # metrics (read by the meter provider on collection)
+        self.written_items = 0
+        self.written_bytes = 0
+        self.dropped_items = 0
+        self.dropped_bytes = 0
+
+        self._thread = threading.Thread(target=self._run, name='otel_wrapper.console_writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffered_bytes
+
+    def write(self, text: str, items: int = 1) -> bool:
+        """
+        :param text: text to write
+        :param items: how many items (e.g. spans) the text contains, for the written and dropped counts
+        :return: False if the text was dropped
+        """
+        size = len(text) if text.isascii() else len(text.encode('utf8'))
+        with self._condition:
+            if self._closed or size > self.max_bytes or (self.drop_policy == DROP_NEWEST
+                                                         and self._buffered_bytes + size > self.max_bytes):
+                self.dropped_items += items
+                self.dropped_bytes += size
+                return False
+
+            while self._buffered_bytes + size > self.max_bytes:
+                _text, _items, _size = self._chunks.popleft()
+                self._buffered_bytes -= _size
+                self.dropped_items += _items
+                self.dropped_bytes += _size
+
+            self._chunks.append((text, items, size))
+            self._buffered_bytes += size
+            self._condition.notify()
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._chunks and not self._closed:
+                    self._condition.wait()
+                if not self._chunks:  # closed, and everything has been written
+                    return
+                chunks: List[Tuple[str, int, int]] = list(self._chunks)
+                self._chunks.clear()
+                self._buffered_bytes = 0
+                self._writing = True
+
+            items = sum(_items for _text, _items, _size in chunks)
+            size = sum(_size for _text, _items, _size in chunks)
+            # noinspection PyBroadException
+            try:
+                self.out.write(''.join(_text for _text, _items, _size in chunks))
+                self.out.flush()
+                written = True
+            except Exception:  # e.g. a broken pipe, which can't be logged since logs probably go to the same place
+                written = False
+
+            with self._condition:
+                if written:
+                    self.written_items += items
+                    self.written_bytes += size
+                else:
+                    self.dropped_items += items
+                    self.dropped_bytes += size
+                self._writing = False
+                self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        wait until everything buffered so far has been written
+        :return: False if that didn't happen before the timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._chunks and not self._writing, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        stop accepting writes, and wait for the buffered text to be written
+        :return: False if that didn't happen before the timeout
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+
+_WRITERS: List[NonBlockingWriter] = []
+
+
+def _observe_written_items(_options: CallbackOptions) -> Iterable[Observation]:
+    for writer in list(_WRITERS):
+        yield Observation(writer.written_items)
+
+
+def _observe_dropped_items(_options: CallbackOptions) -> Iterable[Observation]:
+    for writer in list(_WRITERS):
+        yield Observation(writer.dropped_items)
+
+
+def _observe_written_bytes(_options: CallbackOptions) -> Iterable[Observation]:
+    for writer in list(_WRITERS):
+        yield Observation(writer.written_bytes)
+
+
+def _observe_dropped_bytes(_options: CallbackOptions) -> Iterable[Observation]:
+    for writer in list(_WRITERS):
+        yield Observation(writer.dropped_bytes)
+
+
+def _observe_buffered_bytes(_options: CallbackOptions) -> Iterable[Observation]:
+    for writer in list(_WRITERS):
+        yield Observation(writer.buffered_bytes)
+
+
+@lru_cache  # only run once
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.console.spans.written',
+                                    callbacks=[_observe_written_items],
+                                    unit='{span}',
+                                    description='spans written to the console')
+    meter.create_observable_counter('otel_wrapper.console.spans.dropped',
+                                    callbacks=[_observe_dropped_items],
+                                    unit='{span}',
+                                    description='spans dropped because the console could not keep up')
+    meter.create_observable_counter('otel_wrapper.console.bytes.written',
+                                    callbacks=[_observe_written_bytes],
+                                    unit='By',
+                                    description='bytes of span output written to the console')
+    meter.create_observable_counter('otel_wrapper.console.bytes.dropped',
+                                    callbacks=[_observe_dropped_bytes],
+                                    unit='By',
+                                    description='bytes of span output dropped because the console could not keep up')
+    meter.create_observable_gauge('otel_wrapper.console.bytes.buffered',
+                                  callbacks=[_observe_buffered_bytes],
+                                  unit='By',
+                                  description='bytes of span output waiting to be written to the console')
+
+
+def register_console_writer_metrics(writer: NonBlockingWriter) -> None:
+    """
+    publish the writer's written and dropped counts via the meter provider
+    """
+    _init_instruments()
+    _WRITERS.append(writer)
@@ -0,0 +1,148 @@
+"""
+RED (rate, errors, duration) metrics for decorated functions, without creating any spans
+
+recording a measurement via the opentelemetry sdk costs roughly as much as creating a span,
+so instead each function pre-aggregates its own call count, error count, and duration histogram in-process,
+and the totals are published via observable counters whenever the meter provider collects metrics.
+memory usage is fixed per function (one counter per histogram bucket), regardless of the call rate.
+functions with the same metric attributes share one aggregator (e.g. a closure that is decorated many times),
+since the exported metrics can only have one value per attribute set anyway.
+
+the duration histogram is published in the same shape as a prometheus histogram:
+* `otel_wrapper.function.duration.bucket` is a cumulative count per upper bound, with the bound in the `le` attribute
+* `otel_wrapper.function.duration.sum` is the total duration in seconds
+* `otel_wrapper.function.calls` doubles as the histogram count
+so `histogram_quantile(0.99, rate(otel_wrapper_function_duration_bucket_total[5m]))` works as expected
+"""
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+
+# exponential buckets, from 1 microsecond up to about 16 seconds
+DEFAULT_DURATION_BUCKETS: Tuple[float, ...] = tuple(0.000001 * 2 ** i for i in range(25))
+
+
+class FunctionMetrics:
+    """
+    in-process aggregation of calls, errors, and durations for a single function
+    updates are not locked; under the GIL these are effectively atomic, and at worst a count might be lost
+    """
+    __slots__ = ('attributes', 'boundaries', 'calls', 'errors', 'duration_sum', 'bucket_counts')
+
+    def __init__(self,
+                 attributes: Dict[str, str],
+                 boundaries: Sequence[float] = DEFAULT_DURATION_BUCKETS,
+                 ) -> None:
+        self.attributes = attributes
+        self.boundaries = tuple(boundaries)
+        self.calls = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.bucket_counts = [0] * (len(self.boundaries) + 1)  # the last one is the +Inf bucket
+
+    def record(self, duration: float, error: bool = False) -> None:
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.duration_sum += duration
+        self.bucket_counts[bisect_left(self.boundaries, duration)] += 1
+
+    def cumulative_buckets(self) -> List[Tuple[str, int]]:
+        """
+        the `le` labels are the shortest strings that round-trip, so that distinct boundaries never share a label
+        >>> function_metrics = FunctionMetrics({}, [0.0000012345, 0.00000123451, 1.048576])
+        >>> function_metrics.record(0.5)
+        >>> function_metrics.cumulative_buckets()
+        [('1.2345e-06', 0), ('1.23451e-06', 0), ('1.048576', 1), ('+Inf', 1)]
+        """
+        out = []
+        total = 0
+        for boundary, count in zip(self.boundaries, self.bucket_counts):
+            total += count
+            out.append((repr(boundary), total))
+        out.append(('+Inf', total + self.bucket_counts[-1]))
+        return out
+
+
+# keyed by attributes and bucket boundaries
+_REGISTRY: Dict[Tuple[FrozenSet[Tuple[str, str]], Tuple[float, ...]], FunctionMetrics] = {}
+
+
+def _observe_calls(_options: CallbackOptions) -> Iterable[Observation]:
+    for function_metrics in list(_REGISTRY.values()):
+        yield Observation(function_metrics.calls, function_metrics.attributes)
+
+
+def _observe_errors(_options: CallbackOptions) -> Iterable[Observation]:
+    for function_metrics in list(_REGISTRY.values()):
+        yield Observation(function_metrics.errors, function_metrics.attributes)
+
+
+def _observe_duration_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    for function_metrics in list(_REGISTRY.values()):
+        yield Observation(function_metrics.duration_sum, function_metrics.attributes)
+
+
+def _observe_duration_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    for function_metrics in list(_REGISTRY.values()):
+        for le, count in function_metrics.cumulative_buckets():
+            yield Observation(count, {**function_metrics.attributes, 'le': le})
+
+
+@lru_cache  # only run once
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.function.calls',
+                                    callbacks=[_observe_calls],
+                                    unit='{call}',
+                                    description='number of calls to the decorated function')
+    meter.create_observable_counter('otel_wrapper.function.errors',
+                                    callbacks=[_observe_errors],
+                                    unit='{call}',
+                                    description='number of calls to the decorated function that raised an exception')
+    meter.create_observable_counter('otel_wrapper.function.duration.sum',
+                                    callbacks=[_observe_duration_sum],
+                                    unit='s',
+                                    description='total time spent in the decorated function')
+    meter.create_observable_counter('otel_wrapper.function.duration.bucket',
+                                    callbacks=[_observe_duration_buckets],
+                                    unit='{call}',
+                                    description='cumulative histogram of call durations, with upper bounds in `le`')
+
+
+def register_function_metrics(attributes: Dict[str, str],
+                              buckets: Optional[Sequence[float]] = None,
+                              ) -> FunctionMetrics:
+    """
+    get the aggregator for a single function (shared with any other function with the same attributes and buckets),
+    and make sure it gets published via the meter provider
+
+    :param attributes: metric attributes identifying the function
+    :param buckets: upper bounds (in seconds) of the duration histogram buckets; defaults to exponential buckets
+    :return:
+    """
+    if buckets is None:
+        buckets = DEFAULT_DURATION_BUCKETS
+    else:
+        buckets = tuple(float(boundary) for boundary in buckets)
+        if not buckets or list(buckets) != sorted(set(buckets)) or buckets[0] <= 0:
+            raise ValueError(f'`buckets` must be strictly increasing positive numbers, got {buckets!r}')
+
+    _init_instruments()
+    key = (frozenset(attributes.items()), tuple(buckets))
+    function_metrics = _REGISTRY.get(key)
+    if function_metrics is None:
+        function_metrics = _REGISTRY.setdefault(key, FunctionMetrics(attributes, buckets))  # in case of a race
+    return function_metrics
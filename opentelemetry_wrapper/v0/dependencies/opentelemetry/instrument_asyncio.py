@@ -0,0 +1,290 @@
+"""
+monitor asyncio event loops for blocking code (e.g. sync code hiding in an async endpoint)
+
+* every callback (including every step of every task) run by an asyncio event loop is timed
+    * if it took longer than the threshold, an event is added to the span that was active inside the callback,
+      with the duration, the callback (or coroutine) name, and if possible, the stack of the code that was blocking
+    * if that span has already ended (e.g. the blocking code was in the last step of a decorated coroutine),
+      the event goes to the span that is active once the callback returns, or failing that, to a separate
+      `asyncio slow callback` span that is a child of the ended span
+    * the stack is captured by a watchdog thread while the callback is still running, since it's gone afterwards
+* each loop also gets a heartbeat, which measures how late the loop runs a callback that was scheduled on time
+    * published as a histogram: `otel_wrapper.asyncio.lag.samples`, `.sum`, and `.bucket`
+    * slow callbacks are counted in `otel_wrapper.asyncio.slow_callbacks`
+
+loops are monitored starting from the first callback they run, so this can be called before the loop exists
+this works by patching `asyncio.Handle`, so it doesn't work with loops that don't use it (e.g. uvloop),
+and timing each callback costs roughly a microsecond
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Union
+
+from opentelemetry import context
+from opentelemetry import trace
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import FunctionMetrics
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrument_decorate
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_tracer
+
+# span event (and its attributes) for a slow callback
+SLOW_CALLBACK_EVENT = 'asyncio slow callback'
+SLOW_CALLBACK_NAME = 'otel_wrapper.asyncio.callback'
+SLOW_CALLBACK_DURATION = 'otel_wrapper.asyncio.callback.duration'
+SLOW_CALLBACK_STACK = 'otel_wrapper.asyncio.callback.stack'
+
+_MAX_STACK_FRAMES = 32
+_LOOP_STATE_ATTR = '__otel_wrapper_loop_state__'
+
+_ORIGINAL_HANDLE_RUN = asyncio.Handle._run
+
+_TRACER = get_tracer(__name__, __version__)
+
+
+class _LoopState:
+    """
+    the callback currently running in one event loop, shared with the watchdog thread
+    """
+    __slots__ = ('thread_id', 'handle', 'start', 'stack', 'expected', '__weakref__')
+
+    def __init__(self) -> None:
+        self.thread_id = threading.get_ident()
+        self.handle: Optional[asyncio.Handle] = None
+        self.start = 0.0
+        self.stack: Optional[str] = None
+        self.expected = 0.0  # when the next heartbeat should run, in loop time
+
+
+class _EventLoopMonitor:
+    def __init__(self, slow_callback: float, lag_interval: float) -> None:
+        self.slow_callback = slow_callback
+        self.lag_interval = lag_interval
+        self.lag = FunctionMetrics({})
+        self.slow_callbacks = FunctionMetrics({})
+        self.states: 'weakref.WeakSet[_LoopState]' = weakref.WeakSet()
+        self._watchdog = threading.Thread(target=self._watch, name='otel_wrapper.asyncio_watchdog', daemon=True)
+        self._watchdog.start()
+
+    def state(self, loop: asyncio.AbstractEventLoop) -> Optional[_LoopState]:
+        """
+        get the state for a loop, and start monitoring it the first time it's seen
+        """
+        state = getattr(loop, _LOOP_STATE_ATTR, None)
+        if state is None:
+            state = _LoopState()
+            try:
+                setattr(loop, _LOOP_STATE_ATTR, state)
+            except AttributeError:  # not a normal event loop
+                return None
+            self.states.add(state)
+            state.expected = loop.time() + self.lag_interval
+            loop.call_later(self.lag_interval, self._heartbeat, loop, state)
+        return state
+
+    def _heartbeat(self, loop: asyncio.AbstractEventLoop, state: _LoopState) -> None:
+        now = loop.time()
+        self.lag.record(max(0.0, now - state.expected))
+        state.expected = now + self.lag_interval
+        loop.call_later(self.lag_interval, self._heartbeat, loop, state)
+
+    def _watch(self) -> None:
+        """
+        captures the stack of any loop that has been stuck in the same callback for longer than the threshold
+        """
+        while True:
+            time.sleep(max(0.001, self.slow_callback / 2))
+            now = time.perf_counter()
+            for state in list(self.states):
+                handle = state.handle
+                if handle is None or state.stack is not None or now - state.start < self.slow_callback:
+                    continue
+                frame = sys._current_frames().get(state.thread_id)
+                if frame is not None and state.handle is handle:
+                    state.stack = ''.join(traceback.format_stack(frame, limit=_MAX_STACK_FRAMES))
+
+    def report(self,
+               handle: asyncio.Handle,
+               duration: float,
+               stack: Optional[str],
+               started_in: context.Context,
+               ) -> None:
+        """
+        blocking code in the last step of a decorated coroutine ends the coroutine's span before this is called
+        >>> from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        >>> from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        >>> exporter = InMemorySpanExporter()
+        >>> trace.get_tracer_provider().add_span_processor(SimpleSpanProcessor(exporter))
+        >>> instrument_event_loop(slow_callback_ms=20)
+        >>> @instrument_decorate
+        ... async def blocking():
+        ...     await asyncio.sleep(0)
+        ...     time.sleep(0.05)
+        >>> async def main():
+        ...     await asyncio.gather(blocking())
+        >>> asyncio.run(main())
+        >>> [span.name for span in exporter.get_finished_spans() if span.name == SLOW_CALLBACK_EVENT]
+        ['asyncio slow callback']
+        >>> exporter.shutdown()
+
+        :param handle: the slow callback
+        :param duration: how long it ran for, in seconds
+        :param stack: the stack captured by the watchdog, if any
+        :param started_in: the otel context that was current when the callback started
+        """
+        self.slow_callbacks.record(duration)
+        attributes: Dict[str, Union[str, float]] = {
+            SLOW_CALLBACK_NAME:     _describe_callback(handle),
+            SLOW_CALLBACK_DURATION: duration,
+        }
+        if stack is not None:
+            attributes[SLOW_CALLBACK_STACK] = stack
+
+        # the span that was active inside the callback, which may have been started or ended by the callback itself
+        # noinspection PyProtectedMember
+        span = handle._context.run(trace.get_current_span)  # type: ignore[attr-defined]
+        if not span.is_recording():
+            span = trace.get_current_span(started_in)
+        if span.is_recording():
+            span.add_event(SLOW_CALLBACK_EVENT, attributes)
+            return
+
+        # the span ended during the callback, and nothing above it is still recording, so record a span of its own
+        if span.get_span_context().is_valid:
+            end_time = time.time_ns()
+            _TRACER.start_span(SLOW_CALLBACK_EVENT,
+                               context=started_in,
+                               attributes=attributes,
+                               start_time=end_time - int(duration * 1e9),
+                               ).end(end_time=end_time)
+
+
+def _describe_callback(handle: asyncio.Handle) -> str:
+    # noinspection PyProtectedMember
+    callback: Any = handle._callback  # type: ignore[attr-defined]
+    task = getattr(callback, '__self__', None)
+    if isinstance(task, asyncio.Task):  # a step of a task
+        coro = task.get_coro()
+        return f'{task.get_name()}: {getattr(coro, "__qualname__", repr(coro))}'
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+_MONITOR: Optional[_EventLoopMonitor] = None
+
+
+def _monitored_handle_run(self: asyncio.Handle) -> None:
+    monitor = _MONITOR
+    # noinspection PyProtectedMember
+    state = monitor.state(self._loop) if monitor is not None else None  # type: ignore[attr-defined]
+    if state is None or state.handle is not None:  # not monitored, or a nested loop (only time the outer callback)
+        return _ORIGINAL_HANDLE_RUN(self)
+
+    # if the callback ends the span it ran in, the span is no longer in its context afterwards
+    # noinspection PyProtectedMember
+    started_in = self._context.run(context.get_current)  # type: ignore[attr-defined]
+    state.stack = None
+    state.start = start = time.perf_counter()
+    state.handle = self
+    try:
+        return _ORIGINAL_HANDLE_RUN(self)
+    finally:
+        state.handle = None
+        duration = time.perf_counter() - start
+        if duration >= monitor.slow_callback:  # type: ignore[union-attr]
+            monitor.report(self, duration, state.stack, started_in)  # type: ignore[union-attr]
+
+
+def _observe_lag_samples(_options: CallbackOptions) -> Iterable[Observation]:
+    if _MONITOR is not None:
+        yield Observation(_MONITOR.lag.calls)
+
+
+def _observe_lag_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    if _MONITOR is not None:
+        yield Observation(_MONITOR.lag.duration_sum)
+
+
+def _observe_lag_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    if _MONITOR is not None:
+        for le, count in _MONITOR.lag.cumulative_buckets():
+            yield Observation(count, {'le': le})
+
+
+def _observe_slow_callbacks(_options: CallbackOptions) -> Iterable[Observation]:
+    if _MONITOR is not None:
+        yield Observation(_MONITOR.slow_callbacks.calls)
+
+
+def _observe_slow_callbacks_duration(_options: CallbackOptions) -> Iterable[Observation]:
+    if _MONITOR is not None:
+        yield Observation(_MONITOR.slow_callbacks.duration_sum)
+
+
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.asyncio.lag.samples',
+                                    callbacks=[_observe_lag_samples],
+                                    unit='{sample}',
+                                    description='number of event loop lag measurements')
+    meter.create_observable_counter('otel_wrapper.asyncio.lag.sum',
+                                    callbacks=[_observe_lag_sum],
+                                    unit='s',
+                                    description='total event loop lag (how late scheduled callbacks were run)')
+    meter.create_observable_counter('otel_wrapper.asyncio.lag.bucket',
+                                    callbacks=[_observe_lag_buckets],
+                                    unit='{sample}',
+                                    description='cumulative histogram of event loop lag, with upper bounds in `le`')
+    meter.create_observable_counter('otel_wrapper.asyncio.slow_callbacks',
+                                    callbacks=[_observe_slow_callbacks],
+                                    unit='{callback}',
+                                    description='number of callbacks that blocked the event loop for too long')
+    meter.create_observable_counter('otel_wrapper.asyncio.slow_callbacks.duration',
+                                    callbacks=[_observe_slow_callbacks_duration],
+                                    unit='s',
+                                    description='total time the event loop was blocked by slow callbacks')
+
+
+@instrument_decorate
+def instrument_event_loop(slow_callback_ms: Optional[float] = None,
+                          lag_interval: float = 0.1,
+                          ):
+    """
+    start monitoring all asyncio event loops for lag and slow callbacks
+    calling this again only updates the settings
+
+    :param slow_callback_ms: report callbacks that block the loop for at least this long
+                             (default: `OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS`)
+    :param lag_interval: seconds between heartbeats used to measure event loop lag
+    """
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return
+
+    if slow_callback_ms is None:
+        slow_callback_ms = OTEL_WRAPPER_ASYNCIO_SLOW_CALLBACK_MS
+    if not slow_callback_ms > 0:
+        raise ValueError(f'`slow_callback_ms` must be positive, got {slow_callback_ms!r}')
+    if not lag_interval > 0:
+        raise ValueError(f'`lag_interval` must be positive, got {lag_interval!r}')
+
+    global _MONITOR
+    if _MONITOR is None:
+        _MONITOR = _EventLoopMonitor(slow_callback_ms / 1000, lag_interval)
+        asyncio.Handle._run = _monitored_handle_run  # type: ignore[method-assign]
+        _init_instruments()
+    else:
+        _MONITOR.slow_callback = slow_callback_ms / 1000
+        _MONITOR.lag_interval = lag_interval
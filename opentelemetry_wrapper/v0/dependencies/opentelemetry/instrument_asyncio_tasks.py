@@ -0,0 +1,343 @@
+"""
+asyncio task lifecycle metrics, to find fan-out code that starts more tasks than the event loop can keep up with
+    async def main():
+        instrument_asyncio_tasks()  # e.g. in a fastapi startup handler
+        ...
+
+a task factory wraps the coroutine of every task created by the loop, and times each step, which records:
+* `delay`: how long the task waited between being created and first running (high when the loop is saturated)
+* `run_time`: total time the task actually spent running, excluding time spent suspended
+* `suspensions`: how many times the task was suspended (i.e. awaited something that wasn't ready)
+* whether the task was cancelled
+
+these are aggregated per coroutine name (e.g. `<my_module>.fetch_one`) and published via observable instruments:
+* `otel_wrapper.asyncio.tasks.created`, `.tasks.finished`, `.tasks.cancelled`, `.tasks.suspensions`
+* `otel_wrapper.asyncio.tasks.delay.sum` and `.delay.bucket`, `.tasks.run_time.sum` and `.run_time.bucket`
+* `otel_wrapper.asyncio.tasks.active`, the number of tasks that have been created but not finished
+if `slow_task_ms` is set, a span is also created for each task that took at least that long from creation to finish
+(as a child of the span that was active when the task was created, with the start time back-filled)
+
+each task costs roughly 5 extra microseconds, plus under a microsecond per step
+`task.get_coro()` returns the wrapper, which forwards attributes like `cr_code` and `cr_frame` to the coroutine
+"""
+import asyncio
+import inspect
+import os
+import time
+from collections.abc import Coroutine
+from functools import lru_cache
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+from opentelemetry.trace import Status
+from opentelemetry.trace import StatusCode
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import FunctionMetrics
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrument_decorate
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_tracer
+from opentelemetry_wrapper.v0.utils.interning import intern_span_name
+
+_TRACER = get_tracer(__name__, __version__)
+
+# span attributes for slow tasks (all durations are in seconds)
+TASK_NAME = 'otel_wrapper.asyncio.task.name'
+TASK_DELAY = 'otel_wrapper.asyncio.task.delay'
+TASK_RUN_TIME = 'otel_wrapper.asyncio.task.run_time'
+TASK_SUSPENSIONS = 'otel_wrapper.asyncio.task.suspensions'
+TASK_CANCELLED = 'otel_wrapper.asyncio.task.cancelled'
+
+_MAX_COROUTINE_NAMES = 1000  # beyond this, tasks are aggregated under `_OTHER_COROUTINES` to bound cardinality
+_OTHER_COROUTINES = '<other>'
+
+
+class _CoroutineMetrics:
+    """
+    aggregated lifecycle of all the tasks running the same coroutine function
+    """
+    __slots__ = ('name', 'span_name', 'attributes', 'created', 'cancelled', 'suspensions', 'delay', 'run_time')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.span_name = intern_span_name(f'asyncio.Task {name}')
+        self.attributes = {'coroutine': name}
+        self.created = 0
+        self.cancelled = 0
+        self.suspensions = 0
+        self.delay = FunctionMetrics(self.attributes)
+        self.run_time = FunctionMetrics(self.attributes)  # also counts finished tasks
+
+
+_METRICS_BY_CODE: Dict[Any, _CoroutineMetrics] = dict()  # code object -> metrics
+_METRICS_BY_NAME: Dict[str, _CoroutineMetrics] = dict()  # coroutines with the same name share their metrics
+
+
+def _coroutine_name(code: Any) -> str:
+    """
+    same format as `CodeInfo.name`, which can't find the module of a coroutine object (only of its code object)
+    """
+    qualname = getattr(code, 'co_qualname', code.co_name)  # co_qualname was only added in python 3.11
+    module = inspect.getmodule(code)
+    if module is None:
+        return f'<{os.path.basename(code.co_filename)}:{code.co_firstlineno}>.{qualname}'
+    return f'<{module.__name__}>.{qualname}'
+
+
+def _get_coroutine_metrics(coro: Any) -> _CoroutineMetrics:
+    code = coro.cr_code
+    metrics = _METRICS_BY_CODE.get(code)
+    if metrics is None:
+        name = _coroutine_name(code) if len(_METRICS_BY_NAME) < _MAX_COROUTINE_NAMES else _OTHER_COROUTINES
+        metrics = _METRICS_BY_NAME.get(name)
+        if metrics is None:
+            metrics = _METRICS_BY_NAME[name] = _CoroutineMetrics(name)
+        _METRICS_BY_CODE[code] = metrics
+    return metrics
+
+
+class _TaskStats:
+    __slots__ = ('metrics', 'slow_task', 'created', 'first_run', 'run_time', 'steps')
+
+    def __init__(self, metrics: _CoroutineMetrics, slow_task: Optional[float]) -> None:
+        self.metrics = metrics
+        self.slow_task = slow_task
+        self.created = time.perf_counter()
+        self.first_run = 0.0
+        self.run_time = 0.0
+        self.steps = 0
+
+    def finish(self, exc: BaseException) -> None:
+        """
+        called from inside the task's last step (instead of a done callback, which would cost another loop iteration)
+        so the current span is the one that was active when the task was created
+        """
+        metrics = self.metrics
+        cancelled = isinstance(exc, asyncio.CancelledError)
+        if cancelled:
+            metrics.cancelled += 1
+        metrics.delay.record(self.first_run - self.created)
+        metrics.suspensions += self.steps - 1
+        metrics.run_time.record(self.run_time)
+
+        if self.slow_task is not None:
+            end = time.perf_counter()
+            if end - self.created >= self.slow_task:
+                self._emit_slow_task_span(end, cancelled, None if isinstance(exc, StopIteration) or cancelled else exc)
+
+    def _emit_slow_task_span(self, end: float, cancelled: bool, exc: Optional[BaseException]) -> None:
+        end_time = time.time_ns()
+        span = _TRACER.start_span(self.metrics.span_name,
+                                  attributes=self.metrics.attributes,
+                                  start_time=end_time - int((end - self.created) * 1e9))
+        if span.is_recording():
+            task = asyncio.current_task()
+            span.set_attributes({
+                TASK_NAME:        task.get_name() if task is not None else '',
+                TASK_DELAY:       self.first_run - self.created,
+                TASK_RUN_TIME:    self.run_time,
+                TASK_SUSPENSIONS: self.steps - 1,
+                TASK_CANCELLED:   cancelled,
+            })
+            if exc is not None:
+                span.record_exception(exc)
+                span.set_status(Status(StatusCode.ERROR, f'{type(exc).__name__}: {exc}'))
+            else:
+                span.set_status(Status(StatusCode.OK))
+        span.end(end_time=end_time)
+
+
+class _TimedCoroutine(Coroutine):
+    """
+    wraps a coroutine to time each step of the task running it
+    """
+    __slots__ = ('_coro', '_stats')
+
+    def __init__(self, coro: Any, stats: _TaskStats) -> None:
+        self._coro = coro
+        self._stats = stats
+
+    def _step(self, method: Callable, *args: Any) -> Any:
+        stats = self._stats
+        start = time.perf_counter()
+        if not stats.steps:
+            stats.first_run = start
+        try:
+            out = method(*args)
+        except BaseException as e:  # including StopIteration, when the coroutine returns
+            stats.run_time += time.perf_counter() - start
+            stats.steps += 1
+            stats.finish(e)
+            raise
+        stats.run_time += time.perf_counter() - start
+        stats.steps += 1
+        return out
+
+    def send(self, value: Any) -> Any:
+        return self._step(self._coro.send, value)
+
+    def throw(self, *args: Any) -> Any:
+        return self._step(self._coro.throw, *args)
+
+    def close(self) -> None:
+        self._coro.close()
+
+    def __await__(self) -> Any:
+        return self._coro.__await__()
+
+    def __getattr__(self, name: str) -> Any:
+        # forward everything else (e.g. `__qualname__` and `cr_frame`, for task reprs and debuggers) to the coroutine
+        return getattr(self._coro, name)
+
+    @property
+    def __otel_wrapper_coro__(self) -> Any:
+        return self._coro
+
+    def __repr__(self) -> str:
+        return repr(self._coro)
+
+
+class _TaskFactory:
+    """
+    creates tasks like the default task factory (or the previous one, if any), with timed coroutines
+    """
+
+    def __init__(self, previous: Optional[Callable], slow_task: Optional[float]) -> None:
+        self.previous = previous
+        self.slow_task = slow_task
+
+    def __call__(self, loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any) -> asyncio.Future:
+        if inspect.iscoroutine(coro):  # not e.g. generator-based coroutines
+            stats = _TaskStats(_get_coroutine_metrics(coro), self.slow_task)
+            stats.metrics.created += 1
+            coro = _TimedCoroutine(coro, stats)
+        if self.previous is not None:
+            return self.previous(loop, coro, **kwargs)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+
+def _observe_created(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.created, metrics.attributes)
+
+
+def _observe_finished(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.run_time.calls, metrics.attributes)
+
+
+def _observe_active(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.created - metrics.run_time.calls, metrics.attributes)
+
+
+def _observe_cancelled(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.cancelled, metrics.attributes)
+
+
+def _observe_suspensions(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.suspensions, metrics.attributes)
+
+
+def _observe_delay_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.delay.duration_sum, metrics.attributes)
+
+
+def _observe_delay_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        for le, count in metrics.delay.cumulative_buckets():
+            yield Observation(count, {**metrics.attributes, 'le': le})
+
+
+def _observe_run_time_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        yield Observation(metrics.run_time.duration_sum, metrics.attributes)
+
+
+def _observe_run_time_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    for metrics in list(_METRICS_BY_NAME.values()):
+        for le, count in metrics.run_time.cumulative_buckets():
+            yield Observation(count, {**metrics.attributes, 'le': le})
+
+
+@lru_cache  # only run once
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.created',
+                                    callbacks=[_observe_created],
+                                    unit='{task}',
+                                    description='number of tasks created, per `coroutine`')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.finished',
+                                    callbacks=[_observe_finished],
+                                    unit='{task}',
+                                    description='number of tasks finished (including cancelled), per `coroutine`')
+    meter.create_observable_gauge('otel_wrapper.asyncio.tasks.active',
+                                  callbacks=[_observe_active],
+                                  unit='{task}',
+                                  description='number of tasks created but not yet finished, per `coroutine`')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.cancelled',
+                                    callbacks=[_observe_cancelled],
+                                    unit='{task}',
+                                    description='number of tasks cancelled, per `coroutine`')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.suspensions',
+                                    callbacks=[_observe_suspensions],
+                                    unit='{suspension}',
+                                    description='number of times finished tasks were suspended, per `coroutine`')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.delay.sum',
+                                    callbacks=[_observe_delay_sum],
+                                    unit='s',
+                                    description='total time tasks waited between being created and first running')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.delay.bucket',
+                                    callbacks=[_observe_delay_buckets],
+                                    unit='{task}',
+                                    description='cumulative histogram of task start delay, with upper bounds in `le`')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.run_time.sum',
+                                    callbacks=[_observe_run_time_sum],
+                                    unit='s',
+                                    description='total time finished tasks spent running (excluding suspensions)')
+    meter.create_observable_counter('otel_wrapper.asyncio.tasks.run_time.bucket',
+                                    callbacks=[_observe_run_time_buckets],
+                                    unit='{task}',
+                                    description='cumulative histogram of task run time, with upper bounds in `le`')
+
+
+@instrument_decorate
+def instrument_asyncio_tasks(loop: Optional[asyncio.AbstractEventLoop] = None,
+                             slow_task_ms: Optional[float] = None,
+                             ):
+    """
+    install a task factory that records the lifecycle of every task created afterwards
+    wraps any task factory that was already set, and calling this again only updates the settings
+
+    :param loop: event loop to instrument (default: the running loop)
+    :param slow_task_ms: if set, create a span for each task that takes at least this long from creation to finish
+    """
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return
+
+    if slow_task_ms is not None and not slow_task_ms > 0:
+        raise ValueError(f'`slow_task_ms` must be positive, got {slow_task_ms!r}')
+    if loop is None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            raise RuntimeError('no running event loop, call this from inside the loop (e.g. in a startup handler) '
+                               'or pass the loop explicitly') from None
+
+    slow_task = slow_task_ms / 1000 if slow_task_ms is not None else None
+    factory = loop.get_task_factory()
+    if isinstance(factory, _TaskFactory):
+        factory.slow_task = slow_task
+    else:
+        loop.set_task_factory(_TaskFactory(factory, slow_task))
+    _init_instruments()
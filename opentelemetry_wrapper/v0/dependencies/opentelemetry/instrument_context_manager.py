@@ -0,0 +1,204 @@
+"""
+`otel` can be used both as a decorator (like `instrument_decorate`) and as a nestable context manager
+    with otel:
+        ...  # span name is based on where the `with` statement is
+
+    with otel('load config', sample=0.1):
+        ...
+
+    @otel(sample=0.01)
+    def f():
+        ...
+
+to time a block inside a hot loop, create the context manager once outside the loop and reuse it
+the span name, attributes, and sampler are all computed when the object is created, so entering it is cheap
+    block = otel('inner loop')
+    for x in xs:
+        with block:
+            ...
+"""
+import sys
+from contextvars import ContextVar
+from functools import lru_cache
+from types import CodeType
+from typing import Any
+from typing import Dict
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from opentelemetry import context
+from opentelemetry import trace
+from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import Span
+from opentelemetry.trace import Status
+from opentelemetry.trace import StatusCode
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+from opentelemetry_wrapper.v0.dependencies.opentelemetry import instrument_decorator
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrument_decorate
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_tracer
+from opentelemetry_wrapper.v0.utils.interning import freeze_attributes
+from opentelemetry_wrapper.v0.utils.interning import intern_span_name
+from opentelemetry_wrapper.v0.utils.sampling import make_sampler
+
+_TRACER = get_tracer(__name__, __version__)  # TODO: move this somewhere else
+
+_MISSING: Any = object()
+
+# spans opened by `with otel...`, innermost first, as a linked list of (span, context token, parent)
+# this lives in a contextvar rather than on the object, so that the same object can be nested and shared
+_OPEN_SPANS: ContextVar[Optional[Tuple[Optional[Span], Optional[object], Any]]] = ContextVar('_OPEN_SPANS',
+                                                                                             default=None)
+
+
+@lru_cache(maxsize=4096)
+def _span_info_from_code(code: CodeType,
+                         lineno: int,
+                         module_name: str,
+                         ) -> Tuple[str, Mapping[str, Union[str, int]]]:
+    """
+    span name and attributes for a `with` block, based on where it is in the source code
+    """
+    qualname = getattr(code, 'co_qualname', code.co_name)  # co_qualname was only added in python 3.11
+    span_attributes = {
+        SpanAttributes.CODE_FUNCTION:  qualname,
+        SpanAttributes.CODE_NAMESPACE: module_name,
+        SpanAttributes.CODE_FILEPATH:  code.co_filename,
+        SpanAttributes.CODE_LINENO:    lineno,
+    }
+    return intern_span_name(f'<{module_name}>.{qualname}:{lineno}'), freeze_attributes(span_attributes)
+
+
+def _caller_span_info(depth: int) -> Tuple[str, Mapping[str, Union[str, int]]]:
+    frame = sys._getframe(depth + 1)
+    return _span_info_from_code(frame.f_code, frame.f_lineno, frame.f_globals.get('__name__', '__main__'))
+
+
+class OtelContextManager:
+    """
+    see module docstring for usage
+
+    entering this calls `start_span` and attaches the span's context directly,
+    skipping the generator-based context manager that `start_as_current_span` uses
+    """
+    __slots__ = ('_name', '_sample', '_max_rate', '_sampler', '_span_info')
+
+    def __init__(self,
+                 name: Optional[str] = None,
+                 *,
+                 sample: Optional[float] = None,
+                 max_rate: Optional[float] = None,
+                 attributes: Optional[Mapping[str, Union[str, int, float, bool]]] = None,
+                 _depth: Optional[int] = 1,
+                 ) -> None:
+        """
+        :param name: span name; if not set, it is based on the line of code that created this object
+        :param sample: probability of creating a span each time this is entered, between 0 and 1 (default: always)
+        :param max_rate: maximum number of spans per second (default: unlimited)
+        :param attributes: additional span attributes
+        :param _depth: how many frames up to look for the span name; None means to look it up each time it is entered
+        """
+        self._name = name
+        self._sample = sample
+        self._max_rate = max_rate
+        self._sampler = make_sampler(sample, max_rate)
+
+        # precompute the span name and attributes
+        self._span_info: Optional[Tuple[str, Mapping[str, Union[str, int, float, bool]]]] = None
+        if _depth is not None:
+            span_name, span_attributes = _caller_span_info(_depth)
+            if name is not None or attributes:
+                _attributes: Dict[str, Union[str, int, float, bool]] = dict(span_attributes)
+                if attributes:
+                    _attributes.update(attributes)
+                span_attributes = freeze_attributes(_attributes)
+            self._span_info = (intern_span_name(name or span_name), span_attributes)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(name={self._name!r}, sample={self._sample!r}, max_rate={self._max_rate!r})'
+
+    def __call__(self,
+                 thing: Any = _MISSING,
+                 /, *,
+                 sample: Optional[float] = _MISSING,
+                 max_rate: Optional[float] = _MISSING,
+                 attributes: Optional[Mapping[str, Union[str, int, float, bool]]] = None,
+                 ) -> Any:
+        """
+        * `otel(name, **kwargs)` or `otel(**kwargs)` returns a new context manager
+        * `otel(func)` instruments a function or class, same as `instrument_decorate`
+
+        :param thing: span name, or a function or class to instrument
+        :param sample: probability of creating a span, between 0 and 1 (default: always)
+        :param max_rate: maximum number of spans per second (default: unlimited)
+        :param attributes: additional span attributes (for context managers only)
+        :return:
+        """
+        if sample is _MISSING:
+            sample = self._sample
+        if max_rate is _MISSING:
+            max_rate = self._max_rate
+
+        if thing is _MISSING or thing is None or isinstance(thing, str):
+            name = self._name if thing is _MISSING or thing is None else thing
+            return OtelContextManager(name, sample=sample, max_rate=max_rate, attributes=attributes, _depth=2)
+
+        if not callable(thing):
+            raise TypeError(f'expected a span name, function, or class, got {type(thing)}')
+        return instrument_decorate(thing, func_name=self._name, sample=sample, max_rate=max_rate)
+
+    def __enter__(self) -> Span:
+        return self._enter(2)
+
+    def _enter(self, depth: int) -> Span:
+        # no-op
+        if OTEL_WRAPPER_DISABLED:
+            return trace.INVALID_SPAN
+
+        # disabled at runtime, or not sampled
+        if not instrument_decorator._ENABLED or (self._sampler is not None and not self._sampler()):
+            _OPEN_SPANS.set((None, None, _OPEN_SPANS.get()))
+            return trace.INVALID_SPAN
+
+        span_name, span_attributes = self._span_info or _caller_span_info(depth)
+        span = _TRACER.start_span(span_name, attributes=span_attributes)
+        token = context.attach(trace.set_span_in_context(span))
+        _OPEN_SPANS.set((span, token, _OPEN_SPANS.get()))
+        return span
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # no-op
+        if OTEL_WRAPPER_DISABLED:
+            return
+
+        open_spans = _OPEN_SPANS.get()
+        if open_spans is None:
+            raise RuntimeError('exited more `with otel` blocks than were entered')
+        span, token, parent = open_spans
+        _OPEN_SPANS.set(parent)
+        if span is None:
+            return
+
+        try:
+            if span.is_recording():
+                if exc_val is not None:
+                    span.record_exception(exc_val)
+                    span.set_status(Status(StatusCode.ERROR, f'{type(exc_val).__name__}: {exc_val}'))
+                else:
+                    span.set_status(Status(StatusCode.OK))
+        finally:
+            context.detach(token)  # type: ignore[arg-type]
+            span.end()
+
+    async def __aenter__(self) -> Span:
+        return self._enter(2)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        return self.__exit__(exc_type, exc_val, exc_tb)
+
+
+# the span name for a bare `with otel:` is looked up each time, since it depends on where it's used
+otel = OtelContextManager(_depth=None)
@@ -6,6 +6,7 @@ from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrument_decorate
 
 _ORIGINAL = None
+_WRAPPED = None
 
 
 @instrument_decorate
@@ -20,7 +21,7 @@ def instrument_dataclasses() -> None:
     if OTEL_WRAPPER_DISABLED:
         return
 
-    global _ORIGINAL
+    global _ORIGINAL, _WRAPPED
     if _ORIGINAL is None:
         _ORIGINAL = dataclasses.dataclass
 
@@ -36,4 +37,17 @@ def instrument_dataclasses() -> None:
 
                 return double_wrap
 
+        _WRAPPED = wrapped
         dataclasses.dataclass = wrapped
+
+
+def _set_dataclass_patch_enabled(enabled: bool) -> None:
+    """
+    swap `dataclasses.dataclass` back to the original (or vice versa), if `instrument_dataclasses` was called
+    note that code which already imported `dataclass` still holds a reference to the patched version
+    """
+    if _ORIGINAL is None or _WRAPPED is None:
+        return
+    current, new = (_ORIGINAL, _WRAPPED) if enabled else (_WRAPPED, _ORIGINAL)
+    if dataclasses.dataclass is current:
+        dataclasses.dataclass = new
@@ -1,39 +1,128 @@
 import asyncio
+import contextlib
 import inspect
+import sys
+import time
+import weakref
+from contextvars import ContextVar
 from functools import cached_property
+from functools import lru_cache
 from functools import wraps
+from types import FunctionType
+from types import MappingProxyType
+from types import MethodDescriptorType
+from types import MethodType
+from typing import Any
 from typing import Callable
+from typing import Collection
 from typing import Coroutine
 from typing import Dict
+from typing import AsyncIterator
+from typing import Iterator
+from typing import Mapping
+from typing import NamedTuple
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
 from typing import TypeVar
 from typing import Union
 
+from opentelemetry import context
+from opentelemetry import trace
 from opentelemetry.semconv.trace import SpanAttributes
+from opentelemetry.trace import Span
 from opentelemetry.trace import Status
 from opentelemetry.trace import StatusCode
 
 from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import FunctionMetrics
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import register_function_metrics
 from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_tracer
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_coalescing import CoalescingSpanProcessor
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_probes import SpanProbes
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_probes import make_probes
+from opentelemetry_wrapper.v0.utils.interning import freeze_attributes
+from opentelemetry_wrapper.v0.utils.interning import intern_span_name
 from opentelemetry_wrapper.v0.utils.introspect import CodeInfo
+from opentelemetry_wrapper.v0.utils.introspect import get_code_info
 from opentelemetry_wrapper.v0.utils.introspect import unwrap_function
+from opentelemetry_wrapper.v0.utils.sampling import make_sampler
+from opentelemetry_wrapper.v0.utils.weak_cache import BoundedWeakCache
 
 _TRACER = get_tracer(__name__, __version__)  # TODO: move this somewhere else
 
 InstrumentableThing = TypeVar('InstrumentableThing', Callable, Coroutine, type)
 
-_CACHE_INSTRUMENTED: Dict[InstrumentableThing, Optional[InstrumentableThing]] = dict()  # type: ignore[valid-type]
-_CACHE_GETATTRIBUTE: Dict[InstrumentableThing, InstrumentableThing] = dict()  # type: ignore[valid-type]
+# maps original -> instrumented, or instrumented -> None
+# keys and values are weakly referenced, so this never keeps a function, class, or closure alive
+_CACHE_INSTRUMENTED = BoundedWeakCache(maxsize=0x10000)
+_MISSING = object()
+
+# also mark the instrumented functions and classes themselves, in case they get evicted from the cache
+_INSTRUMENTED_MARKER = '__otel_wrapper_instrumented__'
+
+# runtime kill switch, checked on every call (see `_set_instrumentation_enabled`)
+_ENABLED = True
+
+# instrumented classes, and where each one stores a list of (attribute name, original, instrumented)
+_INSTRUMENTED_CLASSES: 'weakref.WeakSet[type]' = weakref.WeakSet()
+_CLASS_PATCHES_ATTR = '__otel_wrapper_patches__'
+
+# instrumented class -> the options its subclasses are instrumented with (see `_install_subclass_hook`)
+_SUBCLASS_OPTIONS: 'weakref.WeakKeyDictionary[type, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+
+
+async def _async_generator() -> AsyncIterator[None]:
+    yield
+
+
+# every function decorated with @contextmanager shares the same code object (likewise for @asynccontextmanager)
+_CONTEXT_MANAGER_CODE = contextlib.contextmanager(lambda: iter(())).__code__
+_ASYNC_CONTEXT_MANAGER_CODE = contextlib.asynccontextmanager(_async_generator).__code__
+
+# span attributes for generators and async generators
+GENERATOR_ITEMS = 'otel_wrapper.generator.items'
+GENERATOR_TIME_TO_FIRST_ITEM = 'otel_wrapper.generator.time_to_first_item'
+GENERATOR_DURATION = 'otel_wrapper.generator.duration'
+GENERATOR_ITEMS_PER_SECOND = 'otel_wrapper.generator.items_per_second'
+
+# span attributes for `collapse_recursion`
+RECURSION_MAX_DEPTH = 'otel_wrapper.recursion.max_depth'
+RECURSION_CALLS = 'otel_wrapper.recursion.calls'
+
+# functions with `collapse_recursion` that are currently running in this context -> their recursion state
+# this is a single module-level contextvar (rather than one per function), since contextvars are never freed
+_ACTIVE_RECURSION: ContextVar[Mapping[object, '_RecursionState']] = ContextVar('_ACTIVE_RECURSION',
+                                                                               default=MappingProxyType({}))
+
+
+class PropertyInfo(NamedTuple):
+    span_name: str
+    lineno: Optional[int]
+    attributes: Mapping[str, Union[str, int]]
+
+
+# instrumented class -> property name -> precomputed span metadata
+_PROPERTY_INDEX: 'weakref.WeakKeyDictionary[type, Dict[str, PropertyInfo]]' = weakref.WeakKeyDictionary()
 
 
 def instrument_decorate(func: InstrumentableThing,
                         /, *,
                         func_name: Optional[str] = None,
+                        sample: Optional[float] = None,
+                        max_rate: Optional[float] = None,
+                        metrics_only: bool = False,
+                        buckets: Optional[Sequence[float]] = None,
+                        collapse_recursion: bool = False,
+                        coalesce: bool = False,
+                        min_duration_ms: Optional[float] = None,
+                        probes: Optional[Collection[str]] = None,
                         ) -> InstrumentableThing:
     """
     use as a decorator to start a new trace with any class, function, or async function
     for a class, it will instrument the new, init, and call dunders, as well as any defined methods and properties
+    for a generator (or async generator, or @contextmanager), the span covers the entire iteration (or `with` block)
 
     if `func_name` is not set, it will attempt to guess the function/class name
     to decorate a function/class but specify `func_name`, use functools.partial as follows
@@ -43,12 +132,61 @@ def instrument_decorate(func: InstrumentableThing,
 
     alternatively, use it as a function to wrap something and optionally set a function name
 
+    to instrument a hot function without creating a span for every call, set a sampling ratio and/or a rate cap
+    calls that are not sampled skip span creation entirely, and don't enter a new context
+        @partial(instrument_decorate, sample=0.01, max_rate=50)
+        def g():
+            pass
+
+    alternatively, record RED metrics (calls, errors, and a duration histogram) instead of creating spans
+    this costs a tiny fraction of a span, and the metrics are exported via the meter provider (e.g. to prometheus)
+        @partial(instrument_decorate, metrics_only=True)
+        def h():
+            pass
+
+    for recursive functions, fold recursive calls into the outermost span instead of creating a deep span tree
+    the outermost span records the max recursion depth and the total number of calls
+        @partial(instrument_decorate, collapse_recursion=True)
+        def fib(n):
+            return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+    for functions called many times in a loop, merge all the calls under the same parent span into one summary span
+    the summary records the call count and duration stats, and calls that errored or were outliers are kept as-is
+        @partial(instrument_decorate, coalesce=True)
+        def process_item(item):
+            pass
+
+    to only see the slow calls of a hot function, set a duration threshold
+    fast calls only cost two timer reads, and slow calls get a span with the start time back-filled after the fact
+        @partial(instrument_decorate, min_duration_ms=50)
+        def lookup(key):
+            pass
+
+    to find out why a span was slow, record cpu time, memory allocations, and/or garbage collections as attributes
+    each probe has its own (small) cost, so only enable the ones you need
+        @partial(instrument_decorate, probes=('cpu', 'wall', 'blocks', 'gc'))
+        def handler(request):
+            pass
+
     this function is idempotent; calling it multiple times has no additional side effects
+    (so if the same function is instrumented multiple times, only the first set of kwargs is used)
 
     todo: don't recurse into pydantic dataclasses, those get re-initialized too often
 
     :param func: function or class
     :param func_name: if not set, makes an intelligent guess
+    :param sample: probability of creating a span for each call, between 0 and 1 (default: always)
+    :param max_rate: maximum number of spans per second for each function (default: unlimited)
+    :param metrics_only: record call/error counters and a duration histogram instead of spans (ignores sampling)
+    :param buckets: upper bounds (in seconds) for the duration histogram; defaults to exponential buckets
+    :param collapse_recursion: don't create spans for calls made while the same function is already running
+                               (in the current thread or async task); only for plain and async functions with spans
+    :param coalesce: merge calls under the same parent span into a single summary span (ignores sampling)
+                     only for plain and async functions with spans
+    :param min_duration_ms: only create a span for calls that take at least this long (or raise an exception)
+                            only for plain and async functions with spans; ignores `collapse_recursion`
+    :param probes: extra measurements to record on each span, any of 'cpu', 'wall', 'blocks', 'tracemalloc', 'gc'
+                   only for plain and async functions with spans; ignored with `coalesce` or `min_duration_ms`
     :return:
     """
 
@@ -56,13 +194,21 @@ def instrument_decorate(func: InstrumentableThing,
     if OTEL_WRAPPER_DISABLED:
         return func
 
+    if min_duration_ms is not None and not min_duration_ms >= 0:
+        raise ValueError(f'`min_duration_ms` must be a non-negative number, got {min_duration_ms!r}')
+
     # avoid re-instrumenting (or double-instrumenting) things
     # this requires slightly more complex logic than lru_cache provides
-    if func in _CACHE_INSTRUMENTED:
-        ret = _CACHE_INSTRUMENTED[func]
+    ret = _CACHE_INSTRUMENTED.get(func, _MISSING)
+    if ret is not _MISSING:
         if ret is not None:
             return ret
         return func
+    if inspect.isclass(func):
+        if vars(func).get(_INSTRUMENTED_MARKER, False):  # subclasses inherit the marker, so check the class itself
+            return func
+    elif getattr(func, _INSTRUMENTED_MARKER, False):
+        return func
 
     # avoid re-instrumenting functions with wrappers (e.g., lru_cache)
     # by peeling back one layer at a time and checking if its instrumented
@@ -76,31 +222,96 @@ def instrument_decorate(func: InstrumentableThing,
     except Exception:
         pass
 
-    # if not provided, try to find the function name
-    code_info = CodeInfo(func)
-    func_name = func_name or code_info.name
-
-    # build span attributes for this class / function / method / builtin / etc
-    span_attributes: Dict[str, Union[str, None, int]] = dict()
-    if code_info.function_name:
-        span_attributes[SpanAttributes.CODE_FUNCTION] = code_info.function_name
-    if code_info.module_name:
-        span_attributes[SpanAttributes.CODE_NAMESPACE] = code_info.module_name
-    if code_info.path:
-        span_attributes[SpanAttributes.CODE_FILEPATH] = str(code_info.path)
-    if code_info.lineno:
-        span_attributes[SpanAttributes.CODE_LINENO] = code_info.lineno
-
     wrapped: InstrumentableThing
     if inspect.isclass(func):
+        # classes need their name right away, to name all their methods
+        # this bypasses the `get_code_info` cache, since the result is only used once and would keep `func` alive
+        code_info = CodeInfo(func)
+
         # noinspection PyTypeChecker
-        wrapped = _instrument_class(func, func_name, span_attributes)  # type: ignore[assignment]
+        wrapped = _instrument_class(func,  # type: ignore[assignment]
+                                    func_name or code_info.name,
+                                    _get_span_attributes(code_info),
+                                    options=dict(sample=sample,
+                                                 max_rate=max_rate,
+                                                 metrics_only=metrics_only,
+                                                 buckets=buckets,
+                                                 collapse_recursion=collapse_recursion,
+                                                 coalesce=coalesce,
+                                                 min_duration_ms=min_duration_ms,
+                                                 probes=probes))
+
+    # generators and context managers are also functions, so these must be checked first
+    elif inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func):
+        is_async = inspect.isasyncgenfunction(func)
+        span_info = _SpanInfo(func, func_name, prefix='async ' if is_async else '')
+        if metrics_only:
+            function_metrics = _get_function_metrics(span_info.func_name, span_info.attributes, buckets)
+            sampler = None
+        else:
+            function_metrics = None
+            sampler = make_sampler(sample, max_rate)
+        if is_async:
+            wrapped = _instrument_async_generator(func, span_info,  # type: ignore[assignment]
+                                                  sampler=sampler,
+                                                  function_metrics=function_metrics)
+        else:
+            wrapped = _instrument_generator(func, span_info,  # type: ignore[assignment]
+                                            sampler=sampler,
+                                            function_metrics=function_metrics)
+
+    elif (isinstance(func, (FunctionType, MethodType))
+          and func.__code__ in (_CONTEXT_MANAGER_CODE, _ASYNC_CONTEXT_MANAGER_CODE)):
+        is_async = func.__code__ is _ASYNC_CONTEXT_MANAGER_CODE
+        span_info = _SpanInfo(func, func_name, prefix='async ' if is_async else '')
+        if metrics_only:
+            function_metrics = _get_function_metrics(span_info.func_name, span_info.attributes, buckets)
+            sampler = None
+        else:
+            function_metrics = None
+            sampler = make_sampler(sample, max_rate)
+        wrapped = _instrument_context_manager(func, span_info,  # type: ignore[assignment]
+                                              sampler=sampler,
+                                              function_metrics=function_metrics,
+                                              is_async=is_async)
 
     elif asyncio.iscoroutinefunction(func):  # coroutine functions are also functions, so this must be checked first
-        wrapped = _instrument_coroutine(func, func_name, span_attributes)  # type: ignore[assignment]
+        span_info = _SpanInfo(func, func_name, prefix='async ')
+        if metrics_only:
+            wrapped = _instrument_coroutine_metrics(func,  # type: ignore[assignment]
+                                                    _get_function_metrics(span_info.func_name,
+                                                                          span_info.attributes,
+                                                                          buckets))
+        elif coalesce:
+            wrapped = _instrument_coroutine_coalesced(func, span_info)  # type: ignore[assignment]
+        elif min_duration_ms is not None:
+            wrapped = _instrument_coroutine_slow_only(func, span_info,  # type: ignore[assignment]
+                                                      sampler=make_sampler(sample, max_rate),
+                                                      min_duration_ms=min_duration_ms)
+        else:
+            wrapped = _instrument_coroutine(func, span_info,  # type: ignore[assignment]
+                                            sampler=make_sampler(sample, max_rate),
+                                            collapse_recursion=collapse_recursion,
+                                            probes=make_probes(probes))
 
     elif inspect.isroutine(func):
-        wrapped = _instrument_routine(func, func_name, span_attributes)  # type: ignore[assignment]
+        span_info = _SpanInfo(func, func_name)
+        if metrics_only:
+            wrapped = _instrument_routine_metrics(func,  # type: ignore[assignment]
+                                                  _get_function_metrics(span_info.func_name,
+                                                                        span_info.attributes,
+                                                                        buckets))
+        elif coalesce:
+            wrapped = _instrument_routine_coalesced(func, span_info)  # type: ignore[assignment]
+        elif min_duration_ms is not None:
+            wrapped = _instrument_routine_slow_only(func, span_info,  # type: ignore[assignment]
+                                                    sampler=make_sampler(sample, max_rate),
+                                                    min_duration_ms=min_duration_ms)
+        else:
+            wrapped = _instrument_routine(func, span_info,  # type: ignore[assignment]
+                                          sampler=make_sampler(sample, max_rate),
+                                          collapse_recursion=collapse_recursion,
+                                          probes=make_probes(probes))
 
     # what is this?
     else:
@@ -109,19 +320,258 @@ def instrument_decorate(func: InstrumentableThing,
     # add to cache and return
     _CACHE_INSTRUMENTED[func] = wrapped
     _CACHE_INSTRUMENTED[wrapped] = None  # a class will end up here
+    # noinspection PyBroadException
+    try:
+        setattr(wrapped, _INSTRUMENTED_MARKER, True)
+    except Exception:
+        pass
+    return wrapped
+
+
+def _get_span_attributes(code_info: CodeInfo) -> Dict[str, Union[str, int]]:
+    """
+    build span attributes for this class / function / method / builtin / etc
+    """
+    span_attributes: Dict[str, Union[str, int]] = dict()
+    if code_info.function_name:
+        span_attributes[SpanAttributes.CODE_FUNCTION] = code_info.function_name
+    if code_info.module_name:
+        span_attributes[SpanAttributes.CODE_NAMESPACE] = code_info.module_name
+    if code_info.path:
+        span_attributes[SpanAttributes.CODE_FILEPATH] = str(code_info.path)
+    if code_info.lineno:
+        span_attributes[SpanAttributes.CODE_LINENO] = code_info.lineno
+    return span_attributes
+
+
+class _SpanInfo:
+    """
+    span name and attributes for a decorated function, which are only resolved when the first span is recorded
+    introspection (`inspect.getsourcefile`, `inspect.getsourcelines`, etc.) is slow enough to noticeably delay startup
+    when hundreds of functions are decorated at import time, and most of them may never be called at all
+
+    plain python functions take a fast path that only reads the code object and the function's own attributes,
+    which gives the same results as `CodeInfo` without touching the source file
+    anything else (builtins, partials, wrapped functions, etc.) falls back to `CodeInfo`
+    """
+    __slots__ = ('_func', '_func_name', '_prefix', '_resolved')
+
+    def __init__(self, func: Callable, func_name: Optional[str] = None, prefix: str = '') -> None:
+        self._func = func
+        self._func_name = func_name
+        self._prefix = prefix
+        self._resolved: Optional[Tuple[str, Mapping[str, Union[str, int]]]] = None
+
+    def get(self) -> Tuple[str, Mapping[str, Union[str, int]]]:
+        """
+        the same (interned) span name and (shared, read-only) attributes are returned for every span
+
+        :return: (span name, span attributes)
+        """
+        if self._resolved is None:
+            func_name, span_attributes = self._resolve_fast() or self._resolve_slow()
+            self._func_name = func_name
+            self._resolved = (intern_span_name(f'{self._prefix}{func_name}'), freeze_attributes(span_attributes))
+        return self._resolved
+
+    @property
+    def func_name(self) -> str:
+        if self._resolved is None:
+            self.get()
+        return self._func_name  # type: ignore[return-value]
+
+    @property
+    def attributes(self) -> Mapping[str, Union[str, int]]:
+        return self.get()[1]
+
+    def _resolve_fast(self) -> Optional[Tuple[str, Dict[str, Union[str, int]]]]:
+        func = self._func
+        if type(func) is not FunctionType or hasattr(func, '__wrapped__'):
+            return None
+        module_name = getattr(func, '__module__', None)
+        if not isinstance(module_name, str) or module_name not in sys.modules:
+            return None
+
+        # strip the class (if any) from the qualname, but not an enclosing function, which is followed by `<locals>`
+        function_name = func.__qualname__
+        _cls_qualname = function_name.split('.<locals>')[0]
+        if '.' in _cls_qualname:
+            function_name = function_name[len(_cls_qualname.rsplit('.', 1)[0]) + 1:]
+
+        span_attributes: Dict[str, Union[str, int]] = dict()
+        span_attributes[SpanAttributes.CODE_FUNCTION] = function_name
+        span_attributes[SpanAttributes.CODE_NAMESPACE] = module_name
+        if func.__code__.co_filename:
+            span_attributes[SpanAttributes.CODE_FILEPATH] = func.__code__.co_filename
+        if func.__code__.co_firstlineno:
+            span_attributes[SpanAttributes.CODE_LINENO] = func.__code__.co_firstlineno
+        return self._func_name or f'<{module_name}>.{func.__qualname__}', span_attributes
+
+    def _resolve_slow(self) -> Tuple[str, Dict[str, Union[str, int]]]:
+        # this bypasses the `get_code_info` cache, since the result is only used once and would keep `func` alive
+        code_info = CodeInfo(self._func)
+        return self._func_name or code_info.name, _get_span_attributes(code_info)
+
+
+def instrumentation_cache_info() -> Dict[str, Dict[str, Optional[int]]]:
+    """
+    sizes, limits, and hit/miss/eviction counters for the caches used when instrumenting things
+    """
+    code_info_cache_info = get_code_info.cache_info()
+    return {
+        'instrumented': _CACHE_INSTRUMENTED.info(),
+        'code_info':    {
+            'size':    code_info_cache_info.currsize,
+            'maxsize': code_info_cache_info.maxsize,
+            'hits':    code_info_cache_info.hits,
+            'misses':  code_info_cache_info.misses,
+        },
+    }
+
+
+def clear_instrumentation_cache() -> None:
+    """
+    drop all cached instrumentation metadata
+    anything that was already instrumented stays instrumented, and will not be instrumented again
+    """
+    _CACHE_INSTRUMENTED.clear()
+    get_code_info.cache_clear()
+
+
+def _get_function_metrics(func_name: str,
+                          span_attributes: Mapping[str, Union[str, int]],
+                          buckets: Optional[Sequence[float]] = None,
+                          ) -> FunctionMetrics:
+    """
+    metric attributes are a low-cardinality subset of the span attributes (no file paths or line numbers)
+    """
+    metric_attributes = {'otel_wrapper.function': func_name}
+    for key in (SpanAttributes.CODE_FUNCTION, SpanAttributes.CODE_NAMESPACE):
+        if span_attributes.get(key):
+            metric_attributes[key] = str(span_attributes[key])
+    return register_function_metrics(metric_attributes, buckets)
+
+
+def _instrument_coroutine_metrics(coro: Callable,
+                                  function_metrics: FunctionMetrics,
+                                  ) -> Callable:
+    """
+    like `_instrument_coroutine`, but records metrics instead of creating a span
+    note that the duration includes time spent waiting on other coroutines
+
+    :param coro:
+    :param function_metrics:
+    :return:
+    """
+
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return coro
+
+    # sanity checks
+    assert isinstance(coro, Callable)  # type: ignore[arg-type]
+    assert not isinstance(coro, type)
+    assert asyncio.iscoroutinefunction(coro)
+
+    _perf_counter = time.perf_counter
+    _record = function_metrics.record
+
+    @wraps(coro)
+    async def wrapped(*args, **kwargs):
+        if not _ENABLED:
+            return await coro(*args, **kwargs)
+        start = _perf_counter()
+        try:
+            ret = await coro(*args, **kwargs)
+        except BaseException:
+            _record(_perf_counter() - start, True)
+            raise
+        _record(_perf_counter() - start)
+        return ret
+
     return wrapped
 
 
+def _instrument_routine_metrics(func: Callable,
+                                function_metrics: FunctionMetrics,
+                                ) -> Callable:
+    """
+    like `_instrument_routine`, but records metrics instead of creating a span
+
+    :param func:
+    :param function_metrics:
+    :return:
+    """
+
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return func
+
+    # sanity checks
+    assert isinstance(func, Callable)  # type: ignore[arg-type]
+    assert not isinstance(func, type)
+    assert inspect.isroutine(func)
+    assert not asyncio.iscoroutinefunction(func)
+
+    _perf_counter = time.perf_counter
+    _record = function_metrics.record
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if not _ENABLED:
+            return func(*args, **kwargs)
+        start = _perf_counter()
+        try:
+            ret = func(*args, **kwargs)
+        except BaseException:
+            _record(_perf_counter() - start, True)
+            raise
+        _record(_perf_counter() - start)
+        return ret
+
+    return wrapped
+
+
+class _RecursionState:
+    """
+    tracks the recursive calls folded into the outermost span of a function with `collapse_recursion`
+    """
+    __slots__ = ('depth', 'max_depth', 'calls')
+
+    def __init__(self) -> None:
+        self.depth = 1
+        self.max_depth = 1
+        self.calls = 1
+
+    def enter(self) -> None:
+        self.calls += 1
+        self.depth += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    def exit(self) -> None:
+        self.depth -= 1
+
+    def set_attributes(self, span: Span) -> None:
+        if span.is_recording():
+            span.set_attribute(RECURSION_MAX_DEPTH, self.max_depth)
+            span.set_attribute(RECURSION_CALLS, self.calls)
+
+
 def _instrument_coroutine(coro: Callable,
-                          coro_name: str,
-                          span_attributes: dict,
+                          span_info: _SpanInfo,
+                          sampler: Optional[Callable[[], bool]] = None,
+                          collapse_recursion: bool = False,
+                          probes: Optional[SpanProbes] = None,
                           ) -> Callable:
     """
     coroutines need an async decorator
 
     :param coro:
-    :param coro_name:
-    :param span_attributes:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param collapse_recursion: fold recursive calls into the outermost span
+    :param probes: extra measurements to record on each span
     :return:
     """
 
@@ -134,9 +584,17 @@ def _instrument_coroutine(coro: Callable,
     assert not isinstance(coro, type)
     assert asyncio.iscoroutinefunction(coro)
 
+    if collapse_recursion:
+        return _instrument_coroutine_collapsed(coro, span_info, sampler, probes)
+    if probes is not None:
+        return _instrument_coroutine_probed(coro, span_info, sampler, probes)
+
     @wraps(coro)
     async def wrapped(*args, **kwargs):
-        with _TRACER.start_as_current_span(f'async {coro_name}', attributes=span_attributes) as span:
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return await coro(*args, **kwargs)
+        span_name, span_attributes = span_info.get()
+        with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
             ret = await coro(*args, **kwargs)
             if span.is_recording():
                 # span.set_attribute(SpanAttributes.HTTP_STATUS_CODE, result.status_code)
@@ -147,15 +605,19 @@ def _instrument_coroutine(coro: Callable,
 
 
 def _instrument_routine(func: Callable,
-                        func_name: str,
-                        span_attributes: dict,
+                        span_info: _SpanInfo,
+                        sampler: Optional[Callable[[], bool]] = None,
+                        collapse_recursion: bool = False,
+                        probes: Optional[SpanProbes] = None,
                         ) -> Callable:
     """
     normal routines (functions, class methods, builtins) just use a normal decorator
 
     :param func:
-    :param func_name:
-    :param span_attributes:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param collapse_recursion: fold recursive calls into the outermost span
+    :param probes: extra measurements to record on each span
     :return:
     """
 
@@ -169,9 +631,17 @@ def _instrument_routine(func: Callable,
     assert inspect.isroutine(func)
     assert not asyncio.iscoroutinefunction(func)
 
+    if collapse_recursion:
+        return _instrument_routine_collapsed(func, span_info, sampler, probes)
+    if probes is not None:
+        return _instrument_routine_probed(func, span_info, sampler, probes)
+
     @wraps(func)
     def wrapped(*args, **kwargs):
-        with _TRACER.start_as_current_span(func_name, attributes=span_attributes) as span:
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return func(*args, **kwargs)
+        span_name, span_attributes = span_info.get()
+        with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
             ret = func(*args, **kwargs)
             if span.is_recording():
                 span.set_status(Status(StatusCode.OK))
@@ -180,19 +650,674 @@ def _instrument_routine(func: Callable,
     return wrapped
 
 
+def _instrument_coroutine_probed(coro: Callable,
+                                 span_info: _SpanInfo,
+                                 sampler: Optional[Callable[[], bool]],
+                                 probes: SpanProbes,
+                                 ) -> Callable:
+    """
+    like `_instrument_coroutine`, but also records the probes as span attributes
+    """
+
+    @wraps(coro)
+    async def wrapped(*args, **kwargs):
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return await coro(*args, **kwargs)
+        span_name, span_attributes = span_info.get()
+        with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
+            started = probes.start()
+            try:
+                ret = await coro(*args, **kwargs)
+            finally:
+                probes.finish(span, started)
+            if span.is_recording():
+                span.set_status(Status(StatusCode.OK))
+            return ret
+
+    return wrapped
+
+
+def _instrument_routine_probed(func: Callable,
+                               span_info: _SpanInfo,
+                               sampler: Optional[Callable[[], bool]],
+                               probes: SpanProbes,
+                               ) -> Callable:
+    """
+    like `_instrument_routine`, but also records the probes as span attributes
+    """
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return func(*args, **kwargs)
+        span_name, span_attributes = span_info.get()
+        with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
+            started = probes.start()
+            try:
+                ret = func(*args, **kwargs)
+            finally:
+                probes.finish(span, started)
+            if span.is_recording():
+                span.set_status(Status(StatusCode.OK))
+            return ret
+
+    return wrapped
+
+
+def _instrument_coroutine_collapsed(coro: Callable,
+                                    span_info: _SpanInfo,
+                                    sampler: Optional[Callable[[], bool]] = None,
+                                    probes: Optional[SpanProbes] = None,
+                                    ) -> Callable:
+    """
+    like `_instrument_coroutine`, but only the outermost call creates a span, and recursive calls are counted
+    sampling is only decided for the outermost call, so an unsampled call has no spans at any depth
+
+    :param coro:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param probes: extra measurements to record on the outermost span (covering all the recursive calls)
+    :return:
+    """
+    key = object()  # identifies this function in `_ACTIVE_RECURSION`
+
+    @wraps(coro)
+    async def wrapped(*args, **kwargs):
+        if not _ENABLED:
+            return await coro(*args, **kwargs)
+
+        # recursive call
+        active = _ACTIVE_RECURSION.get()
+        state = active.get(key)
+        if state is not None:
+            state.enter()
+            try:
+                return await coro(*args, **kwargs)
+            finally:
+                state.exit()
+
+        # outermost call
+        state = _RecursionState()
+        token = _ACTIVE_RECURSION.set(MappingProxyType({**active, key: state}))
+        try:
+            if sampler is not None and not sampler():
+                return await coro(*args, **kwargs)
+            span_name, span_attributes = span_info.get()
+            with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
+                started = probes.start() if probes is not None else None
+                try:
+                    ret = await coro(*args, **kwargs)
+                finally:
+                    state.set_attributes(span)
+                    if started is not None:
+                        probes.finish(span, started)
+                if span.is_recording():
+                    span.set_status(Status(StatusCode.OK))
+                return ret
+        finally:
+            _ACTIVE_RECURSION.reset(token)
+
+    return wrapped
+
+
+def _instrument_routine_collapsed(func: Callable,
+                                  span_info: _SpanInfo,
+                                  sampler: Optional[Callable[[], bool]] = None,
+                                  probes: Optional[SpanProbes] = None,
+                                  ) -> Callable:
+    """
+    like `_instrument_routine`, but only the outermost call creates a span, and recursive calls are counted
+    sampling is only decided for the outermost call, so an unsampled call has no spans at any depth
+
+    :param func:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param probes: extra measurements to record on the outermost span (covering all the recursive calls)
+    :return:
+    """
+    key = object()  # identifies this function in `_ACTIVE_RECURSION`
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if not _ENABLED:
+            return func(*args, **kwargs)
+
+        # recursive call
+        active = _ACTIVE_RECURSION.get()
+        state = active.get(key)
+        if state is not None:
+            state.enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                state.exit()
+
+        # outermost call
+        state = _RecursionState()
+        token = _ACTIVE_RECURSION.set(MappingProxyType({**active, key: state}))
+        try:
+            if sampler is not None and not sampler():
+                return func(*args, **kwargs)
+            span_name, span_attributes = span_info.get()
+            with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
+                started = probes.start() if probes is not None else None
+                try:
+                    ret = func(*args, **kwargs)
+                finally:
+                    state.set_attributes(span)
+                    if started is not None:
+                        probes.finish(span, started)
+                if span.is_recording():
+                    span.set_status(Status(StatusCode.OK))
+                return ret
+        finally:
+            _ACTIVE_RECURSION.reset(token)
+
+    return wrapped
+
+
+@lru_cache  # only run once
+def _get_coalescing_processor() -> Optional[CoalescingSpanProcessor]:
+    """
+    the processor needs to see every span end, so it's added to the global tracer provider (if it's from the sdk)
+    """
+    tracer_provider = trace.get_tracer_provider()
+    if not hasattr(tracer_provider, 'add_span_processor'):
+        return None
+    processor = CoalescingSpanProcessor(_TRACER)
+    tracer_provider.add_span_processor(processor)
+    return processor
+
+
+def _instrument_coroutine_coalesced(coro: Callable,
+                                    span_info: _SpanInfo,
+                                    ) -> Callable:
+    """
+    like `_instrument_coroutine`, but calls under the same parent span are merged into one summary span
+    if there is no (recording) parent span, a normal span is created instead
+
+    :param coro:
+    :param span_info: span name and attributes, resolved on first use
+    :return:
+    """
+    key = object()  # identifies this function in the coalescing span processor
+    fallback = _instrument_coroutine(coro, span_info)
+    _time_ns = time.time_ns
+
+    @wraps(coro)
+    async def wrapped(*args, **kwargs):
+        if not _ENABLED:
+            return await coro(*args, **kwargs)
+
+        parent = trace.get_current_span()
+        processor = _get_coalescing_processor()
+        if processor is None or not parent.is_recording():
+            return await fallback(*args, **kwargs)
+
+        start = _time_ns()
+        try:
+            ret = await coro(*args, **kwargs)
+        except BaseException as e:
+            processor.record(key, *span_info.get(), parent, start, _time_ns(), e)
+            raise
+        processor.record(key, *span_info.get(), parent, start, _time_ns())
+        return ret
+
+    return wrapped
+
+
+def _instrument_routine_coalesced(func: Callable,
+                                  span_info: _SpanInfo,
+                                  ) -> Callable:
+    """
+    like `_instrument_routine`, but calls under the same parent span are merged into one summary span
+    if there is no (recording) parent span, a normal span is created instead
+
+    :param func:
+    :param span_info: span name and attributes, resolved on first use
+    :return:
+    """
+    key = object()  # identifies this function in the coalescing span processor
+    fallback = _instrument_routine(func, span_info)
+    _time_ns = time.time_ns
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if not _ENABLED:
+            return func(*args, **kwargs)
+
+        parent = trace.get_current_span()
+        processor = _get_coalescing_processor()
+        if processor is None or not parent.is_recording():
+            return fallback(*args, **kwargs)
+
+        start = _time_ns()
+        try:
+            ret = func(*args, **kwargs)
+        except BaseException as e:
+            processor.record(key, *span_info.get(), parent, start, _time_ns(), e)
+            raise
+        processor.record(key, *span_info.get(), parent, start, _time_ns())
+        return ret
+
+    return wrapped
+
+
+def _emit_slow_call_span(span_info: _SpanInfo,
+                         duration_ns: int,
+                         exc: Optional[BaseException] = None,
+                         ) -> None:
+    """
+    create and immediately end a span for a call that has already returned, back-filling the start time
+    the call's duration was measured with `perf_counter_ns`, since it's cheaper and monotonic
+    """
+    end = time.time_ns()
+    span_name, span_attributes = span_info.get()
+    span = _TRACER.start_span(span_name, attributes=span_attributes, start_time=end - duration_ns)
+    if span.is_recording():
+        if exc is not None:
+            _set_error_status(span, exc)
+        else:
+            span.set_status(Status(StatusCode.OK))
+    span.end(end_time=end)
+
+
+def _instrument_coroutine_slow_only(coro: Callable,
+                                    span_info: _SpanInfo,
+                                    sampler: Optional[Callable[[], bool]] = None,
+                                    min_duration_ms: float = 0,
+                                    ) -> Callable:
+    """
+    like `_instrument_coroutine`, but the span is only created after the call, if it was slow or raised an exception
+    since the span doesn't exist while the call is running, any spans created inside it become its siblings
+
+    :param coro:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only time the call when this returns True
+    :param min_duration_ms: minimum duration of a call to create a span
+    :return:
+    """
+    threshold_ns = int(min_duration_ms * 1_000_000)
+    _perf_counter_ns = time.perf_counter_ns
+
+    @wraps(coro)
+    async def wrapped(*args, **kwargs):
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return await coro(*args, **kwargs)
+
+        start = _perf_counter_ns()
+        try:
+            ret = await coro(*args, **kwargs)
+        except BaseException as e:
+            _emit_slow_call_span(span_info, _perf_counter_ns() - start, e)
+            raise
+        duration = _perf_counter_ns() - start
+        if duration >= threshold_ns:
+            _emit_slow_call_span(span_info, duration)
+        return ret
+
+    return wrapped
+
+
+def _instrument_routine_slow_only(func: Callable,
+                                  span_info: _SpanInfo,
+                                  sampler: Optional[Callable[[], bool]] = None,
+                                  min_duration_ms: float = 0,
+                                  ) -> Callable:
+    """
+    like `_instrument_routine`, but the span is only created after the call, if it was slow or raised an exception
+    since the span doesn't exist while the call is running, any spans created inside it become its siblings
+
+    :param func:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only time the call when this returns True
+    :param min_duration_ms: minimum duration of a call to create a span
+    :return:
+    """
+    threshold_ns = int(min_duration_ms * 1_000_000)
+    _perf_counter_ns = time.perf_counter_ns
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return func(*args, **kwargs)
+
+        start = _perf_counter_ns()
+        try:
+            ret = func(*args, **kwargs)
+        except BaseException as e:
+            _emit_slow_call_span(span_info, _perf_counter_ns() - start, e)
+            raise
+        duration = _perf_counter_ns() - start
+        if duration >= threshold_ns:
+            _emit_slow_call_span(span_info, duration)
+        return ret
+
+    return wrapped
+
+
+def _end_generator_span(span: Span,
+                        items: int,
+                        start: float,
+                        first_item: Optional[float],
+                        end: float,
+                        ) -> None:
+    """
+    record iteration statistics on a generator's span, then end the span
+    """
+    if span.is_recording():
+        duration = end - start
+        span.set_attribute(GENERATOR_ITEMS, items)
+        span.set_attribute(GENERATOR_DURATION, duration)
+        if first_item is not None:
+            span.set_attribute(GENERATOR_TIME_TO_FIRST_ITEM, first_item - start)
+        if duration > 0:
+            span.set_attribute(GENERATOR_ITEMS_PER_SECOND, items / duration)
+    span.end()
+
+
+def _set_error_status(span: Span, exc: BaseException) -> None:
+    """
+    same as what `start_as_current_span` does when an exception is raised
+    """
+    if span.is_recording():
+        span.record_exception(exc)
+        span.set_status(Status(StatusCode.ERROR, f'{type(exc).__name__}: {exc}'))
+
+
+def _instrument_generator(func: Callable,
+                          span_info: _SpanInfo,
+                          sampler: Optional[Callable[[], bool]] = None,
+                          function_metrics: Optional[FunctionMetrics] = None,
+                          ) -> Callable:
+    """
+    generators need a generator wrapper, otherwise the span ends as soon as the generator object is returned
+    a single span covers the entire iteration, from the first `next()` until the generator is exhausted or closed
+    the span is only made current while the generator itself is running, not while the caller handles each item
+    values passed in via `send()` and `throw()` are forwarded to the generator
+
+    :param func:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param function_metrics: if set, record metrics instead of creating a span
+    :return:
+    """
+
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return func
+
+    # sanity checks
+    assert isinstance(func, Callable)  # type: ignore[arg-type]
+    assert inspect.isgeneratorfunction(func)
+
+    _perf_counter = time.perf_counter
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+
+        # disabled or not sampled
+        if not _ENABLED or (sampler is not None and not sampler()):
+            return (yield from func(*args, **kwargs))
+
+        # metrics only, which don't need to know about each item
+        if function_metrics is not None:
+            start = _perf_counter()
+            try:
+                ret = yield from func(*args, **kwargs)
+            except GeneratorExit:  # closed early, which is not an error
+                function_metrics.record(_perf_counter() - start)
+                raise
+            except BaseException:
+                function_metrics.record(_perf_counter() - start, True)
+                raise
+            function_metrics.record(_perf_counter() - start)
+            return ret
+
+        span_name, span_attributes = span_info.get()
+        span = _TRACER.start_span(span_name, attributes=span_attributes)
+        span_context = trace.set_span_in_context(span)
+        start = _perf_counter()
+        first_item = None
+        items = 0
+        try:
+            token = context.attach(span_context)
+            try:
+                gen = func(*args, **kwargs)
+                item = next(gen)
+            finally:
+                context.detach(token)
+            first_item = _perf_counter()
+
+            while True:
+                items += 1
+                try:
+                    sent = yield item
+                except GeneratorExit:
+                    token = context.attach(span_context)
+                    try:
+                        gen.close()
+                    finally:
+                        context.detach(token)
+                    raise
+                except BaseException as e:
+                    token = context.attach(span_context)
+                    try:
+                        item = gen.throw(e)
+                    finally:
+                        context.detach(token)
+                else:
+                    token = context.attach(span_context)
+                    try:
+                        item = gen.send(sent)
+                    finally:
+                        context.detach(token)
+
+        except StopIteration as e:
+            if span.is_recording():
+                span.set_status(Status(StatusCode.OK))
+            return e.value
+        except GeneratorExit:  # closed early, which is not an error
+            raise
+        except BaseException as e:
+            _set_error_status(span, e)
+            raise
+        finally:
+            _end_generator_span(span, items, start, first_item, _perf_counter())
+
+    return wrapped
+
+
+def _instrument_async_generator(func: Callable,
+                                span_info: _SpanInfo,
+                                sampler: Optional[Callable[[], bool]] = None,
+                                function_metrics: Optional[FunctionMetrics] = None,
+                                ) -> Callable:
+    """
+    like `_instrument_generator`, but for async generators
+    there is no `yield from` for async generators, so this always steps through the items one at a time
+
+    :param func:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param function_metrics: if set, record metrics instead of creating a span
+    :return:
+    """
+
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return func
+
+    # sanity checks
+    assert isinstance(func, Callable)  # type: ignore[arg-type]
+    assert inspect.isasyncgenfunction(func)
+
+    _perf_counter = time.perf_counter
+
+    @wraps(func)
+    async def wrapped(*args, **kwargs):
+        enabled = _ENABLED
+        span = None
+        span_context = None
+        if enabled and function_metrics is None and (sampler is None or sampler()):
+            span_name, span_attributes = span_info.get()
+            span = _TRACER.start_span(span_name, attributes=span_attributes)
+            span_context = trace.set_span_in_context(span)
+
+        start = _perf_counter()
+        first_item = None
+        items = 0
+        error = False
+        agen = func(*args, **kwargs)
+        try:
+            step = agen.asend(None)
+            while True:
+                token = context.attach(span_context) if span_context is not None else None
+                try:
+                    item = await step
+                finally:
+                    if token is not None:
+                        context.detach(token)
+                if first_item is None:
+                    first_item = _perf_counter()
+                items += 1
+
+                try:
+                    sent = yield item
+                except GeneratorExit:
+                    token = context.attach(span_context) if span_context is not None else None
+                    try:
+                        await agen.aclose()
+                    finally:
+                        if token is not None:
+                            context.detach(token)
+                    raise
+                except BaseException as e:
+                    step = agen.athrow(e)
+                else:
+                    step = agen.asend(sent)
+
+        except StopAsyncIteration:
+            if span is not None and span.is_recording():
+                span.set_status(Status(StatusCode.OK))
+        except GeneratorExit:  # closed early, which is not an error
+            raise
+        except BaseException as e:
+            error = True
+            if span is not None:
+                _set_error_status(span, e)
+            raise
+        finally:
+            end = _perf_counter()
+            if span is not None:
+                _end_generator_span(span, items, start, first_item, end)
+            if enabled and function_metrics is not None:
+                function_metrics.record(end - start, error)
+
+    return wrapped
+
+
+def _instrument_context_manager(func: Callable,
+                                span_info: _SpanInfo,
+                                sampler: Optional[Callable[[], bool]] = None,
+                                function_metrics: Optional[FunctionMetrics] = None,
+                                is_async: bool = False,
+                                ) -> Callable:
+    """
+    functions decorated with @contextmanager (or @asynccontextmanager) return a context manager
+    so the span should cover the entire `with` block, not just the function call that creates the context manager
+
+    :param func:
+    :param span_info: span name and attributes, resolved on first use
+    :param sampler: if set, only create a span when this returns True
+    :param function_metrics: if set, record metrics instead of creating a span
+    :param is_async: True for @asynccontextmanager
+    :return:
+    """
+
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return func
+
+    # sanity checks
+    assert isinstance(func, Callable)  # type: ignore[arg-type]
+    assert not isinstance(func, type)
+
+    _perf_counter = time.perf_counter
+
+    if is_async:
+        @wraps(func)
+        @contextlib.asynccontextmanager
+        async def wrapped(*args, **kwargs):
+            if not _ENABLED or (sampler is not None and not sampler()):
+                async with func(*args, **kwargs) as value:
+                    yield value
+
+            elif function_metrics is not None:
+                start = _perf_counter()
+                try:
+                    async with func(*args, **kwargs) as value:
+                        yield value
+                except BaseException:
+                    function_metrics.record(_perf_counter() - start, True)
+                    raise
+                function_metrics.record(_perf_counter() - start)
+
+            else:
+                span_name, span_attributes = span_info.get()
+                with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
+                    async with func(*args, **kwargs) as value:
+                        yield value
+                    if span.is_recording():
+                        span.set_status(Status(StatusCode.OK))
+
+    else:
+        @wraps(func)  # type: ignore[no-redef]
+        @contextlib.contextmanager
+        def wrapped(*args, **kwargs):
+            if not _ENABLED or (sampler is not None and not sampler()):
+                with func(*args, **kwargs) as value:
+                    yield value
+
+            elif function_metrics is not None:
+                start = _perf_counter()
+                try:
+                    with func(*args, **kwargs) as value:
+                        yield value
+                except BaseException:
+                    function_metrics.record(_perf_counter() - start, True)
+                    raise
+                function_metrics.record(_perf_counter() - start)
+
+            else:
+                span_name, span_attributes = span_info.get()
+                with _TRACER.start_as_current_span(span_name, attributes=span_attributes) as span:
+                    with func(*args, **kwargs) as value:
+                        yield value
+                    if span.is_recording():
+                        span.set_status(Status(StatusCode.OK))
+
+    return wrapped
+
+
 def _instrument_class(cls: type,
                       class_name: str,
                       span_attributes: dict,
+                      options: Optional[Dict[str, Any]] = None,
                       ) -> type:
     """
     somewhat complex logic to wrap all methods and properties in a class
-    actually wraps the getattribute dunder (magic method) so it can cover as much ground as possible
-    to uninstrument, replace cls.func with cls.dunder.__wrapped__ for dunder in new, init, call, and getattribute
+    walks the class (and its mro) once, replacing each method and property with an instrumented version
+    subclasses are instrumented the same way when they are defined, via `__init_subclass__`
+    since the methods themselves are replaced, calls via the class (e.g. `Cls.static_method()`) or via `super()` create
+    spans too, whereas the old `__getattribute__` wrapper only saw attributes read from an instance
+    to uninstrument, replace cls.attr with cls.attr.__wrapped__ (or unwrap the static/class method first)
     this function is idempotent; calling it multiple times has no additional side effects
 
     :param cls: class to instrument
     :param class_name: name of the class
     :param span_attributes: additional span attributes
+    :param options: kwargs for `instrument_decorate`, applied to each method (and to properties, where possible)
     :return:
     """
 
@@ -212,61 +1337,306 @@ def _instrument_class(cls: type,
     # if not inplace:
     #     cls = type(cls.__name__, (cls,), {})
 
+    options = options or dict()
+
     # wrap the constructors if they exist
     if cls.__new__ is not object.__new__:
-        cls.__new__ = instrument_decorate(cls.__new__, func_name=f'{class_name}.__new__')
+        _patch_class(cls, '__new__',
+                     instrument_decorate(cls.__new__, func_name=f'{class_name}.__new__', **options))
     if cls.__init__ is not object.__init__:
         # noinspection PyTypeChecker
-        cls.__init__ = instrument_decorate(cls.__init__, func_name=f'{class_name}.__init__')
+        _patch_class(cls, '__init__',
+                     instrument_decorate(cls.__init__, func_name=f'{class_name}.__init__', **options))
     if hasattr(cls, '__post_init__'):
-        cls.__post_init__ = instrument_decorate(cls.__post_init__, func_name=f'{class_name}.__post_init__')
+        _patch_class(cls, '__post_init__',
+                     instrument_decorate(cls.__post_init__, func_name=f'{class_name}.__post_init__', **options))
 
     # also wrap the call method if it exists
     if not isinstance(cls.__call__, type(object.__call__)):
-        cls.__call__ = instrument_decorate(cls.__call__, func_name=f'{class_name}.__call__')
+        _patch_class(cls, '__call__',
+                     instrument_decorate(cls.__call__, func_name=f'{class_name}.__call__', **options))
 
     # also wrap the context manager methods if they exist
     if hasattr(cls, '__enter__') and hasattr(cls, '__exit__'):
-        cls.__enter__ = instrument_decorate(cls.__enter__, func_name=f'{class_name}.__enter__')
-        cls.__exit__ = instrument_decorate(cls.__exit__, func_name=f'{class_name}.__exit__')
+        _patch_class(cls, '__enter__',
+                     instrument_decorate(cls.__enter__, func_name=f'{class_name}.__enter__', **options))
+        _patch_class(cls, '__exit__',
+                     instrument_decorate(cls.__exit__, func_name=f'{class_name}.__exit__', **options))
 
-    # wrap the generic attribute getter to auto-wrap all methods
-    _original_getattribute = cls.__getattribute__
-    if _original_getattribute not in _CACHE_GETATTRIBUTE:
+    # precompute the span name and attributes for every property, so that reading a property is a single lookup
+    property_index = _build_property_index(cls, class_name, span_attributes)
+    _PROPERTY_INDEX[cls] = property_index
 
-        @wraps(cls.__getattribute__)
-        def wrapped_getattribute(*args, **kwargs):
+    # install instrumented descriptors for all methods, properties, and nested classes (including inherited ones)
+    # this happens once, here, so that reading plain attributes from the class or its instances costs nothing extra
+    for attr_name, attr_owner, attr in list(_iter_class_attributes(cls)):
+        instrumented = _instrument_class_attribute(attr_name, attr_owner, attr,
+                                                   span_attributes, property_index, options)
+        if instrumented is not attr:
+            _patch_class(cls, attr_name, instrumented)
 
-            # if it's a property, start a trace before getting it
-            if isinstance(getattr(cls, args[1], None), (property, cached_property)):
+    # methods inherited from this class are already instrumented, but methods that subclasses define are not
+    _install_subclass_hook(cls, options)
 
-                # get line of code for the property if possible
-                if hasattr(getattr(cls, args[1]), 'fget'):
-                    _attribs = dict()
-                    _attribs.update(span_attributes)
-                    _attribs[SpanAttributes.CODE_LINENO] = inspect.getsourcelines(getattr(cls, args[1]).fget)[1]
-                else:
-                    _attribs = span_attributes
+    # if instrumentation is currently disabled, put the original attributes back right away
+    _INSTRUMENTED_CLASSES.add(cls)
+    if not _ENABLED:
+        _toggle_class(cls, False)
 
-                # instrument the property call
-                with _TRACER.start_as_current_span(f'property {class_name}.{args[1]}', attributes=_attribs) as span:
-                    ret = _original_getattribute(*args, **kwargs)
-                    if span.is_recording():
-                        span.set_status(Status(StatusCode.OK))
-                    return ret
+    return cls
 
-            # otherwise just get it
-            obj = _original_getattribute(*args, **kwargs)
 
-            # wrap if the retrieved object is a method, coroutine, or nested class
-            if inspect.isclass(obj) or inspect.isroutine(obj):
-                return instrument_decorate(obj)
+def _install_subclass_hook(cls: type, options: Dict[str, Any]) -> None:
+    """
+    instrument every subclass of `cls` when it is defined, with the same options as `cls`
+    the hook calls the class's own `__init_subclass__` (or its parent's) first, so it doesn't change what that does
+    unlike the other patches, the hook stays in place while instrumentation is disabled, so that subclasses defined in
+    the meantime are instrumented (and then immediately uninstrumented) just like any other class
+    """
+    _SUBCLASS_OPTIONS[cls] = options
+    original = vars(cls).get('__init_subclass__')
+    if getattr(getattr(original, '__func__', None), _INSTRUMENTED_MARKER, False):
+        return
 
-            # no clue what this is, just return it
-            else:
-                return obj
+    def __init_subclass__(subclass, **kwargs):
+        if original is not None:
+            original.__get__(None, subclass)(**kwargs)
+        else:
+            super(cls, subclass).__init_subclass__(**kwargs)
 
-        cls.__getattribute__ = wrapped_getattribute
-        _CACHE_GETATTRIBUTE[_original_getattribute] = wrapped_getattribute
+        # the hooks of all instrumented ancestors get called, but only the closest one's options should be used
+        if next(base for base in subclass.__mro__[1:] if base in _SUBCLASS_OPTIONS) is cls:
+            instrument_decorate(subclass, **_SUBCLASS_OPTIONS[cls])
 
-    return cls
+    setattr(__init_subclass__, _INSTRUMENTED_MARKER, True)
+    cls.__init_subclass__ = classmethod(__init_subclass__)  # type: ignore[assignment]
+
+
+def _patch_class(cls: type, attr_name: str, instrumented: Any) -> None:
+    """
+    set an attribute on a class, and remember what it replaced so that it can be undone (and redone) later
+    the record is stored on the class itself, since the original methods may reference the class (e.g. via super)
+    """
+    original = vars(cls).get(attr_name, _MISSING)
+    setattr(cls, attr_name, instrumented)
+    patches = vars(cls).get(_CLASS_PATCHES_ATTR)
+    if patches is None:
+        patches = []
+        setattr(cls, _CLASS_PATCHES_ATTR, patches)
+    patches.append((attr_name, original, vars(cls).get(attr_name, _MISSING)))
+
+
+def _toggle_class(cls: type, enabled: bool) -> None:
+    """
+    swap the instrumented attributes of a class for the originals (or vice versa)
+    attributes that were changed by someone else since they were instrumented are left alone
+    """
+    patches = vars(cls).get(_CLASS_PATCHES_ATTR, [])
+    for attr_name, original, instrumented in (patches if enabled else reversed(patches)):
+        current, new = (original, instrumented) if enabled else (instrumented, original)
+        if vars(cls).get(attr_name, _MISSING) is not current:
+            continue
+        if new is _MISSING:
+            delattr(cls, attr_name)
+        else:
+            setattr(cls, attr_name, new)
+
+
+def _set_instrumentation_enabled(enabled: bool) -> None:
+    """
+    turn all wrappers created by `instrument_decorate` on or off, without having to restart
+    instrumented classes have their original methods and properties put back in place while disabled
+    instrumented functions can't be swapped back, since other modules hold references to them,
+    so instead their wrappers check a flag and call the original function directly
+    """
+    global _ENABLED
+    enabled = bool(enabled)
+    if enabled == _ENABLED:
+        return
+    _ENABLED = enabled
+    for cls in list(_INSTRUMENTED_CLASSES):
+        _toggle_class(cls, enabled)
+
+
+def get_property_index(cls: type) -> Dict[str, PropertyInfo]:
+    """
+    the precomputed span metadata for each property of an instrumented class (empty if not instrumented)
+    """
+    return dict(_PROPERTY_INDEX.get(cls, dict()))
+
+
+def _build_property_index(cls: type,
+                          class_name: str,
+                          span_attributes: dict,
+                          ) -> Dict[str, PropertyInfo]:
+    """
+    walk the class (and its mro) once, and build the span name and (frozen) attributes for every property
+    the line number comes from the code object, since `inspect.getsourcelines` has to read and parse the source file
+    """
+    property_index = dict()
+    for attr_name, _, attr in _iter_class_attributes(cls):
+        if isinstance(attr, property):
+            _fget = attr.fget
+        elif isinstance(attr, cached_property):
+            _fget = attr.func
+        else:
+            continue
+
+        _attribs = dict()
+        _attribs.update(span_attributes)
+        _attribs[SpanAttributes.CODE_FUNCTION] = attr_name
+
+        # get line of code for the property if possible (a property doesn't need a getter)
+        lineno: Optional[int] = None
+        if _fget is not None:
+            # noinspection PyBroadException
+            try:
+                lineno = inspect.unwrap(_fget).__code__.co_firstlineno
+                _attribs[SpanAttributes.CODE_LINENO] = lineno
+            except Exception:
+                pass
+
+        property_index[attr_name] = PropertyInfo(span_name=intern_span_name(f'property {class_name}.{attr_name}'),
+                                                 lineno=lineno,
+                                                 attributes=freeze_attributes(_attribs))
+    return property_index
+
+
+def _iter_class_attributes(cls: type) -> Iterator[Tuple[str, type, Any]]:
+    """
+    yield (name, owner, attribute) for every non-dunder attribute that instances of `cls` would see
+    walks the mro so that each name is only yielded once, from the class that actually defines it
+    """
+    seen = set()
+    for owner in cls.__mro__:
+        if owner is object:
+            continue
+        for attr_name, attr in list(vars(owner).items()):
+            if attr_name in seen:
+                continue
+            seen.add(attr_name)
+
+            # dunders are special-cased in `_instrument_class`
+            if attr_name.startswith('__') and attr_name.endswith('__'):
+                continue
+
+            yield attr_name, owner, attr
+
+
+def _instrument_class_attribute(attr_name: str,
+                                attr_owner: type,
+                                attr: Any,
+                                span_attributes: dict,
+                                property_index: Dict[str, PropertyInfo],
+                                options: Dict[str, Any],
+                                ) -> Any:
+    """
+    returns an instrumented replacement for a class attribute, or the attribute itself if it should not be instrumented
+
+    :param attr_name: name of the attribute
+    :param attr_owner: class in the mro that defines the attribute
+    :param attr: the attribute itself, as found in the class `__dict__` (i.e. the descriptor, not the bound method)
+    :param span_attributes: span attributes of the class being instrumented
+    :param property_index: precomputed span metadata for the properties of the class being instrumented
+    :param options: kwargs for `instrument_decorate`
+    :return:
+    """
+    # normal methods (and builtin methods, like `dict.get`) are just functions until they're bound
+    if isinstance(attr, (FunctionType, MethodDescriptorType)):
+        return instrument_decorate(attr, **options)
+
+    # static and class methods need to be unwrapped, instrumented, and re-wrapped
+    if isinstance(attr, (staticmethod, classmethod)):
+        instrumented_func = instrument_decorate(attr.__func__, **options)
+        if instrumented_func is attr.__func__:
+            return attr
+        return type(attr)(instrumented_func)
+
+    # properties
+    if attr_name in property_index:
+        property_info = property_index[attr_name]
+
+        if options.get('metrics_only'):
+            function_metrics = _get_function_metrics(property_info.span_name, span_attributes, options.get('buckets'))
+        else:
+            function_metrics = None
+
+        if isinstance(attr, property):
+            return _InstrumentedProperty(attr, property_info,
+                                         sampler=make_sampler(options.get('sample'), options.get('max_rate')),
+                                         function_metrics=function_metrics)
+        return _InstrumentedCachedProperty(attr, property_info,
+                                           sampler=make_sampler(options.get('sample'), options.get('max_rate')),
+                                           function_metrics=function_metrics)
+
+    # nested classes, but not any other class that happens to be referenced by the class
+    if inspect.isclass(attr) and getattr(attr, '__qualname__', None) == f'{attr_owner.__qualname__}.{attr_name}':
+        return instrument_decorate(attr, **options)
+
+    # no clue what this is, leave it alone
+    return attr
+
+
+class _InstrumentedCachedProperty:
+    """
+    wraps a property-like descriptor to create a span whenever it's read from an instance
+    this is a non-data descriptor, so once a `cached_property` is cached in the instance `__dict__`, it costs nothing
+    """
+
+    def __init__(self,
+                 descriptor: Any,
+                 property_info: PropertyInfo,
+                 sampler: Optional[Callable[[], bool]] = None,
+                 function_metrics: Optional[FunctionMetrics] = None,
+                 ) -> None:
+        self.__wrapped__ = descriptor
+        self.__doc__ = getattr(descriptor, '__doc__', None)
+        self._property_info = property_info
+        self._sampler = sampler
+        self._function_metrics = function_metrics
+
+    def __get__(self, instance, owner=None):
+        # accessed via the class, e.g. for introspection
+        if instance is None:
+            return self.__wrapped__.__get__(instance, owner)
+
+        # record metrics instead of creating a span
+        if self._function_metrics is not None:
+            _start = time.perf_counter()
+            try:
+                ret = self.__wrapped__.__get__(instance, owner)
+            except BaseException:
+                self._function_metrics.record(time.perf_counter() - _start, True)
+                raise
+            self._function_metrics.record(time.perf_counter() - _start)
+            return ret
+
+        # not sampled, so don't create a span
+        if self._sampler is not None and not self._sampler():
+            return self.__wrapped__.__get__(instance, owner)
+
+        # instrument the property call
+        with _TRACER.start_as_current_span(self._property_info.span_name,
+                                           attributes=self._property_info.attributes) as span:
+            ret = self.__wrapped__.__get__(instance, owner)
+            if span.is_recording():
+                span.set_status(Status(StatusCode.OK))
+            return ret
+
+    def __getattr__(self, name):
+        # e.g. `fget`, `setter`, `attrname`, or `__isabstractmethod__`
+        if name == '__wrapped__':
+            raise AttributeError(name)
+        return getattr(self.__wrapped__, name)
+
+
+class _InstrumentedProperty(_InstrumentedCachedProperty):
+    """
+    a `property` is a data descriptor, so the setter and deleter must be passed through as-is
+    """
+
+    def __set__(self, instance, value):
+        self.__wrapped__.__set__(instance, value)
+
+    def __delete__(self, instance):
+        self.__wrapped__.__delete__(instance)
@@ -0,0 +1,193 @@
+"""
+lightweight python runtime metrics, to complement the (psutil-based) system metrics
+
+* garbage collection, measured via the `gc.callbacks` hook shared with the `gc` span probe (so every collection is
+  seen, not just a sample):
+    * `otel_wrapper.runtime.gc.collections`, `.gc.pause.sum`, and `.gc.pause.bucket` form a prometheus-style
+      histogram of pause durations, per `generation`
+    * `otel_wrapper.runtime.gc.collected` and `otel_wrapper.runtime.gc.uncollectable` count objects, per `generation`
+* GIL contention, measured by a background thread that sleeps for `interval` seconds and records how late it woke up
+    * when other threads are busy running python code, a waking thread can wait up to `sys.getswitchinterval()`
+      (or much longer, if a C extension holds the GIL) before it gets to run
+    * `otel_wrapper.runtime.gil.lag.samples`, `.sum`, and `.bucket` form a histogram of the wakeup lag
+    * `otel_wrapper.runtime.switch_interval` is the current switch interval, for comparison
+* `otel_wrapper.runtime.threads` and `otel_wrapper.runtime.allocated_blocks` are read when metrics are collected
+
+like `function_metrics`, everything is aggregated in-process and published via observable instruments
+"""
+import sys
+import threading
+import time
+from typing import Iterable
+from typing import Optional
+
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import DEFAULT_DURATION_BUCKETS
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import FunctionMetrics
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import instrument_decorate
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+# noinspection PyProtectedMember
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_probes import _GcTracker
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.span_probes import install_gc_tracker
+
+
+class _GilLag:
+    """
+    a background thread that repeatedly sleeps, and records how much longer than requested each sleep took
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.lag = FunctionMetrics({}, DEFAULT_DURATION_BUCKETS)
+        self._thread = threading.Thread(target=self._run, name='otel_wrapper.runtime_metrics', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            interval = self.interval
+            start = time.perf_counter()
+            time.sleep(interval)
+            self.lag.record(max(0.0, time.perf_counter() - start - interval))
+
+
+_GC_TRACKER: Optional[_GcTracker] = None
+_GIL_LAG: Optional[_GilLag] = None
+
+
+def _observe_gc_collections(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GC_TRACKER is not None:
+        for pauses in _GC_TRACKER.pauses:
+            yield Observation(pauses.calls, pauses.attributes)
+
+
+def _observe_gc_pause_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GC_TRACKER is not None:
+        for pauses in _GC_TRACKER.pauses:
+            yield Observation(pauses.duration_sum, pauses.attributes)
+
+
+def _observe_gc_pause_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GC_TRACKER is not None:
+        for pauses in _GC_TRACKER.pauses:
+            for le, count in pauses.cumulative_buckets():
+                yield Observation(count, {**pauses.attributes, 'le': le})
+
+
+def _observe_gc_collected(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GC_TRACKER is not None:
+        for pauses, collected in zip(_GC_TRACKER.pauses, _GC_TRACKER.collected):
+            yield Observation(collected, pauses.attributes)
+
+
+def _observe_gc_uncollectable(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GC_TRACKER is not None:
+        for pauses, uncollectable in zip(_GC_TRACKER.pauses, _GC_TRACKER.uncollectable):
+            yield Observation(uncollectable, pauses.attributes)
+
+
+def _observe_gil_lag_samples(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GIL_LAG is not None:
+        yield Observation(_GIL_LAG.lag.calls)
+
+
+def _observe_gil_lag_sum(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GIL_LAG is not None:
+        yield Observation(_GIL_LAG.lag.duration_sum)
+
+
+def _observe_gil_lag_buckets(_options: CallbackOptions) -> Iterable[Observation]:
+    if _GIL_LAG is not None:
+        for le, count in _GIL_LAG.lag.cumulative_buckets():
+            yield Observation(count, {'le': le})
+
+
+def _observe_switch_interval(_options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(sys.getswitchinterval())
+
+
+def _observe_threads(_options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(threading.active_count())
+
+
+def _observe_allocated_blocks(_options: CallbackOptions) -> Iterable[Observation]:
+    yield Observation(sys.getallocatedblocks())
+
+
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.runtime.gc.collections',
+                                    callbacks=[_observe_gc_collections],
+                                    unit='{collection}',
+                                    description='number of garbage collections, per generation')
+    meter.create_observable_counter('otel_wrapper.runtime.gc.pause.sum',
+                                    callbacks=[_observe_gc_pause_sum],
+                                    unit='s',
+                                    description='total time spent in garbage collection, per generation')
+    meter.create_observable_counter('otel_wrapper.runtime.gc.pause.bucket',
+                                    callbacks=[_observe_gc_pause_buckets],
+                                    unit='{collection}',
+                                    description='cumulative histogram of garbage collection pauses, with upper bounds '
+                                                'in `le`')
+    meter.create_observable_counter('otel_wrapper.runtime.gc.collected',
+                                    callbacks=[_observe_gc_collected],
+                                    unit='{object}',
+                                    description='number of objects collected, per generation')
+    meter.create_observable_counter('otel_wrapper.runtime.gc.uncollectable',
+                                    callbacks=[_observe_gc_uncollectable],
+                                    unit='{object}',
+                                    description='number of uncollectable objects found, per generation')
+    meter.create_observable_counter('otel_wrapper.runtime.gil.lag.samples',
+                                    callbacks=[_observe_gil_lag_samples],
+                                    unit='{sample}',
+                                    description='number of times the wakeup lag of a sleeping thread was measured')
+    meter.create_observable_counter('otel_wrapper.runtime.gil.lag.sum',
+                                    callbacks=[_observe_gil_lag_sum],
+                                    unit='s',
+                                    description='total wakeup lag of a sleeping thread, mostly from GIL contention')
+    meter.create_observable_counter('otel_wrapper.runtime.gil.lag.bucket',
+                                    callbacks=[_observe_gil_lag_buckets],
+                                    unit='{sample}',
+                                    description='cumulative histogram of wakeup lag, with upper bounds in `le`')
+    meter.create_observable_gauge('otel_wrapper.runtime.switch_interval',
+                                  callbacks=[_observe_switch_interval],
+                                  unit='s',
+                                  description='interpreter thread switch interval (`sys.getswitchinterval()`)')
+    meter.create_observable_gauge('otel_wrapper.runtime.threads',
+                                  callbacks=[_observe_threads],
+                                  unit='{thread}',
+                                  description='number of running python threads')
+    meter.create_observable_gauge('otel_wrapper.runtime.allocated_blocks',
+                                  callbacks=[_observe_allocated_blocks],
+                                  unit='{block}',
+                                  description='number of memory blocks allocated by the interpreter')
+
+
+@instrument_decorate
+def instrument_runtime_metrics(interval: Optional[float] = None):
+    """
+    start recording python runtime metrics (garbage collection, GIL contention, threads, and allocated blocks)
+    calling this again only updates the polling interval
+
+    :param interval: seconds between GIL contention samples (default: `OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S`)
+    """
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return
+
+    if interval is None:
+        interval = OTEL_WRAPPER_RUNTIME_METRICS_INTERVAL_S
+    if not interval > 0:
+        raise ValueError(f'`interval` must be positive, got {interval!r}')
+
+    global _GC_TRACKER, _GIL_LAG
+    if _GC_TRACKER is None:
+        _GC_TRACKER = install_gc_tracker()  # shared with the `gc` span probe, so collections are only timed once
+        _GIL_LAG = _GilLag(interval)
+        _init_instruments()
+    elif _GIL_LAG is not None:
+        _GIL_LAG.interval = interval
@@ -0,0 +1,121 @@
+"""
+console span exporter that writes one compact json object per line, including `duration_ns`
+
+the output is identical to `ConsoleSpanExporter` with a formatter that adds `duration_ns` to `span.to_json()`,
+but that took three serialization passes per span (`to_json`, then `json.loads` and `json.dumps` to add a field),
+plus a `json.loads` of the resource, all while holding the GIL on the export thread
+instead, each span is converted to a dict once and serialized once, the resource is only converted once,
+and each batch is written with a single `write` call
+"""
+import json
+import sys
+from typing import Any
+from typing import Dict
+from typing import IO
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter
+from opentelemetry.sdk.trace.export import SpanExportResult
+from opentelemetry.sdk.util import ns_to_iso_str
+from opentelemetry.trace import SpanContext
+from opentelemetry.trace import format_span_id
+from opentelemetry.trace import format_trace_id
+
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.console_writer import NonBlockingWriter
+
+# same separators as `json.dumps(..., indent=None)`, which is what `span.to_json(indent=None)` uses
+_ENCODER = json.JSONEncoder(separators=(', ', ': '))
+
+# how long to wait for buffered spans to be written when shutting down, since the stream might never accept them
+_SHUTDOWN_TIMEOUT = 10.0
+
+
+def _format_context(span_context: SpanContext) -> Dict[str, str]:
+    return {
+        'trace_id':    f'0x{format_trace_id(span_context.trace_id)}',
+        'span_id':     f'0x{format_span_id(span_context.span_id)}',
+        'trace_state': repr(span_context.trace_state),
+    }
+
+
+def _format_attributes(attributes: Any) -> Optional[Dict[str, Any]]:
+    if attributes is not None and not isinstance(attributes, dict):
+        return dict(attributes)
+    return attributes
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    drop-in replacement for `ConsoleSpanExporter(formatter=...)` that writes spans as json lines
+    """
+
+    def __init__(self, out: Union[IO[str], NonBlockingWriter] = sys.stdout) -> None:
+        """
+        :param out: text stream to write to (flushed after every batch),
+                    or a `NonBlockingWriter`, so that a slow stream doesn't block the export thread
+        """
+        self.out = out
+        self._resource: Optional[Tuple[Resource, Dict[str, Any]]] = None  # resources are immutable, so cache the last
+
+    def _format_resource(self, resource: Resource) -> Dict[str, Any]:
+        cached = self._resource
+        if cached is None or cached[0] is not resource:
+            cached = self._resource = (resource, json.loads(resource.to_json()))
+        return cached[1]
+
+    def format_span(self, span: ReadableSpan) -> str:
+        """
+        same as `span.to_json(indent=None)`, plus `duration_ns` if the span has ended
+        """
+        start_time = span.start_time
+        end_time = span.end_time
+        status: Dict[str, str] = {'status_code': span.status.status_code.name}
+        if span.status.description:
+            status['description'] = span.status.description
+
+        span_obj: Dict[str, Any] = {
+            'name':       span.name,
+            'context':    _format_context(span.context) if span.context else None,
+            'kind':       str(span.kind),
+            'parent_id':  f'0x{format_span_id(span.parent.span_id)}' if span.parent is not None else None,
+            'start_time': ns_to_iso_str(start_time) if start_time else None,
+            'end_time':   ns_to_iso_str(end_time) if end_time else None,
+            'status':     status,
+            'attributes': _format_attributes(span.attributes),
+            'events':     [{'name':       event.name,
+                            'timestamp':  ns_to_iso_str(event.timestamp),
+                            'attributes': _format_attributes(event.attributes),
+                            } for event in span.events],
+            'links':      [{'context':    _format_context(link.context),
+                            'attributes': _format_attributes(link.attributes),
+                            } for link in span.links],
+            'resource':   self._format_resource(span.resource),
+        }
+        if start_time and end_time:
+            span_obj['duration_ns'] = end_time - start_time
+        return _ENCODER.encode(span_obj)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        if spans:
+            lines = [self.format_span(span) for span in spans]
+            lines.append('')  # trailing newline
+            if isinstance(self.out, NonBlockingWriter):
+                self.out.write('\n'.join(lines), len(spans))  # dropped spans are counted by the writer
+            else:
+                self.out.write('\n'.join(lines))
+                self.out.flush()
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if isinstance(self.out, NonBlockingWriter):
+            return self.out.flush(timeout_millis / 1000)
+        return True
+
+    def shutdown(self) -> None:
+        if isinstance(self.out, NonBlockingWriter):
+            self.out.close(_SHUTDOWN_TIMEOUT)
@@ -0,0 +1,57 @@
+"""
+turn instrumentation off (and back on) at runtime, e.g. to shed telemetry overhead during an incident
+
+this covers everything created by `instrument_decorate` (and `otel`), and the `instrument_dataclasses` patch
+* instrumented classes get their original methods and properties put back in place
+* instrumented functions fall through to the original function after a single flag check
+* `dataclasses.dataclass` is restored to the original
+other instrumentors (logging, requests, fastapi, sqlalchemy) are not affected
+
+unlike `OTEL_WRAPPER_DISABLED`, nothing is skipped at import time,
+so anything decorated while disabled is still instrumented once re-enabled
+"""
+import signal
+from typing import Optional
+
+from opentelemetry_wrapper.v0.dependencies.opentelemetry import instrument_decorator
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_dataclasses import _set_dataclass_patch_enabled
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.instrument_decorator import _set_instrumentation_enabled
+
+
+def is_instrumentation_enabled() -> bool:
+    return instrument_decorator._ENABLED
+
+
+def set_instrumentation_enabled(enabled: bool) -> None:
+    """
+    :param enabled: False to disable all decorator-based instrumentation, True to re-enable it
+    """
+    _set_instrumentation_enabled(enabled)
+    _set_dataclass_patch_enabled(enabled)
+
+
+def disable_instrumentation() -> None:
+    set_instrumentation_enabled(False)
+
+
+def enable_instrumentation() -> None:
+    set_instrumentation_enabled(True)
+
+
+def install_kill_switch_signal(signum: Optional[int] = None) -> None:
+    """
+    toggle instrumentation on and off whenever the process receives a signal, e.g. `kill -USR2 <pid>`
+    must be called from the main thread (this is a restriction of the `signal` module)
+    the handler deliberately doesn't log anything, since logging from a signal handler can deadlock
+
+    :param signum: defaults to SIGUSR2 (which is not available on windows)
+    """
+    if signum is None:
+        if not hasattr(signal, 'SIGUSR2'):
+            raise ValueError('SIGUSR2 is not available on this platform, please specify a signal')
+        signum = signal.SIGUSR2
+
+    def _toggle(_signum, _frame):
+        set_instrumentation_enabled(not is_instrumentation_enabled())
+
+    signal.signal(signum, _toggle)
@@ -1,4 +1,3 @@
-import json
 import logging
 from functools import lru_cache
 from typing import List
@@ -7,17 +6,11 @@ from typing import Set
 
 from opentelemetry import metrics
 from opentelemetry import trace
-# noinspection PyProtectedMember
-from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.exporter.prometheus import PrometheusMetricReader
 # noinspection PyProtectedMember
 from opentelemetry.sdk._logs import LoggerProvider
 # noinspection PyProtectedMember
 from opentelemetry.sdk._logs import LoggingHandler
-# noinspection PyProtectedMember
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 from opentelemetry.sdk.metrics import MeterProvider
 # noinspection PyProtectedMember
 from opentelemetry.sdk.metrics._internal.export import ConsoleMetricExporter
@@ -27,19 +20,32 @@ from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.resources import SERVICE_NAME
 from opentelemetry.sdk.resources import SERVICE_NAMESPACE
-from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace import SpanProcessor
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.sdk.trace.export import ConsoleSpanExporter
 from prometheus_client import start_http_server
 
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_ENDPOINT
-from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_HEADER
-from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_INSECURE
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_PROMETHEUS_PORT
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_LOG_LEVEL
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_SERVICE_NAME
 from opentelemetry_wrapper.v0.config.otel_headers import OTEL_SERVICE_NAMESPACE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_BLRP_OTLP
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_BSP_CONSOLE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_BSP_OTLP
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_CONSOLE_SPANS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_SPOOL_DIR
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_SPOOL_MAX_BYTES
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_SPOOL_REPLAY_RATE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_RATIO
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otlp_exporters import get_otlp_log_exporter
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otlp_exporters import get_otlp_metric_exporter
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otlp_exporters import get_otlp_span_exporter
 
 
 @lru_cache  # only run once
@@ -59,24 +65,59 @@ def init_tracer_provider():
     # noinspection PyProtectedMember
     trace._set_tracer_provider(tp, log=False)  # try to set, but don't warn otherwise
     if trace.get_tracer_provider() is tp:  # if we succeeded in setting it, set it up
-        def format_span(span: ReadableSpan) -> str:
-            # noinspection PyTypeChecker
-            span_json_str = span.to_json(indent=None)
+        # imported here since it uses `get_meter` from this module
+        from opentelemetry_wrapper.v0.dependencies.opentelemetry.batch_processors import MonitoredBatchSpanProcessor
 
-            # add duration in seconds
-            if span.start_time and span.end_time:
-                span_json_obj = json.loads(span_json_str)
-                span_json_obj['duration_ns'] = span.end_time - span.start_time
-                span_json_str = json.dumps(span_json_obj, indent=None)
+        span_processors: List[SpanProcessor] = []
 
-            return f'{span_json_str}\n'
+        if OTEL_WRAPPER_CONSOLE_SPANS:
+            # imported here since they use `get_meter` from this module
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.console_writer import NonBlockingWriter
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.console_writer import \
+                register_console_writer_metrics
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.json_span_exporter import JsonLinesSpanExporter
 
-        tp.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(formatter=format_span)))
+            console_writer = NonBlockingWriter(max_bytes=OTEL_WRAPPER_CONSOLE_SPANS_BUFFER_BYTES,
+                                               drop_policy=OTEL_WRAPPER_CONSOLE_SPANS_DROP_POLICY)
+            register_console_writer_metrics(console_writer)
+            span_processors.append(MonitoredBatchSpanProcessor(JsonLinesSpanExporter(console_writer),
+                                                               'console',
+                                                               OTEL_WRAPPER_BSP_CONSOLE))
 
         if OTEL_EXPORTER_OTLP_ENDPOINT:
-            tp.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
-                                                                      headers=OTEL_EXPORTER_OTLP_HEADER,
-                                                                      insecure=OTEL_EXPORTER_OTLP_INSECURE)))
+            otlp_span_exporter = get_otlp_span_exporter(timeout=OTEL_WRAPPER_BSP_OTLP.export_timeout_millis / 1000)
+            if OTEL_WRAPPER_SPOOL_DIR:
+                # imported here since it uses `get_meter` from this module
+                from opentelemetry_wrapper.v0.dependencies.opentelemetry.spool import SpoolingSpanExporter
+                from opentelemetry_wrapper.v0.dependencies.opentelemetry.spool import open_spool
+
+                span_spool = open_spool('traces',
+                                        OTEL_WRAPPER_SPOOL_DIR,
+                                        max_bytes=OTEL_WRAPPER_SPOOL_MAX_BYTES,
+                                        replay_rate=OTEL_WRAPPER_SPOOL_REPLAY_RATE,
+                                        timeout=OTEL_WRAPPER_BSP_OTLP.export_timeout_millis / 1000)
+                if span_spool is not None:
+                    otlp_span_exporter = SpoolingSpanExporter(otlp_span_exporter, span_spool)
+            span_processors.append(MonitoredBatchSpanProcessor(otlp_span_exporter, 'otlp', OTEL_WRAPPER_BSP_OTLP))
+
+        if OTEL_WRAPPER_TAIL_SAMPLING:
+            # imported here since it uses `get_meter` from this module
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.tail_sampling import TailSamplingSpanProcessor
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.tail_sampling import \
+                register_tail_sampling_metrics
+
+            tail_sampling_processor = TailSamplingSpanProcessor(
+                span_processors,
+                ratio=OTEL_WRAPPER_TAIL_SAMPLING_RATIO,
+                latency_threshold=OTEL_WRAPPER_TAIL_SAMPLING_LATENCY_MS / 1000,
+                max_spans=OTEL_WRAPPER_TAIL_SAMPLING_MAX_SPANS,
+                timeout=OTEL_WRAPPER_TAIL_SAMPLING_TIMEOUT_S,
+            )
+            register_tail_sampling_metrics(tail_sampling_processor)
+            span_processors = [tail_sampling_processor]
+
+        for span_processor in span_processors:
+            tp.add_span_processor(span_processor)
 
 
 def get_tracer(instrumenting_module_name: str,
@@ -101,9 +142,7 @@ def init_meter_provider(*, print_to_console: bool = False):
         metric_readers.append(PeriodicExportingMetricReader(ConsoleMetricExporter()))
 
     if OTEL_EXPORTER_OTLP_ENDPOINT:
-        metric_readers.append(PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
-                                                                               headers=OTEL_EXPORTER_OTLP_HEADER,
-                                                                               insecure=OTEL_EXPORTER_OTLP_INSECURE)))
+        metric_readers.append(PeriodicExportingMetricReader(get_otlp_metric_exporter()))
 
     # https://opentelemetry.io/docs/languages/python/exporters/#prometheus-dependencies
     if OTEL_EXPORTER_PROMETHEUS_PORT is not None:
@@ -122,6 +161,14 @@ def init_meter_provider(*, print_to_console: bool = False):
     metrics._internal._set_meter_provider(mp, log=False)  # try to set, but don't warn otherwise
 
 
+def get_meter(instrumenting_module_name: str,
+              instrumenting_library_version: str = '',
+              ) -> metrics.Meter:
+    init_meter_provider()
+    return metrics.get_meter(name=instrumenting_module_name,
+                             version=instrumenting_library_version)
+
+
 # write IDs as 0xBEEF instead of BEEF, so it matches the trace json exactly
 LOGGING_FORMAT_VERBOSE = (
     '%(asctime)s '
@@ -142,7 +189,24 @@ def get_otel_log_handler(*,
     # based on https://github.com/mhausenblas/ref.otel.help/blob/main/how-to/logs-collection/yoda/main.py
     lp = LoggerProvider(resource=get_otel_resource())
     if OTEL_EXPORTER_OTLP_ENDPOINT:
-        lp.add_log_record_processor(BatchLogRecordProcessor(OTLPLogExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
-                                                                            headers=OTEL_EXPORTER_OTLP_HEADER,
-                                                                            insecure=OTEL_EXPORTER_OTLP_INSECURE)))
+        # imported here since it uses `get_meter` from this module
+        from opentelemetry_wrapper.v0.dependencies.opentelemetry.batch_processors import \
+            MonitoredBatchLogRecordProcessor
+
+        otlp_log_exporter = get_otlp_log_exporter(timeout=OTEL_WRAPPER_BLRP_OTLP.export_timeout_millis / 1000)
+        if OTEL_WRAPPER_SPOOL_DIR:
+            # imported here since it uses `get_meter` from this module
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.spool import SpoolingLogExporter
+            from opentelemetry_wrapper.v0.dependencies.opentelemetry.spool import open_spool
+
+            log_spool = open_spool('logs',
+                                   OTEL_WRAPPER_SPOOL_DIR,
+                                   max_bytes=OTEL_WRAPPER_SPOOL_MAX_BYTES,
+                                   replay_rate=OTEL_WRAPPER_SPOOL_REPLAY_RATE,
+                                   timeout=OTEL_WRAPPER_BLRP_OTLP.export_timeout_millis / 1000)
+            if log_spool is not None:
+                otlp_log_exporter = SpoolingLogExporter(otlp_log_exporter, log_spool)
+        lp.add_log_record_processor(MonitoredBatchLogRecordProcessor(otlp_log_exporter,
+                                                                     'otlp',
+                                                                     OTEL_WRAPPER_BLRP_OTLP))
     return LoggingHandler(level=level, logger_provider=lp)
@@ -0,0 +1,206 @@
+"""
+OTLP span, metric, and log exporters, over grpc or http/protobuf (set via `OTEL_EXPORTER_OTLP_PROTOCOL`)
+
+http/protobuf is for collectors behind http-only proxies and load balancers, which tend to reset long-lived grpc
+connections; all three signals share one `requests.Session`, so they reuse the same pool of keep-alive connections
+instead of each opening their own, and every request is gzipped unless `OTEL_EXPORTER_OTLP_COMPRESSION=none`
+(grpc exports are only compressed if `OTEL_EXPORTER_OTLP_COMPRESSION=gzip`, since the spec default is `none`)
+
+`send_otlp_bytes` sends an already-serialized request over the same protocol (used to replay spooled batches)
+"""
+import gzip
+import logging
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlparse
+
+import grpc  # type: ignore[import-untyped]
+import requests
+from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter as GrpcLogExporter
+from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter as GrpcMetricExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter as GrpcSpanExporter
+from opentelemetry.exporter.otlp.proto.http import Compression
+# noinspection PyProtectedMember
+from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter as HttpLogExporter
+from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter as HttpMetricExporter
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter as HttpSpanExporter
+from opentelemetry.sdk.metrics.export import MetricExporter
+from opentelemetry.sdk.trace.export import SpanExporter
+from requests.adapters import HTTPAdapter
+
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_COMPRESSION
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_ENDPOINT
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_HEADER
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_INSECURE
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_EXPORTER_OTLP_PROTOCOL
+
+try:
+    # noinspection PyProtectedMember
+    from opentelemetry.sdk._logs.export import LogRecordExporter
+except ImportError:  # renamed in sdk 1.39
+    # noinspection PyProtectedMember
+    from opentelemetry.sdk._logs.export import LogExporter as LogRecordExporter  # type: ignore[assignment]
+
+# grpc method and http path for each signal, from the OTLP spec
+_GRPC_METHODS = {
+    'traces':  '/opentelemetry.proto.collector.trace.v1.TraceService/Export',
+    'metrics': '/opentelemetry.proto.collector.metrics.v1.MetricsService/Export',
+    'logs':    '/opentelemetry.proto.collector.logs.v1.LogsService/Export',
+}
+_HTTP_PATHS = {
+    'traces':  'v1/traces',
+    'metrics': 'v1/metrics',
+    'logs':    'v1/logs',
+}
+
+# retrying won't help with anything else, e.g. a malformed request
+_RETRYABLE_HTTP_STATUS_CODES = {408, 429, 502, 503, 504}
+_RETRYABLE_GRPC_STATUS_CODES = {
+    grpc.StatusCode.CANCELLED,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+    grpc.StatusCode.OUT_OF_RANGE,
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DATA_LOSS,
+}
+
+
+@lru_cache  # only run once
+def get_otlp_http_session() -> requests.Session:
+    """
+    the traces, metrics, and logs are each exported from their own thread, so allow one connection per signal
+    closing the session (which each exporter does on shutdown) only drops idle connections, so it is still usable
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=3)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _http_endpoint(path: str) -> str:
+    """
+    `OTEL_EXPORTER_OTLP_ENDPOINT` is the base url, so append the signal-specific path, like the sdk does
+    (the http exporters only do that for the env var, not when the endpoint is passed in)
+
+    :param path: e.g. `v1/traces`
+    """
+    endpoint = OTEL_EXPORTER_OTLP_ENDPOINT
+    if not urlparse(endpoint).scheme:  # the grpc exporter works without a scheme, but requests doesn't
+        endpoint = f'http://{endpoint}' if OTEL_EXPORTER_OTLP_INSECURE else f'https://{endpoint}'
+    return f'{endpoint.rstrip("/")}/{path}'
+
+
+def _http_compression() -> Compression:
+    return Compression.Gzip if OTEL_EXPORTER_OTLP_COMPRESSION == 'gzip' else Compression.NoCompression
+
+
+def _grpc_compression() -> grpc.Compression:
+    return grpc.Compression.Gzip if OTEL_EXPORTER_OTLP_COMPRESSION == 'gzip' else grpc.Compression.NoCompression
+
+
+def get_otlp_span_exporter(timeout: Optional[float] = None) -> SpanExporter:
+    """
+    :param timeout: seconds to wait for each export, including retries
+    """
+    if OTEL_EXPORTER_OTLP_PROTOCOL == 'http/protobuf':
+        return HttpSpanExporter(endpoint=_http_endpoint(_HTTP_PATHS['traces']),
+                                headers=dict(OTEL_EXPORTER_OTLP_HEADER),
+                                timeout=timeout,
+                                compression=_http_compression(),
+                                session=get_otlp_http_session())
+    return GrpcSpanExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
+                            headers=OTEL_EXPORTER_OTLP_HEADER,
+                            insecure=OTEL_EXPORTER_OTLP_INSECURE,
+                            timeout=timeout,
+                            compression=_grpc_compression())
+
+
+def get_otlp_metric_exporter() -> MetricExporter:
+    if OTEL_EXPORTER_OTLP_PROTOCOL == 'http/protobuf':
+        return HttpMetricExporter(endpoint=_http_endpoint(_HTTP_PATHS['metrics']),
+                                  headers=dict(OTEL_EXPORTER_OTLP_HEADER),
+                                  compression=_http_compression(),
+                                  session=get_otlp_http_session())
+    return GrpcMetricExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
+                              headers=OTEL_EXPORTER_OTLP_HEADER,
+                              insecure=OTEL_EXPORTER_OTLP_INSECURE,
+                              compression=_grpc_compression())
+
+
+def get_otlp_log_exporter(timeout: Optional[float] = None) -> LogRecordExporter:
+    """
+    :param timeout: seconds to wait for each export, including retries
+    """
+    if OTEL_EXPORTER_OTLP_PROTOCOL == 'http/protobuf':
+        return HttpLogExporter(endpoint=_http_endpoint(_HTTP_PATHS['logs']),
+                               headers=dict(OTEL_EXPORTER_OTLP_HEADER),
+                               timeout=timeout,
+                               compression=_http_compression(),
+                               session=get_otlp_http_session())
+    return GrpcLogExporter(endpoint=OTEL_EXPORTER_OTLP_ENDPOINT,
+                           headers=OTEL_EXPORTER_OTLP_HEADER,
+                           insecure=OTEL_EXPORTER_OTLP_INSECURE,
+                           timeout=timeout,
+                           compression=_grpc_compression())
+
+
+@lru_cache  # only run once
+def _grpc_channel() -> grpc.Channel:
+    """
+    a separate channel from the exporters', with the same endpoint, security, and compression
+    """
+    # same logic as the grpc exporters: an `https` scheme is always secure, and `http` is insecure unless specified
+    parsed_url = urlparse(OTEL_EXPORTER_OTLP_ENDPOINT)
+    insecure = OTEL_EXPORTER_OTLP_INSECURE
+    if parsed_url.scheme == 'https':
+        insecure = False
+    elif insecure is None:
+        insecure = parsed_url.scheme == 'http'
+    target = parsed_url.netloc or OTEL_EXPORTER_OTLP_ENDPOINT
+
+    if insecure:
+        return grpc.insecure_channel(target, compression=_grpc_compression())
+    return grpc.secure_channel(target, grpc.ssl_channel_credentials(), compression=_grpc_compression())
+
+
+def send_otlp_bytes(signal: str, data: bytes, timeout: float) -> bool:
+    """
+    send a serialized `Export*ServiceRequest` protobuf as-is (no retries)
+    a request that was rejected for a reason that retrying won't fix is logged, and counts as sent
+
+    :param signal: `traces`, `metrics`, or `logs`
+    :param data: serialized request
+    :param timeout: seconds to wait for the response
+    :return: False if the request should be retried later
+    """
+    if OTEL_EXPORTER_OTLP_PROTOCOL == 'http/protobuf':
+        headers = {'Content-Type': 'application/x-protobuf', **dict(OTEL_EXPORTER_OTLP_HEADER)}
+        if OTEL_EXPORTER_OTLP_COMPRESSION == 'gzip':
+            headers['Content-Encoding'] = 'gzip'
+            data = gzip.compress(data)
+        try:
+            response = get_otlp_http_session().post(_http_endpoint(_HTTP_PATHS[signal]),
+                                                    data=data,
+                                                    headers=headers,
+                                                    timeout=timeout)
+        except requests.RequestException:
+            return False
+        if response.ok:
+            return True
+        if response.status_code in _RETRYABLE_HTTP_STATUS_CODES:
+            return False
+        logging.warning(f'OTLP endpoint rejected {signal}: {response.status_code} {response.reason}')
+        return True
+
+    export = _grpc_channel().unary_unary(_GRPC_METHODS[signal])  # no serializers, so it sends and returns bytes
+    try:
+        export(data, metadata=OTEL_EXPORTER_OTLP_HEADER, timeout=timeout)
+    except grpc.RpcError as error:
+        # noinspection PyUnresolvedReferences
+        if error.code() in _RETRYABLE_GRPC_STATUS_CODES:
+            return False
+        # noinspection PyUnresolvedReferences
+        logging.warning(f'OTLP endpoint rejected {signal}: {error.code()} {error.details()}')
+    return True
@@ -0,0 +1,205 @@
+"""
+coalesce repeated calls to the same function under the same parent span into a single summary span
+
+calling a decorated function thousands of times in a loop would otherwise export thousands of near-identical spans
+instead, each call only updates an in-process summary (no span is created), and when the parent span ends,
+a single summary span is created with the call count and duration statistics
+calls that raise an exception, or that are much slower than the average so far, are still exported as normal spans
+
+the summary span starts when the first call started and ends when the last call ended
+note that since no span is created for coalesced calls, any spans created inside them become siblings, not children
+"""
+import random
+import threading
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from opentelemetry import context
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace import Span as SdkSpan
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.trace import NonRecordingSpan
+from opentelemetry.trace import Status
+from opentelemetry.trace import StatusCode
+
+# span attributes on the summary span (all durations are in seconds)
+COALESCED_COUNT = 'otel_wrapper.coalesced.count'
+COALESCED_KEPT = 'otel_wrapper.coalesced.kept'
+COALESCED_DURATION_TOTAL = 'otel_wrapper.coalesced.duration.total'
+COALESCED_DURATION_MIN = 'otel_wrapper.coalesced.duration.min'
+COALESCED_DURATION_MAX = 'otel_wrapper.coalesced.duration.max'
+COALESCED_DURATION_P50 = 'otel_wrapper.coalesced.duration.p50'
+COALESCED_DURATION_P99 = 'otel_wrapper.coalesced.duration.p99'
+
+# a call is an outlier (and gets its own span) if it takes this many times longer than the average so far
+OUTLIER_FACTOR = 10
+OUTLIER_MIN_CALLS = 10  # only start looking for outliers after this many calls
+
+_MAX_SAMPLES = 4096  # durations kept per summary for estimating percentiles (reservoir sampled beyond this)
+_MAX_PENDING = 10000  # parent spans with pending summaries; the oldest is flushed if this is exceeded
+
+
+class _CallSummary:
+    """
+    running statistics for calls to one function under one parent span
+    updates are not locked; under the GIL these are effectively atomic, and at worst a call might be lost
+    """
+    __slots__ = ('parent_context', 'span_name', 'span_attributes',
+                 'count', 'kept', 'total', 'min', 'max', 'start', 'end', 'samples')
+
+    def __init__(self,
+                 parent_context: context.Context,
+                 span_name: str,
+                 span_attributes: Mapping,
+                 ) -> None:
+        self.parent_context = parent_context
+        self.span_name = span_name
+        self.span_attributes = span_attributes
+        self.count = 0
+        self.kept = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self.start = 0
+        self.end = 0
+        self.samples: List[int] = []
+
+    def add(self, start_ns: int, end_ns: int) -> bool:
+        """
+        :return: True if this call was an outlier
+        """
+        duration = end_ns - start_ns
+        is_outlier = self.count >= OUTLIER_MIN_CALLS and duration * self.count > OUTLIER_FACTOR * self.total
+
+        self.count += 1
+        self.total += duration
+        if self.count == 1:
+            self.min = self.max = duration
+            self.start = start_ns
+        elif duration < self.min:
+            self.min = duration
+        elif duration > self.max:
+            self.max = duration
+        if end_ns > self.end:
+            self.end = end_ns
+
+        if len(self.samples) < _MAX_SAMPLES:
+            self.samples.append(duration)
+        else:
+            idx = random.randrange(self.count)
+            if idx < _MAX_SAMPLES:
+                self.samples[idx] = duration
+
+        return is_outlier
+
+    def emit(self, tracer: trace.Tracer) -> None:
+        if not self.count:
+            return
+        samples = sorted(self.samples)
+        span = tracer.start_span(self.span_name,
+                                 context=self.parent_context,
+                                 attributes=self.span_attributes,
+                                 start_time=self.start)
+        if span.is_recording():
+            span.set_attribute(COALESCED_COUNT, self.count)
+            span.set_attribute(COALESCED_KEPT, self.kept)
+            span.set_attribute(COALESCED_DURATION_TOTAL, self.total / 1e9)
+            span.set_attribute(COALESCED_DURATION_MIN, self.min / 1e9)
+            span.set_attribute(COALESCED_DURATION_MAX, self.max / 1e9)
+            span.set_attribute(COALESCED_DURATION_P50, samples[int(0.50 * (len(samples) - 1))] / 1e9)
+            span.set_attribute(COALESCED_DURATION_P99, samples[int(0.99 * (len(samples) - 1))] / 1e9)
+            span.set_status(Status(StatusCode.OK))
+        span.end(end_time=self.end)
+
+
+class CoalescingSpanProcessor(SpanProcessor):
+    """
+    holds the pending summaries, and emits them when their parent span ends
+    this must be added to the tracer provider, otherwise summaries are only emitted on shutdown (or never)
+    """
+
+    def __init__(self, tracer: trace.Tracer) -> None:
+        self._tracer = tracer
+        self._pending: Dict[int, Dict[object, _CallSummary]] = dict()  # parent span id -> function key -> summary
+        self._lock = threading.Lock()
+
+    def record(self,
+               key: object,
+               span_name: str,
+               span_attributes: Mapping,
+               parent: trace.Span,
+               start_ns: int,
+               end_ns: int,
+               exc: Optional[BaseException] = None,
+               ) -> None:
+        """
+        record a single call that completed under the `parent` span
+
+        :param key: identifies the function being called
+        :param span_name:
+        :param span_attributes:
+        :param parent: current span when the function was called
+        :param start_ns: epoch time in nanoseconds
+        :param end_ns: epoch time in nanoseconds
+        :param exc: exception raised by the call, if any
+        """
+        parent_span_id = parent.get_span_context().span_id
+        summaries = self._pending.get(parent_span_id)
+        if summaries is None:
+            with self._lock:
+                summaries = self._pending.setdefault(parent_span_id, dict())
+                if len(self._pending) > _MAX_PENDING:
+                    self._flush(next(iter(self._pending)))
+
+        summary = summaries.get(key)
+        if summary is None:
+            # don't hold on to the parent span itself, just its context
+            parent_context = trace.set_span_in_context(NonRecordingSpan(parent.get_span_context()))
+            summary = summaries.setdefault(key, _CallSummary(parent_context, span_name, span_attributes))
+
+        # errors and outliers are kept as individual spans (but still count towards the summary)
+        if summary.add(start_ns, end_ns) or exc is not None:
+            summary.kept += 1
+            span = self._tracer.start_span(span_name,
+                                           context=summary.parent_context,
+                                           attributes=span_attributes,
+                                           start_time=start_ns)
+            if span.is_recording():
+                if exc is not None:
+                    span.record_exception(exc)
+                    span.set_status(Status(StatusCode.ERROR, f'{type(exc).__name__}: {exc}'))
+                else:
+                    span.set_status(Status(StatusCode.OK))
+            span.end(end_time=end_ns)
+
+    def _flush(self, parent_span_id: int) -> None:
+        summaries = self._pending.pop(parent_span_id, None)
+        if summaries:
+            for summary in list(summaries.values()):
+                summary.emit(self._tracer)
+
+    def on_start(self, span: SdkSpan, parent_context: Optional[context.Context] = None) -> None:
+        pass
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if self._pending and span.context is not None:
+            self._flush(span.context.span_id)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        for parent_span_id in list(self._pending):
+            self._flush(parent_span_id)
+        return True
+
+    def shutdown(self) -> None:
+        self.force_flush()
+
+    def pending(self) -> List[Tuple[int, int]]:
+        """
+        :return: (parent span id, number of pending calls) for each parent span, mainly for debugging
+        """
+        return [(parent_span_id, sum(summary.count for summary in summaries.values()))
+                for parent_span_id, summaries in list(self._pending.items())]
@@ -0,0 +1,153 @@
+"""
+opt-in measurements recorded as attributes on the spans of decorated functions, to explain why a span was slow
+    @partial(instrument_decorate, probes=('cpu', 'wall', 'gc'))
+    def f():
+        ...
+
+* `cpu`: thread cpu time (`time.thread_time_ns`), so wall time minus cpu time is roughly time spent waiting
+* `wall`: wall time (`time.perf_counter_ns`), measured at the same points as the other probes
+* `blocks`: net change in the number of allocated memory blocks (`sys.getallocatedblocks`)
+* `tracemalloc`: net change in memory traced by `tracemalloc` (only if it's already tracing)
+* `gc`: number of garbage collections during the call, and the total time spent collecting
+
+cpu time and memory are per thread and per process respectively, and gc is per process
+so for async functions (and multithreaded code), measurements include anything else that ran in the meantime
+"""
+import gc
+import sys
+import time
+import tracemalloc
+import warnings
+from functools import lru_cache
+from typing import Collection
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from opentelemetry.trace import Span
+
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.function_metrics import FunctionMetrics
+
+# span attributes (all durations are in seconds)
+PROBE_CPU_TIME = 'otel_wrapper.probe.cpu_time'
+PROBE_WALL_TIME = 'otel_wrapper.probe.wall_time'
+PROBE_ALLOCATED_BLOCKS = 'otel_wrapper.probe.allocated_blocks'
+PROBE_TRACED_BYTES = 'otel_wrapper.probe.traced_bytes'
+PROBE_GC_COLLECTIONS = 'otel_wrapper.probe.gc.collections'
+PROBE_GC_DURATION = 'otel_wrapper.probe.gc.duration'
+
+PROBES = ('cpu', 'wall', 'blocks', 'tracemalloc', 'gc')
+
+
+class _GcTracker:
+    """
+    process-wide count of garbage collections and time spent collecting, updated by a `gc.callbacks` hook
+    this is the only gc hook, shared by the `gc` probe and by the runtime metrics (which read the per-generation stats)
+    """
+    __slots__ = ('collections', 'duration_ns', 'pauses', 'collected', 'uncollectable', '_started')
+
+    def __init__(self) -> None:
+        self.collections = 0
+        self.duration_ns = 0
+        # reuse the in-process histogram from function metrics, with one per generation
+        self.pauses: List[FunctionMetrics] = [FunctionMetrics({'generation': str(generation)})
+                                              for generation in range(len(gc.get_count()))]
+        self.collected = [0] * len(self.pauses)
+        self.uncollectable = [0] * len(self.pauses)
+        self._started = 0
+
+    def callback(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == 'start':
+            self._started = time.perf_counter_ns()
+        elif self._started:
+            duration_ns = time.perf_counter_ns() - self._started
+            self._started = 0
+            self.collections += 1
+            self.duration_ns += duration_ns
+            generation = info.get('generation', 0)
+            if 0 <= generation < len(self.pauses):
+                self.pauses[generation].record(duration_ns / 1e9)
+                self.collected[generation] += info.get('collected', 0)
+                self.uncollectable[generation] += info.get('uncollectable', 0)
+
+
+_GC_TRACKER = _GcTracker()
+
+
+@lru_cache  # only run once
+def install_gc_tracker() -> _GcTracker:
+    gc.callbacks.append(_GC_TRACKER.callback)
+    return _GC_TRACKER
+
+
+class SpanProbes:
+    """
+    takes a reading when a call starts, and records the differences as span attributes when it ends
+    each probe that isn't enabled costs a single attribute check
+    """
+    __slots__ = ('cpu', 'wall', 'blocks', 'tracemalloc', 'gc')
+
+    def __init__(self, probes: Collection[str]) -> None:
+        """
+        :param probes: names of the probes to enable, see `PROBES`
+        """
+        if isinstance(probes, str):
+            probes = (probes,)
+        unknown = set(probes).difference(PROBES)
+        if unknown:
+            raise ValueError(f'unknown probes {sorted(unknown)!r}, expected any of {PROBES!r}')
+
+        self.cpu = 'cpu' in probes
+        self.wall = 'wall' in probes
+        self.blocks = 'blocks' in probes
+        self.tracemalloc = 'tracemalloc' in probes
+        self.gc = 'gc' in probes
+
+        if self.tracemalloc and not tracemalloc.is_tracing():
+            warnings.warn('the `tracemalloc` probe does nothing unless `tracemalloc` is started '
+                          '(e.g. by setting `PYTHONTRACEMALLOC=1`)')
+        if self.gc:
+            install_gc_tracker()
+
+    def start(self) -> Tuple[int, int, int, int, int, int]:
+        return (time.thread_time_ns() if self.cpu else 0,
+                time.perf_counter_ns() if self.wall else 0,
+                sys.getallocatedblocks() if self.blocks else 0,
+                tracemalloc.get_traced_memory()[0] if self.tracemalloc else 0,
+                _GC_TRACKER.collections if self.gc else 0,
+                _GC_TRACKER.duration_ns if self.gc else 0)
+
+    def finish(self, span: Span, started: Tuple[int, int, int, int, int, int]) -> None:
+        # take all the readings before doing anything else, so that setting attributes isn't measured
+        cpu_end = time.thread_time_ns() if self.cpu else 0
+        wall_end = time.perf_counter_ns() if self.wall else 0
+        blocks_end = sys.getallocatedblocks() if self.blocks else 0
+        traced_end = tracemalloc.get_traced_memory()[0] if self.tracemalloc else 0
+        gc_collections_end = _GC_TRACKER.collections
+        gc_duration_end = _GC_TRACKER.duration_ns
+        if not span.is_recording():
+            return
+
+        cpu_start, wall_start, blocks_start, traced_start, gc_collections_start, gc_duration_start = started
+        if self.cpu:
+            span.set_attribute(PROBE_CPU_TIME, (cpu_end - cpu_start) / 1e9)
+        if self.wall:
+            span.set_attribute(PROBE_WALL_TIME, (wall_end - wall_start) / 1e9)
+        if self.blocks:
+            span.set_attribute(PROBE_ALLOCATED_BLOCKS, blocks_end - blocks_start)
+        if self.tracemalloc and tracemalloc.is_tracing():
+            span.set_attribute(PROBE_TRACED_BYTES, traced_end - traced_start)
+        if self.gc:
+            span.set_attribute(PROBE_GC_COLLECTIONS, gc_collections_end - gc_collections_start)
+            span.set_attribute(PROBE_GC_DURATION, (gc_duration_end - gc_duration_start) / 1e9)
+
+
+def make_probes(probes: Optional[Collection[str]]) -> Optional[SpanProbes]:
+    """
+    :param probes: names of the probes to enable
+    :return: None if no probes are enabled, so the caller can skip them entirely
+    """
+    if not probes:
+        return None
+    return SpanProbes(probes)
@@ -0,0 +1,313 @@
+"""
+opt-in sampling profiler, which tags each stack sample with the span that was active in that thread at the time
+    start_profiler()
+    ...
+    print(get_folded_stacks())  # e.g. for flamegraph.pl or speedscope
+    print(get_folded_stacks(trace_id=0x...))  # only the samples from a single (slow) request
+
+a background thread reads the stack of every other thread via `sys._current_frames()` every `interval` seconds
+threads without an open span are skipped, and the rest are aggregated in memory as folded stacks per span name
+(`span name;outermost frame;...;innermost frame count`), so memory usage depends on the number of distinct stacks
+
+this is a wall-clock profiler, so a thread waiting on I/O inside a span is sampled the same as one burning CPU
+the active span of each thread is tracked by a span processor, since contextvars can't be read from another thread
+for async code, this is the most recently started span in the event loop's thread, which may belong to another task
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import FrameType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from opentelemetry import context
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace import Span as SdkSpan
+from opentelemetry.sdk.trace import SpanProcessor
+
+from opentelemetry_wrapper.v0.config.otel_headers import OTEL_WRAPPER_DISABLED
+
+_MAX_OPEN_SPANS_PER_THREAD = 1000  # spans that are never ended shouldn't leak forever
+_TRUNCATED: Tuple[Any, ...] = ('[truncated]',)
+
+# (span name, code objects from innermost to outermost) -> number of samples
+# code objects are only converted to names when the profile is read, since that's much cheaper while sampling
+_StackCounts = Dict[Tuple[str, Tuple[Any, ...]], int]
+
+
+class _ActiveSpanTracker(SpanProcessor):
+    """
+    keeps track of the spans that are currently open in each thread, in the order they were started
+    """
+
+    def __init__(self) -> None:
+        self.open_spans: Dict[int, List[SdkSpan]] = dict()  # thread id -> open spans, innermost last
+
+    def on_start(self, span: SdkSpan, parent_context: Optional[context.Context] = None) -> None:
+        thread_id = threading.get_ident()
+        spans = self.open_spans.get(thread_id)
+        if spans is None:
+            spans = self.open_spans.setdefault(thread_id, [])
+        spans.append(span)
+        if len(spans) > _MAX_OPEN_SPANS_PER_THREAD:
+            del spans[0]
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context is None:
+            return
+        span_id = span.context.span_id
+
+        # spans usually end in the same thread they started in, and in reverse order
+        spans = self.open_spans.get(threading.get_ident())
+        if spans and self._remove(spans, span_id):
+            return
+        for spans in list(self.open_spans.values()):
+            if self._remove(spans, span_id):
+                return
+
+    @staticmethod
+    def _remove(spans: List[SdkSpan], span_id: int) -> bool:
+        for i in range(len(spans) - 1, -1, -1):
+            try:
+                if spans[i].context.span_id == span_id:
+                    del spans[i]
+                    return True
+            except IndexError:  # modified by another thread
+                return False
+        return False
+
+    def active_span(self, thread_id: int) -> Optional[SdkSpan]:
+        spans = self.open_spans.get(thread_id)
+        if spans:
+            try:
+                return spans[-1]
+            except IndexError:  # modified by another thread
+                pass
+        return None
+
+
+class SpanProfiler:
+    """
+    see module docstring for usage
+    """
+
+    def __init__(self,
+                 interval: float = 0.01,
+                 *,
+                 max_depth: int = 64,
+                 max_stacks: int = 10000,
+                 max_traces: int = 1000,
+                 export_interval: Optional[float] = None,
+                 exporter: Optional[Callable[[str], None]] = None,
+                 ) -> None:
+        """
+        :param interval: seconds between samples
+        :param max_depth: maximum number of frames to keep per stack (the innermost frames are kept)
+        :param max_stacks: maximum number of distinct stacks to keep before truncating new ones
+        :param max_traces: number of most recent traces to keep separate profiles for
+        :param export_interval: if set, export and clear the profile every this many seconds
+        :param exporter: called with the folded stacks when exporting; logs them at INFO level by default
+        """
+        if interval <= 0:
+            raise ValueError(f'`interval` must be positive, got {interval!r}')
+
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.max_traces = max_traces
+        self.export_interval = export_interval
+        self.exporter = exporter or _log_folded_stacks
+
+        self.samples = 0
+        self.truncated_samples = 0
+        self._stacks: _StackCounts = dict()
+        self._traces: Dict[int, _StackCounts] = OrderedDict()  # trace id -> stacks, oldest first
+        self._frame_names: Dict[object, str] = dict()  # code object -> frame name
+        self._lock = threading.Lock()
+
+        self._tracker: Optional[_ActiveSpanTracker] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        if self._tracker is None:
+            tracer_provider = trace.get_tracer_provider()
+            if not hasattr(tracer_provider, 'add_span_processor'):
+                raise RuntimeError('the profiler requires the opentelemetry sdk tracer provider')
+            self._tracker = _ActiveSpanTracker()
+            tracer_provider.add_span_processor(self._tracker)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='otel_wrapper.profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        own_thread_id = threading.get_ident()
+        last_export = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self._sample(own_thread_id)
+            if self.export_interval is not None and time.monotonic() - last_export >= self.export_interval:
+                last_export = time.monotonic()
+                self.export()
+
+    def _sample(self, own_thread_id: int) -> None:
+        assert self._tracker is not None
+        max_depth = self.max_depth
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            span = self._tracker.active_span(thread_id)
+            if span is None:
+                continue
+
+            # walk the stack from the innermost frame outwards
+            codes = []
+            current: Optional[FrameType] = frame
+            for _ in range(max_depth):
+                if current is None:
+                    break
+                codes.append(current.f_code)
+                current = current.f_back
+
+            key = (span.name, tuple(codes))
+            trace_id = span.context.trace_id
+            with self._lock:
+                self.samples += 1
+                if key not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    self.truncated_samples += 1
+                    key = (span.name, _TRUNCATED)
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+
+                trace_stacks = self._traces.get(trace_id)
+                if trace_stacks is None:
+                    trace_stacks = self._traces[trace_id] = dict()
+                    while len(self._traces) > self.max_traces:
+                        self._traces.pop(next(iter(self._traces)))
+                trace_stacks[key] = trace_stacks.get(key, 0) + 1
+
+    def _frame_name(self, code: Any) -> str:
+        if isinstance(code, str):  # e.g. `_TRUNCATED`
+            return code
+        name = self._frame_names.get(code)
+        if name is None:
+            qualname = getattr(code, 'co_qualname', code.co_name)  # co_qualname was only added in python 3.11
+            name = f'{qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            self._frame_names[code] = name
+        return name
+
+    def get_folded_stacks(self,
+                          *,
+                          span_name: Optional[str] = None,
+                          trace_id: Optional[int] = None,
+                          clear: bool = False,
+                          ) -> str:
+        """
+        :param span_name: only include samples taken while this span was active
+        :param trace_id: only include samples from this trace (only the most recent `max_traces` traces are kept)
+        :param clear: reset the profile afterwards
+        :return: one line per stack, in the folded format used by flamegraph.pl (and accepted by speedscope)
+        """
+        with self._lock:
+            if trace_id is not None:
+                stacks = dict(self._traces.get(trace_id, dict()))
+            else:
+                stacks = dict(self._stacks)
+            if clear:
+                self._stacks.clear()
+                self._traces.clear()
+
+        lines = []
+        for (_span_name, stack), count in sorted(stacks.items(), key=lambda item: -item[1]):
+            if span_name is None or _span_name == span_name:
+                frame_names = [self._frame_name(code) for code in reversed(stack)]
+                lines.append(f'{";".join([_span_name.replace(";", ":")] + frame_names)} {count}')
+        return '\n'.join(lines)
+
+    def export(self) -> None:
+        folded_stacks = self.get_folded_stacks(clear=True)
+        if folded_stacks:
+            # noinspection PyBroadException
+            try:
+                self.exporter(folded_stacks)
+            except Exception:
+                logging.getLogger(__name__).exception('failed to export profile')
+
+
+def _log_folded_stacks(folded_stacks: str) -> None:
+    logging.getLogger(__name__).info({'otel_wrapper.profile.folded_stacks': folded_stacks})
+
+
+_PROFILER: Optional[SpanProfiler] = None
+
+
+def start_profiler(interval: float = 0.01,
+                   *,
+                   export_interval: Optional[float] = None,
+                   exporter: Optional[Callable[[str], None]] = None,
+                   ) -> Optional[SpanProfiler]:
+    """
+    start the global profiler, or update its settings if it's already running
+    restarting a stopped profiler keeps the samples collected so far
+
+    :param interval: seconds between samples
+                     each sample costs roughly 20us for every thread that is inside a span,
+                     so the default of 10ms costs about 0.2% of a cpu per busy thread
+    :param export_interval: if set, export and clear the profile every this many seconds
+    :param exporter: called with the folded stacks when exporting; logs them at INFO level by default
+    :return:
+    """
+    # no-op
+    if OTEL_WRAPPER_DISABLED:
+        return None
+
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = SpanProfiler(interval, export_interval=export_interval, exporter=exporter)
+    else:
+        if interval <= 0:
+            raise ValueError(f'`interval` must be positive, got {interval!r}')
+        _PROFILER.interval = interval
+        _PROFILER.export_interval = export_interval
+        _PROFILER.exporter = exporter or _log_folded_stacks
+    _PROFILER.start()
+    return _PROFILER
+
+
+def stop_profiler() -> None:
+    """
+    stop the global profiler, keeping the collected samples
+    """
+    if _PROFILER is not None:
+        _PROFILER.stop()
+
+
+def get_folded_stacks(*,
+                      span_name: Optional[str] = None,
+                      trace_id: Optional[int] = None,
+                      clear: bool = False,
+                      ) -> str:
+    """
+    profile collected by the global profiler, as folded stacks (see `SpanProfiler.get_folded_stacks`)
+    """
+    if _PROFILER is None:
+        return ''
+    return _PROFILER.get_folded_stacks(span_name=span_name, trace_id=trace_id, clear=clear)
@@ -0,0 +1,491 @@
+"""
+disk-backed spool for spans and logs that could not be exported to the OTLP endpoint
+
+while the endpoint is unreachable, the batch processors' queues fill up and drop everything new,
+and each export blocks the processor for the exporter's full timeout (retries included) before failing
+instead, once an export fails, batches are serialized (as OTLP protobuf) into a fixed-size memory-mapped ring file
+without even trying to export them, so memory use stays flat and the processors keep up
+a background thread replays the spooled batches, oldest first and at a limited rate,
+backing off while the endpoint is still unreachable, and once one succeeds, new batches are exported directly again
+
+when the file is full, the oldest batches are dropped to make room, since the most recent ones are usually the ones
+needed to debug whatever caused the outage
+the file survives a process restart (e.g. a crash loop during the outage), and is replayed on startup,
+but not a power loss, since it is only flushed to disk when the spool is closed
+each file is locked while in use, so multiple processes (e.g. gunicorn workers) sharing a directory each get their own
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import warnings
+import zlib
+from functools import lru_cache
+from typing import Any
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from opentelemetry.exporter.otlp.proto.common._log_encoder import encode_logs
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter
+from opentelemetry.sdk.trace.export import SpanExportResult
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otlp_exporters import send_otlp_bytes
+
+try:
+    # noinspection PyProtectedMember
+    from opentelemetry.sdk._logs.export import LogRecordExporter
+    # noinspection PyProtectedMember
+    from opentelemetry.sdk._logs.export import LogRecordExportResult
+except ImportError:  # renamed in sdk 1.39
+    # noinspection PyProtectedMember
+    from opentelemetry.sdk._logs.export import LogExporter as LogRecordExporter  # type: ignore[assignment]
+    # noinspection PyProtectedMember
+    from opentelemetry.sdk._logs.export import LogExportResult as LogRecordExportResult  # type: ignore[assignment]
+
+try:
+    import fcntl
+except ImportError:  # windows, where files can't be shared between processes anyway
+    fcntl = None  # type: ignore[assignment]
+
+# file layout: a fixed-size header, followed by the ring of records
+_MAGIC = b'OTWSPOOL'
+_VERSION = 1
+_HEADER = struct.Struct('<8sI4xQQQQQ')  # magic, version, capacity, head, tail, used bytes, record count
+_HEADER_SIZE = 64
+_RECORD = struct.Struct('<II')  # payload length, crc32 of payload
+_PADDING = 0xFFFFFFFF  # in place of a length, marks the rest of the ring as unused, so the next record is at the start
+
+# how long to wait between replay attempts while the endpoint is unreachable
+_MIN_BACKOFF = 1.0
+_MAX_BACKOFF = 30.0
+
+# when multiple processes share a spool dir, try this many file names per signal before giving up
+_MAX_SPOOL_FILES = 64
+
+
+class SpoolFile:
+    """
+    a ring of length-prefixed, checksummed records in a memory-mapped file, which drops the oldest records when full
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'test.spool')
+    >>> spool_file = SpoolFile(path, 64 + 32)  # room for two 8-byte records (each has an 8-byte record header)
+    >>> spool_file.append(b'record 1'), spool_file.append(b'record 2'), spool_file.append(b'record 3')
+    (True, True, True)
+    >>> spool_file.count, spool_file.dropped
+    (2, 1)
+    >>> spool_file.close()
+    >>> spool_file = SpoolFile(path, 64 + 32)  # reopen
+    >>> data, token = spool_file.peek()
+    >>> data
+    b'record 2'
+    >>> spool_file.pop(token)
+    >>> spool_file.peek()[0]
+    b'record 3'
+    >>> spool_file.close()
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        """
+        :param path: created if it doesn't exist, or reused if it has the same size
+        :param max_bytes: file size, including a 64 byte header
+        """
+        self.path = path
+        self.capacity = max_bytes - _HEADER_SIZE
+        if self.capacity < _RECORD.size:
+            raise ValueError(f'`max_bytes` is too small, got {max_bytes!r}')
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)  # raises `BlockingIOError` if already locked
+            if os.fstat(self._fd).st_size != max_bytes:
+                os.ftruncate(self._fd, max_bytes)
+            self._mmap = mmap.mmap(self._fd, max_bytes)
+        except Exception:
+            os.close(self._fd)  # also releases the lock
+            raise
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._removed = 0  # number of records removed from the head so far, to check that a peeked record is unchanged
+        self.dropped = 0  # records dropped to make room, or because they were too large or corrupted
+
+        magic, version, capacity, head, tail, used, count = _HEADER.unpack_from(self._mmap, 0)
+        if (magic, version, capacity) == (_MAGIC, _VERSION, self.capacity) and max(head, tail, used) <= capacity:
+            self.head, self.tail, self.used, self.count = head, tail, used, count
+        else:
+            if magic == _MAGIC and count:
+                warnings.warn(f'discarding {count} spooled batches with a different file size or version: {path}')
+            self.head, self.tail, self.used, self.count = 0, 0, 0, 0
+            self._write_header()
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION, self.capacity, self.head, self.tail, self.used, self.count)
+
+    def _reset(self) -> None:
+        warnings.warn(f'discarding {self.count} spooled batches from corrupted spool file: {self.path}')
+        self.dropped += self.count
+        self._removed += self.count  # so that a record peeked before the reset can't be popped afterwards
+        self.head, self.tail, self.used, self.count = 0, 0, 0, 0
+        self._write_header()
+
+    def _reserve(self, size: int) -> Optional[int]:
+        """
+        find room for a record after the tail, wrapping around to the start if it doesn't fit before the end
+
+        :return: offset to write the record at, or None if the oldest records need to be dropped first
+        """
+        if self.used == 0:
+            self.head, self.tail = 0, 0
+            return 0
+
+        # the free space is after the tail and before the head, but each record must be contiguous
+        if self.tail > self.head:
+            if self.capacity - self.tail >= size:
+                return self.tail
+            if self.head < size:
+                return None
+            if self.capacity - self.tail >= _RECORD.size:
+                _RECORD.pack_into(self._mmap, _HEADER_SIZE + self.tail, _PADDING, 0)
+            self.used += self.capacity - self.tail  # the padding counts as used until the head passes it
+            self.tail = 0
+            return 0
+
+        # otherwise the free space is between the tail and the head (and there is none if they're equal)
+        if self.head - self.tail >= size:
+            return self.tail
+        return None
+
+    def _head_length(self) -> Optional[int]:
+        """
+        skip any padding at the head, then read the length of the oldest record
+        :return: None if the record is corrupted
+        """
+        at_end = self.capacity - self.head < _RECORD.size  # no room for a record header, so implicitly padding
+        if at_end or _RECORD.unpack_from(self._mmap, _HEADER_SIZE + self.head)[0] == _PADDING:
+            self.used -= self.capacity - self.head
+            self.head = 0
+
+        length, _crc = _RECORD.unpack_from(self._mmap, _HEADER_SIZE + self.head)
+        if _RECORD.size + length > min(self.used, self.capacity - self.head):
+            return None
+        return length
+
+    def _remove_head(self, length: int) -> None:
+        self.head += _RECORD.size + length
+        self.used -= _RECORD.size + length
+        self.count -= 1
+        self._removed += 1
+        if self.used <= 0 or self.count <= 0:
+            self.head, self.tail, self.used, self.count = 0, 0, 0, 0
+        elif self.head >= self.capacity:
+            self.head = 0
+        self._write_header()
+
+    def append(self, data: bytes) -> bool:
+        """
+        :return: False if the data was dropped, either because it's too large or because the file was closed
+        """
+        size = _RECORD.size + len(data)
+        with self._lock:
+            if self._closed or size > self.capacity:
+                self.dropped += 1
+                return False
+
+            offset = self._reserve(size)
+            while offset is None:  # drop the oldest records until there is room
+                length = self._head_length()
+                if length is None:
+                    self._reset()
+                else:
+                    self._remove_head(length)
+                    self.dropped += 1
+                offset = self._reserve(size)
+
+            # write the record before updating the header, so a crash in the middle doesn't leave a partial record
+            _RECORD.pack_into(self._mmap, _HEADER_SIZE + offset, len(data), zlib.crc32(data))
+            self._mmap[_HEADER_SIZE + offset + _RECORD.size:_HEADER_SIZE + offset + size] = data
+            self.tail = offset + size if offset + size < self.capacity else 0
+            self.used += size
+            self.count += 1
+            self._write_header()
+        return True
+
+    def peek(self) -> Optional[Tuple[bytes, int]]:
+        """
+        :return: the oldest record and a token to `pop` it with, or None if empty
+        """
+        with self._lock:
+            if self._closed or self.count == 0:
+                return None
+
+            length = self._head_length()
+            if length is not None:
+                start = _HEADER_SIZE + self.head + _RECORD.size
+                _length, crc = _RECORD.unpack_from(self._mmap, _HEADER_SIZE + self.head)
+                data = self._mmap[start:start + length]
+                if zlib.crc32(data) == crc:
+                    return data, self._removed
+
+            self._reset()
+            return None
+
+    def pop(self, token: int) -> None:
+        """
+        remove the oldest record, unless it was already dropped (or popped) since it was peeked
+
+        :param token: from `peek`
+        """
+        with self._lock:
+            if self._closed or self.count == 0 or token != self._removed:
+                return
+
+            length = self._head_length()
+            if length is None:
+                self._reset()
+            else:
+                self._remove_head(length)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._closed:
+                self._mmap.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._mmap.flush()
+                self._mmap.close()
+                os.close(self._fd)  # also releases the lock
+
+
+class Spool:
+    """
+    a spool file for one signal, plus a thread to replay it to the OTLP endpoint
+    """
+
+    def __init__(self, signal: str, spool_file: SpoolFile, replay_rate: float, timeout: float) -> None:
+        """
+        :param signal: `traces` or `logs`
+        :param spool_file: where to store the serialized requests
+        :param replay_rate: maximum number of batches to replay per second
+        :param timeout: seconds to wait for each replayed batch to be exported
+        """
+        self.signal = signal
+        self.file = spool_file
+        self.replay_rate = replay_rate
+        self.timeout = timeout
+
+        # whether to try exporting directly, which starts off true even if there are batches from a previous run
+        self.reachable = True
+
+        # metrics (read by the meter provider on collection)
+        self.spooled_batches = 0
+        self.replayed_batches = 0
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'otel_wrapper.spool.{signal}', daemon=True)
+        self._thread.start()
+
+    def append(self, data: bytes) -> None:
+        """
+        :param data: a serialized `Export*ServiceRequest`
+        """
+        if self.file.append(data):
+            self.spooled_batches += 1
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        backoff = _MIN_BACKOFF
+        while not self._stop.is_set():
+            record = self.file.peek()
+            if record is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            data, token = record
+            if send_otlp_bytes(self.signal, data, self.timeout):
+                self.file.pop(token)
+                self.replayed_batches += 1
+                self.reachable = True
+                backoff = _MIN_BACKOFF
+                self._stop.wait(1 / self.replay_rate)
+            else:
+                self.reachable = False
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, _MAX_BACKOFF)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        stop replaying, and flush the file to disk so that it can be replayed by the next process
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        if self._thread.is_alive():  # still waiting on the endpoint, so leave the file open for it
+            self.file.flush()
+        else:
+            self.file.close()
+
+
+def open_spool(signal: str, directory: str, max_bytes: int, replay_rate: float, timeout: float) -> Optional[Spool]:
+    """
+    :param signal: `traces` or `logs`
+    :param directory: created if it doesn't exist
+    :param max_bytes: size of the spool file
+    :param replay_rate: maximum number of batches to replay per second
+    :param timeout: seconds to wait for each replayed batch to be exported
+    :return: None (with a warning) if no spool file could be opened
+    """
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for i in range(_MAX_SPOOL_FILES):
+            path = os.path.join(directory, f'{signal}.spool' if i == 0 else f'{signal}.{i}.spool')
+            try:
+                spool_file = SpoolFile(path, max_bytes)
+            except BlockingIOError:  # in use by another process
+                continue
+            spool = Spool(signal, spool_file, replay_rate=replay_rate, timeout=timeout)
+            register_spool_metrics(spool)
+            return spool
+    except OSError:
+        logging.exception(f'failed to open a spool file for {signal} in {directory}')
+        return None
+
+    warnings.warn(f'all {_MAX_SPOOL_FILES} spool files for {signal} in {directory} are in use, so not spooling')
+    return None
+
+
+class SpoolingSpanExporter(SpanExporter):
+    """
+    exports spans directly while the endpoint is reachable, and spools them otherwise
+    """
+
+    def __init__(self, span_exporter: SpanExporter, spool: Spool) -> None:
+        self.span_exporter = span_exporter
+        self.spool = spool
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        if self.spool.reachable:
+            if self.span_exporter.export(spans) is SpanExportResult.SUCCESS:
+                return SpanExportResult.SUCCESS
+            self.spool.reachable = False
+        self.spool.append(encode_spans(spans).SerializeToString())
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.span_exporter.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        self.spool.close(self.spool.timeout)
+        self.span_exporter.shutdown()
+
+
+class SpoolingLogExporter(LogRecordExporter):
+    """
+    exports logs directly while the endpoint is reachable, and spools them otherwise
+    """
+
+    def __init__(self, log_exporter: LogRecordExporter, spool: Spool) -> None:
+        self.log_exporter = log_exporter
+        self.spool = spool
+
+    def export(self, batch: Sequence[Any]) -> LogRecordExportResult:  # the log record type also changed
+        if self.spool.reachable:
+            if self.log_exporter.export(batch) is LogRecordExportResult.SUCCESS:
+                return LogRecordExportResult.SUCCESS
+            self.spool.reachable = False
+        self.spool.append(encode_logs(batch).SerializeToString())
+        return LogRecordExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.log_exporter.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        self.spool.close(self.spool.timeout)
+        self.log_exporter.shutdown()
+
+
+_SPOOLS: List[Spool] = []
+
+
+def _observe_spooled_batches(_options: CallbackOptions) -> Iterable[Observation]:
+    for spool in list(_SPOOLS):
+        yield Observation(spool.spooled_batches, {'signal': spool.signal})
+
+
+def _observe_replayed_batches(_options: CallbackOptions) -> Iterable[Observation]:
+    for spool in list(_SPOOLS):
+        yield Observation(spool.replayed_batches, {'signal': spool.signal})
+
+
+def _observe_dropped_batches(_options: CallbackOptions) -> Iterable[Observation]:
+    for spool in list(_SPOOLS):
+        yield Observation(spool.file.dropped, {'signal': spool.signal})
+
+
+def _observe_pending_batches(_options: CallbackOptions) -> Iterable[Observation]:
+    for spool in list(_SPOOLS):
+        yield Observation(spool.file.count, {'signal': spool.signal})
+
+
+def _observe_used_bytes(_options: CallbackOptions) -> Iterable[Observation]:
+    for spool in list(_SPOOLS):
+        yield Observation(spool.file.used, {'signal': spool.signal})
+
+
+def _observe_capacity_bytes(_options: CallbackOptions) -> Iterable[Observation]:
+    for spool in list(_SPOOLS):
+        yield Observation(spool.file.capacity, {'signal': spool.signal})
+
+
+@lru_cache  # only run once
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.spool.batches.spooled',
+                                    callbacks=[_observe_spooled_batches],
+                                    unit='{batch}',
+                                    description='batches spooled because the OTLP endpoint was unreachable')
+    meter.create_observable_counter('otel_wrapper.spool.batches.replayed',
+                                    callbacks=[_observe_replayed_batches],
+                                    unit='{batch}',
+                                    description='spooled batches sent to the OTLP endpoint')
+    meter.create_observable_counter('otel_wrapper.spool.batches.dropped',
+                                    callbacks=[_observe_dropped_batches],
+                                    unit='{batch}',
+                                    description='spooled batches dropped because the spool was full (or corrupted)')
+    meter.create_observable_gauge('otel_wrapper.spool.batches.pending',
+                                  callbacks=[_observe_pending_batches],
+                                  unit='{batch}',
+                                  description='batches in the spool waiting to be replayed')
+    meter.create_observable_gauge('otel_wrapper.spool.bytes.used',
+                                  callbacks=[_observe_used_bytes],
+                                  unit='By',
+                                  description='bytes of the spool file in use')
+    meter.create_observable_gauge('otel_wrapper.spool.bytes.capacity',
+                                  callbacks=[_observe_capacity_bytes],
+                                  unit='By',
+                                  description='bytes of the spool file available for batches')
+
+
+def register_spool_metrics(spool: Spool) -> None:
+    """
+    publish the spool's spooled, replayed, and dropped counts via the meter provider
+    """
+    _init_instruments()
+    _SPOOLS.append(spool)
@@ -0,0 +1,255 @@
+"""
+tail sampling: buffer finished spans per trace, and only decide whether to export them once the trace is complete
+
+a trace is considered complete when its local root span ends (i.e. a span with no parent, or a remote parent)
+at that point the whole trace is either passed to the wrapped span processors (e.g. `BatchSpanProcessor`s) or dropped
+* traces containing an error span are always kept
+* traces containing a span that took at least `latency_threshold` seconds are always kept
+* the rest are sampled by trace id, so that every service sampling at the same ratio keeps the same traces
+
+spans that end after their trace was decided (e.g. from background tasks) follow the same decision
+if the buffer holds more than `max_spans` spans, or a trace has been waiting longer than `timeout`,
+the oldest traces are decided early with whatever spans they have so far (and counted as evicted)
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from opentelemetry import context
+from opentelemetry.metrics import CallbackOptions
+from opentelemetry.metrics import Observation
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace import Span as SdkSpan
+from opentelemetry.sdk.trace import SpanProcessor
+from opentelemetry.trace import StatusCode
+
+from opentelemetry_wrapper import __version__  # don't worry, this does not create an infinite import loop
+from opentelemetry_wrapper.v0.dependencies.opentelemetry.otel_providers import get_meter
+
+# why a trace was kept or dropped, used as the `decision` metric attribute
+DECISION_ERROR = 'error'
+DECISION_LATENCY = 'latency'
+DECISION_SAMPLED = 'sampled'
+DECISION_DROPPED = 'dropped'
+
+_MAX_DECIDED_TRACES = 100000  # remember this many decisions, for spans that end after their trace was decided
+_TRACE_ID_LIMIT = (1 << 64) - 1  # same as the sdk's `TraceIdRatioBased` sampler, which uses the lower 64 bits
+
+
+class _PendingTrace:
+    __slots__ = ('spans', 'first_seen', 'has_error', 'is_slow')
+
+    def __init__(self) -> None:
+        self.spans: List[ReadableSpan] = []
+        self.first_seen = time.monotonic()
+        self.has_error = False
+        self.is_slow = False
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    wraps other span processors, and only passes them the spans from traces that were kept
+    """
+
+    def __init__(self,
+                 span_processors: Sequence[SpanProcessor],
+                 *,
+                 ratio: float = 0.1,
+                 latency_threshold: float = 1.0,
+                 max_spans: int = 100000,
+                 timeout: float = 30.0,
+                 ) -> None:
+        """
+        :param span_processors: where to send the spans from kept traces
+        :param ratio: fraction of the remaining traces to keep, between 0 and 1
+        :param latency_threshold: keep any trace containing a span that took at least this many seconds
+        :param max_spans: maximum number of spans to buffer before deciding the oldest traces early
+        :param timeout: maximum number of seconds to wait for a trace's local root span to end
+        """
+        if not 0 <= ratio <= 1:
+            raise ValueError(f'`ratio` must be between 0 and 1, got {ratio!r}')
+        if max_spans < 1:
+            raise ValueError(f'`max_spans` must be positive, got {max_spans!r}')
+
+        self._span_processors = tuple(span_processors)
+        self._ratio = ratio
+        self._trace_id_bound = round(ratio * (_TRACE_ID_LIMIT + 1))
+        self._latency_threshold_ns = int(latency_threshold * 1e9)
+        self._max_spans = max_spans
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pending: Dict[int, _PendingTrace] = OrderedDict()  # trace id -> spans, oldest first
+        self._decided: Dict[int, bool] = OrderedDict()  # trace id -> kept, oldest first
+        self._buffered_spans = 0
+
+        # metrics (read by the meter provider on collection)
+        self.traces: Dict[str, int] = dict.fromkeys((DECISION_ERROR, DECISION_LATENCY,
+                                                     DECISION_SAMPLED, DECISION_DROPPED), 0)
+        self.evicted_traces = 0
+        self.evicted_spans = 0
+        self.late_spans = 0
+
+    @property
+    def buffered_spans(self) -> int:
+        return self._buffered_spans
+
+    def on_start(self, span: SdkSpan, parent_context: Optional[context.Context] = None) -> None:
+        for span_processor in self._span_processors:
+            span_processor.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context is None:
+            return
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+
+        decided: List[List[ReadableSpan]] = []
+        with self._lock:
+            # the trace was already decided
+            kept = self._decided.get(trace_id)
+            if kept is not None:
+                self.late_spans += 1
+                if kept:
+                    decided.append([span])
+
+            else:
+                pending = self._pending.get(trace_id)
+                if pending is None:
+                    pending = self._pending[trace_id] = _PendingTrace()
+                pending.spans.append(span)
+                self._buffered_spans += 1
+                if span.status.status_code is StatusCode.ERROR:
+                    pending.has_error = True
+                if span.start_time and span.end_time and span.end_time - span.start_time >= self._latency_threshold_ns:
+                    pending.is_slow = True
+
+                if is_local_root:
+                    decided.append(self._decide(trace_id))
+
+            # evict the oldest traces if there are too many spans or they've been waiting too long
+            deadline = time.monotonic() - self._timeout
+            while self._pending:
+                oldest_trace_id, oldest = next(iter(self._pending.items()))
+                if self._buffered_spans <= self._max_spans and oldest.first_seen > deadline:
+                    break
+                self.evicted_traces += 1
+                self.evicted_spans += len(oldest.spans)
+                decided.append(self._decide(oldest_trace_id))
+
+        # export outside the lock, since the wrapped processors might block
+        for spans in decided:
+            for _span in spans:
+                for span_processor in self._span_processors:
+                    span_processor.on_end(_span)
+
+    def _decide(self, trace_id: int) -> List[ReadableSpan]:
+        """
+        must be called while holding the lock
+        :return: spans to export (empty if the trace was dropped)
+        """
+        pending = self._pending.pop(trace_id)
+        self._buffered_spans -= len(pending.spans)
+
+        if pending.has_error:
+            decision = DECISION_ERROR
+        elif pending.is_slow:
+            decision = DECISION_LATENCY
+        elif trace_id & _TRACE_ID_LIMIT < self._trace_id_bound:
+            decision = DECISION_SAMPLED
+        else:
+            decision = DECISION_DROPPED
+        self.traces[decision] += 1
+
+        kept = decision != DECISION_DROPPED
+        self._decided[trace_id] = kept
+        while len(self._decided) > _MAX_DECIDED_TRACES:
+            self._decided.pop(next(iter(self._decided)))
+        return pending.spans if kept else []
+
+    def _decide_all(self) -> None:
+        with self._lock:
+            decided = [self._decide(trace_id) for trace_id in list(self._pending)]
+        for spans in decided:
+            for span in spans:
+                for span_processor in self._span_processors:
+                    span_processor.on_end(span)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """
+        incomplete traces are only decided on shutdown, not when flushing
+        """
+        return all(span_processor.force_flush(timeout_millis) for span_processor in self._span_processors)
+
+    def shutdown(self) -> None:
+        self._decide_all()
+        for span_processor in self._span_processors:
+            span_processor.shutdown()
+
+
+_PROCESSORS: List[TailSamplingSpanProcessor] = []
+
+
+def _observe_traces(_options: CallbackOptions) -> Iterable[Observation]:
+    for processor in list(_PROCESSORS):
+        for decision, count in list(processor.traces.items()):
+            yield Observation(count, {'decision': decision})
+
+
+def _observe_evicted_traces(_options: CallbackOptions) -> Iterable[Observation]:
+    for processor in list(_PROCESSORS):
+        yield Observation(processor.evicted_traces)
+
+
+def _observe_evicted_spans(_options: CallbackOptions) -> Iterable[Observation]:
+    for processor in list(_PROCESSORS):
+        yield Observation(processor.evicted_spans)
+
+
+def _observe_late_spans(_options: CallbackOptions) -> Iterable[Observation]:
+    for processor in list(_PROCESSORS):
+        yield Observation(processor.late_spans)
+
+
+def _observe_buffered_spans(_options: CallbackOptions) -> Iterable[Observation]:
+    for processor in list(_PROCESSORS):
+        yield Observation(processor.buffered_spans)
+
+
+@lru_cache  # only run once
+def _init_instruments() -> None:
+    meter = get_meter(__name__, __version__)
+    meter.create_observable_counter('otel_wrapper.tail_sampling.traces',
+                                    callbacks=[_observe_traces],
+                                    unit='{trace}',
+                                    description='number of traces decided, by `decision` (dropped or why it was kept)')
+    meter.create_observable_counter('otel_wrapper.tail_sampling.evicted.traces',
+                                    callbacks=[_observe_evicted_traces],
+                                    unit='{trace}',
+                                    description='traces decided early due to the memory limit or timeout')
+    meter.create_observable_counter('otel_wrapper.tail_sampling.evicted.spans',
+                                    callbacks=[_observe_evicted_spans],
+                                    unit='{span}',
+                                    description='spans in traces decided early due to the memory limit or timeout')
+    meter.create_observable_counter('otel_wrapper.tail_sampling.late.spans',
+                                    callbacks=[_observe_late_spans],
+                                    unit='{span}',
+                                    description='spans that ended after their trace was decided')
+    meter.create_observable_gauge('otel_wrapper.tail_sampling.buffered.spans',
+                                  callbacks=[_observe_buffered_spans],
+                                  unit='{span}',
+                                  description='spans currently buffered waiting for their trace to be decided')
+
+
+def register_tail_sampling_metrics(processor: TailSamplingSpanProcessor) -> None:
+    """
+    publish the processor's decision and eviction counts via the meter provider
+    """
+    _init_instruments()
+    _PROCESSORS.append(processor)
@@ -0,0 +1,51 @@
+import sys
+from types import MappingProxyType
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import Mapping
+
+_MAX_FROZEN_ATTRIBUTES = 0x10000
+
+# set of (key, type, value) -> shared read-only attributes
+# the type is part of the key since 1 == True == 1.0, but they shouldn't be interchangeable as attribute values
+_FROZEN_ATTRIBUTES: Dict[FrozenSet, Mapping[str, Any]] = dict()
+
+
+def intern_span_name(span_name: str) -> str:
+    """
+    span names are compared and hashed by the sdk and exporters, so share a single copy of each
+    """
+    return sys.intern(span_name)
+
+
+def freeze_attributes(attributes: Mapping[str, Any]) -> Mapping[str, Any]:
+    """
+    return a read-only copy of some span attributes, shared with any other identical set of attributes
+    strings are interned, and if the values are unhashable (e.g. lists), the result is not shared
+
+    >>> a = freeze_attributes({'x': 1, 'y': 'z'})
+    >>> a is freeze_attributes({'y': 'z', 'x': 1})
+    True
+    >>> a is freeze_attributes({'x': True, 'y': 'z'})
+    False
+    >>> a['x'] = 2
+    Traceback (most recent call last):
+    ...
+    TypeError: 'mappingproxy' object does not support item assignment
+
+    :param attributes:
+    :return:
+    """
+    items = [(sys.intern(k), sys.intern(v) if type(v) is str else v) for k, v in attributes.items()]
+    try:
+        key = frozenset((k, type(v), v) for k, v in items)
+    except TypeError:
+        return MappingProxyType(dict(items))
+
+    frozen = _FROZEN_ATTRIBUTES.get(key)
+    if frozen is None:
+        frozen = MappingProxyType(dict(items))
+        if len(_FROZEN_ATTRIBUTES) < _MAX_FROZEN_ATTRIBUTES:  # don't grow forever if attributes are dynamic
+            frozen = _FROZEN_ATTRIBUTES.setdefault(key, frozen)
+    return frozen
@@ -22,6 +22,7 @@ from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import Union
+from typing import cast
 
 CodeObjectType = Union[
     Coroutine, Callable,
@@ -90,7 +91,9 @@ def _unwrap_partial(_code_object: CodeObjectType) -> Tuple[Optional[str], CodeOb
 def _unwrap_async(_code_object: CodeObjectType) -> Tuple[Optional[str], CodeObjectType]:
     # unwrap tasks
     if isinstance(_code_object, asyncio.Task):
-        return 'asyncio.Task', _code_object.get_coro()
+        _coro = _code_object.get_coro()
+        # coroutines timed by `instrument_asyncio_tasks` are wrapped
+        return 'asyncio.Task', cast(CodeObjectType, getattr(_coro, '__otel_wrapper_coro__', _coro))
 
     # attempt to detect asgiref.sync_to_async and asgiref.async_to_sync
     _module = inspect.getmodule(_code_object)
@@ -135,7 +138,6 @@ def unwrap_function(code_object: CodeObjectType,
 
 
 # noinspection PyBroadException
-@lru_cache(maxsize=None)
 @dataclass(unsafe_hash=True, frozen=True)
 class CodeInfo:
     code_object: CodeObjectType
@@ -454,3 +456,12 @@ class CodeInfo:
         the potential side effects (or lack thereof) of calling an unwrapped function are undefined
         """
         return self.__unwrapped[1]
+
+
+@lru_cache(maxsize=4096)  # bounded, since this holds strong references to whatever was introspected
+def get_code_info(code_object: CodeObjectType) -> CodeInfo:
+    """
+    cached `CodeInfo`, for things that are introspected repeatedly
+    if the result is only used once, create a `CodeInfo` directly instead, so that `code_object` isn't kept alive
+    """
+    return CodeInfo(code_object)
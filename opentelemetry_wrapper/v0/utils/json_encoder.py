@@ -19,7 +19,7 @@ from typing import Type
 from typing import Union
 from uuid import UUID
 
-from opentelemetry_wrapper.v0.utils.introspect import CodeInfo
+from opentelemetry_wrapper.v0.utils.introspect import get_code_info
 
 try:
     fastapi_jsonable_encoder: Optional[Callable]
@@ -80,7 +80,7 @@ def parse_pattern(o: Pattern) -> str:
 
 
 def parse_function(o: Union[Coroutine, Callable]) -> str:
-    return CodeInfo(o).name
+    return get_code_info(o).name  # type: ignore[arg-type]  # functions are hashable
 
 
 ENCODERS_BY_TYPE: Dict[Type[Any], Callable[[Any], Any]] = {
@@ -0,0 +1,87 @@
+import random
+import time
+from typing import Callable
+from typing import Optional
+
+
+class _RateLimiter:
+    """
+    token bucket that allows (on average) `max_rate` calls per second, with bursts of up to `max_rate` calls
+    this is deliberately lock-free; under contention it may admit a few extra calls, which is fine for sampling
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'last')
+
+    def __init__(self, max_rate: float) -> None:
+        self.rate = max_rate
+        self.capacity = max(1.0, max_rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def __call__(self) -> bool:
+        now = time.monotonic()
+        tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if tokens >= 1:
+            self.tokens = tokens - 1
+            return True
+        self.tokens = tokens
+        return False
+
+
+def _never() -> bool:
+    return False
+
+
+def make_sampler(sample: Optional[float] = None,
+                 max_rate: Optional[float] = None,
+                 ) -> Optional[Callable[[], bool]]:
+    """
+    build a cheap head-sampling predicate, which returns True if the current call should be recorded
+
+    returns None if every call should be recorded, so that callers can skip the check entirely
+    >>> make_sampler() is None
+    True
+    >>> make_sampler(sample=1) is None
+    True
+    >>> make_sampler(sample=0)()
+    False
+    >>> limiter = make_sampler(max_rate=2)
+    >>> [limiter() for _ in range(3)]
+    [True, True, False]
+    >>> make_sampler(max_rate=float('nan'))
+    Traceback (most recent call last):
+    ...
+    ValueError: `max_rate` must be a non-negative number, got nan
+
+    :param sample: probability of recording each call, between 0 and 1 (inclusive)
+    :param max_rate: maximum number of calls recorded per second
+    :return: predicate, or None if everything is sampled
+    """
+    if sample is not None:
+        if isinstance(sample, bool) or not isinstance(sample, (int, float)) or not 0 <= sample <= 1:
+            raise ValueError(f'`sample` must be a number between 0 and 1, got {sample!r}')
+    if max_rate is not None:
+        if isinstance(max_rate, bool) or not isinstance(max_rate, (int, float)) or not max_rate >= 0:
+            raise ValueError(f'`max_rate` must be a non-negative number, got {max_rate!r}')
+
+    # never sample
+    if sample == 0 or max_rate == 0:
+        return _never
+
+    # ratio only, or nothing at all
+    if max_rate is None:
+        if sample is None or sample == 1:
+            return None
+        _random = random.random
+        _sample = float(sample)
+        return lambda: _random() < _sample
+
+    # rate only
+    limiter = _RateLimiter(float(max_rate))
+    if sample is None or sample == 1:
+        return limiter
+
+    # ratio first, since it's cheaper and avoids consuming tokens for unsampled calls
+    _random = random.random
+    _sample = float(sample)
+    return lambda: _random() < _sample and limiter()
@@ -0,0 +1,144 @@
+import weakref
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Union
+
+_NONE = object()  # placeholder for storing None, since a dead weakref also returns None
+_SELF = object()  # placeholder for when the value is the key itself, to avoid a second reference
+
+
+class BoundedWeakCache:
+    """
+    a least-recently-used cache that holds weak references to its keys and values wherever possible,
+    so that caching something never keeps it (or anything it references) alive
+
+    * keys that can't be weakly referenced (e.g. builtins) are held strongly, but still count towards `maxsize`
+    * an entry is dropped as soon as its key or its value is garbage collected
+    * if the value is the key itself, only the key is referenced
+
+    >>> class Thing: pass
+    >>> cache = BoundedWeakCache(maxsize=2)
+    >>> a, b, c = Thing(), Thing(), Thing()
+    >>> cache[a] = b
+    >>> cache.get(a) is b
+    True
+    >>> cache[b] = None
+    >>> cache[c] = c
+    >>> a in cache, b in cache, c in cache
+    (False, True, True)
+    >>> del c
+    >>> len(cache)
+    1
+    >>> cache.info()['evictions'], cache.info()['collected']
+    (1, 1)
+    """
+
+    def __init__(self, maxsize: Optional[int] = 4096) -> None:
+        self.maxsize = maxsize
+        self._data: 'OrderedDict[Any, Any]' = OrderedDict()
+        self._value_refs: Dict[int, Any] = dict()  # id of weakref to value -> key in `_data`
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.collected = 0
+
+        # don't keep the cache alive via the weakref callbacks
+        self_ref = weakref.ref(self)
+
+        def _on_collect(ref: weakref.ref) -> None:
+            _self = self_ref()
+            if _self is not None:
+                _key = _self._value_refs.pop(id(ref), ref)
+                if _self._data.pop(_key, None) is not None:
+                    _self.collected += 1
+
+        self._on_collect = _on_collect
+
+    @staticmethod
+    def _lookup_key(key: Any) -> Any:
+        try:
+            return weakref.ref(key)  # compares equal to any other live weakref to the same object
+        except TypeError:
+            return key
+
+    def _store(self, obj: Any) -> Any:
+        try:
+            return weakref.ref(obj, self._on_collect)
+        except TypeError:
+            return obj
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        try:
+            _key = self._lookup_key(key)
+            stored = self._data[_key]
+        except (KeyError, TypeError):
+            self.misses += 1
+            return default
+
+        if stored is _NONE:
+            value = None
+        elif stored is _SELF:
+            value = key
+        elif isinstance(stored, weakref.ref):
+            value = stored()
+            if value is None:
+                self.misses += 1
+                return default
+        else:
+            value = stored
+
+        self.hits += 1
+        self._data.move_to_end(_key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        try:
+            return self._lookup_key(key) in self._data
+        except TypeError:  # unhashable
+            return False
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if value is None:
+            stored = _NONE
+        elif value is key:
+            stored = _SELF
+        else:
+            stored = self._store(value)
+
+        try:
+            _key = self._store(key)
+            self._pop(_key)
+            self._data[_key] = stored
+        except TypeError:  # unhashable
+            return
+        if isinstance(stored, weakref.ref):
+            self._value_refs[id(stored)] = _key
+
+        # evict the least recently used entries
+        while self.maxsize is not None and len(self._data) > self.maxsize:
+            self._pop(next(iter(self._data)))
+            self.evictions += 1
+
+    def _pop(self, _key: Any) -> None:
+        stored = self._data.pop(_key, None)
+        if isinstance(stored, weakref.ref):
+            self._value_refs.pop(id(stored), None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._value_refs.clear()
+
+    def info(self) -> Dict[str, Union[int, None]]:
+        return {
+            'size':      len(self._data),
+            'maxsize':   self.maxsize,
+            'hits':      self.hits,
+            'misses':    self.misses,
+            'evictions': self.evictions,
+            'collected': self.collected,
+        }